@@ -0,0 +1,8 @@
+import os
+
+# Benchmarks run offline: settle the environment before `dar` reads its configuration on first use. Cached
+# query results would hide regressions, and nothing may contact Google Cloud.
+os.environ.setdefault("GOOGLE_CLOUD_PROJECT", "benchmark-project")
+os.environ.setdefault("GOOGLE_BQ_DATASET", "benchmark_dataset")
+os.environ["QUERY_CACHE_ENABLED"] = "0"
+os.environ["METADATA_CACHE_WARM_ON_STARTUP"] = "0"
@@ -0,0 +1,314 @@
+import hashlib
+import sqlite3
+import threading
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+import pyarrow as pa
+import sqlglot
+from google.api_core.exceptions import BadRequest, NotFound
+from google.cloud import bigquery
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from dar.tools.sql_utils import SQL_DIALECT, find_ai_calls
+
+_SQLITE_TYPES = {
+    "STRING": "TEXT",
+    "INT64": "INTEGER",
+    "INTEGER": "INTEGER",
+    "FLOAT64": "REAL",
+    "FLOAT": "REAL",
+    "NUMERIC": "REAL",
+    "BOOL": "INTEGER",
+    "BOOLEAN": "INTEGER",
+}
+
+# Bytes per cell used to estimate the bytes a query processes, BigQuery bills at least 8 bytes for most types.
+_BYTES_PER_CELL = 8
+
+
+def _stub_hash(args: tuple) -> int:
+    return int(hashlib.md5(repr(args).encode()).hexdigest(), 16)
+
+
+def _ai_stub(function_name: str) -> Callable[..., Any]:
+    """Build a deterministic stand-in for a row-level `AI.GENERATE*` function."""
+    kind = function_name.upper().removeprefix("GENERATE").lstrip("_")
+    if kind == "BOOL":
+        return lambda *args: int(_stub_hash(args) % 2 == 0)
+    if kind == "INT":
+        return lambda *args: _stub_hash(args) % 100
+    if kind == "DOUBLE":
+        return lambda *args: (_stub_hash(args) % 1000) / 1000
+    return lambda *args: "[generated] " + " ".join(str(arg) for arg in args)[:80]
+
+
+class _QueryJob:
+    """The job attributes and methods `run_query` uses, local jobs are done as soon as they are submitted."""
+
+    def __init__(
+        self,
+        statement_type: str,
+        total_bytes_processed: int,
+        job_id: Optional[str] = None,
+        row_iterator: Optional["_RowIterator"] = None,
+        error: Optional[Exception] = None,
+    ):
+        self.statement_type = statement_type
+        self.total_bytes_processed = total_bytes_processed
+        self.job_id = job_id
+        self.slot_millis = 0
+        self._row_iterator = row_iterator
+        self._error = error
+
+    def done(self, reload: bool = True) -> bool:
+        return True
+
+    def result(self) -> "_RowIterator":
+        if self._error is not None:
+            raise self._error
+        return self._row_iterator
+
+    def cancel(self) -> bool:
+        return False
+
+
+class _RowIterator(list):
+    """List of rows with the `RowIterator` attributes `run_query` reads."""
+
+    def __init__(self, rows: list, schema: list, total_rows: int, total_bytes_processed: int):
+        super().__init__(rows)
+        self.schema = schema
+        self.total_rows = total_rows
+        self.total_bytes_processed = total_bytes_processed
+        self.slot_millis = 0
+
+    def to_arrow_iterable(self, bqstorage_client: Any = None) -> Iterator[pa.RecordBatch]:
+        """Yield the rows as a single Arrow record batch, the local backend has no Storage Read API."""
+        if self:
+            yield pa.RecordBatch.from_pylist([dict(row.items()) for row in self])
+
+
+class LocalBigQueryClient:
+    """Stand-in for `bigquery.Client` that runs queries on an in-memory SQLite database.
+
+    Queries are transpiled from GoogleSQL with sqlglot, and `AI.GENERATE*` calls are replaced with deterministic
+    SQLite functions, so the cost gate, metadata cache and result rendering of the pipeline run unchanged. Every
+    fixture table is available under any project and dataset, and a `__TABLES__` view lists them.
+    """
+
+    def __init__(self, project_id: str, dataset_id: str, tables: dict[str, dict]):
+        """Load fixture tables.
+
+        Args:
+            project_id: Project the tables are reported in.
+            dataset_id: Dataset the tables are reported in.
+            tables: Table id to `{"schema": [{"name", "type", "description"?}], "rows": [[...]], "description"?}`.
+        """
+        self.project = project_id
+        self.dataset_id = dataset_id
+        self.ai_function_calls = 0
+        self.queries = 0
+        self._tables = tables
+        self._modified = datetime.now(timezone.utc)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(":memory:", check_same_thread=False)
+        self._registered_functions: set[str] = set()
+        self._load_tables()
+
+    def _load_tables(self) -> None:
+        last_modified = int(self._modified.timestamp() * 1000)
+        self._connection.execute(
+            "CREATE TABLE __TABLES__ (table_id TEXT, last_modified_time INTEGER, row_count INTEGER)"
+        )
+        for table_id, table in self._tables.items():
+            columns = ", ".join(
+                f'"{field["name"]}" {_SQLITE_TYPES.get(field["type"].upper(), "TEXT")}' for field in table["schema"]
+            )
+            self._connection.execute(f'CREATE TABLE "{table_id}" ({columns})')
+            placeholders = ", ".join("?" for _ in table["schema"])
+            self._connection.executemany(f'INSERT INTO "{table_id}" VALUES ({placeholders})', table["rows"])
+            self._connection.execute(
+                "INSERT INTO __TABLES__ VALUES (?, ?, ?)", (table_id, last_modified, len(table["rows"]))
+            )
+
+    def _count_ai_call(self, stub: Callable[..., Any]) -> Callable[..., Any]:
+        def counted(*args):
+            self.ai_function_calls += 1
+            return stub(*args)
+
+        return counted
+
+    def _to_sqlite(self, query: str) -> tuple[exp.Expression, str]:
+        """Parse a GoogleSQL statement and transpile it to SQLite with stubbed AI functions."""
+        try:
+            expression = sqlglot.parse_one(query, read=SQL_DIALECT)
+        except SqlglotError as e:
+            raise BadRequest(f"Syntax error: {e}")
+
+        for call in find_ai_calls(expression):
+            function = call.expression
+            stub_name = f"ai_{function.name.lower()}"
+            if stub_name not in self._registered_functions:
+                self._connection.create_function(stub_name, -1, self._count_ai_call(_ai_stub(function.name)))
+                self._registered_functions.add(stub_name)
+            prompt_args = []
+            for arg in function.expressions:
+                if isinstance(arg, exp.Kwarg):
+                    if arg.this.name.lower() == "prompt":
+                        prompt_args.append(arg.expression)
+                elif isinstance(arg, exp.Tuple):
+                    prompt_args.extend(arg.expressions)
+                else:
+                    prompt_args.append(arg)
+            # `AI.GENERATE_BOOL(...).result` reads the result field of the returned struct.
+            target = call.parent if isinstance(call.parent, exp.Dot) and call.parent.this is call else call
+            target.replace(exp.Anonymous(this=stub_name, expressions=prompt_args))
+
+        for table in expression.find_all(exp.Table):
+            table.set("catalog", None)
+            table.set("db", None)
+        return expression, expression.sql(dialect="sqlite")
+
+    def _estimate_bytes(self, expression: exp.Expression) -> int:
+        total = 0
+        for table in expression.find_all(exp.Table):
+            fixture = self._tables.get(table.name)
+            if fixture is not None:
+                total += len(fixture["rows"]) * len(fixture["schema"]) * _BYTES_PER_CELL
+        return total
+
+    def query(self, query: str, job_config: Optional[bigquery.QueryJobConfig] = None) -> _QueryJob:
+        """Dry-run a statement, or run it and return the finished job.
+
+        Errors of the statement are raised by `result()` of the job, like BigQuery reports failed jobs.
+        """
+        if job_config is None or not job_config.dry_run:
+            try:
+                row_iterator = self.query_and_wait(query, job_config=job_config)
+            except BadRequest as e:
+                return _QueryJob("SELECT", 0, job_id=f"local_{self.queries}", error=e)
+            return _QueryJob(
+                "SELECT", row_iterator.total_bytes_processed, job_id=f"local_{self.queries}", row_iterator=row_iterator
+            )
+        with self._lock:
+            expression, _ = self._to_sqlite(query)
+        statement_type = "SELECT" if isinstance(expression, exp.Query) else expression.key.upper()
+        return _QueryJob(statement_type, self._estimate_bytes(expression))
+
+    def query_and_wait(
+        self,
+        query: str,
+        job_config: Optional[bigquery.QueryJobConfig] = None,
+        max_results: Optional[int] = None,
+    ) -> _RowIterator:
+        """Run a statement and return its rows."""
+        with self._lock:
+            self.queries += 1
+            expression, sqlite_query = self._to_sqlite(query)
+            bytes_processed = self._estimate_bytes(expression)
+            maximum_bytes_billed = job_config.maximum_bytes_billed if job_config else None
+            if maximum_bytes_billed and bytes_processed > maximum_bytes_billed:
+                raise BadRequest(f"Query exceeded limit for bytes billed: {maximum_bytes_billed}.")
+            try:
+                cursor = self._connection.execute(sqlite_query)
+                values = cursor.fetchall()
+            except sqlite3.Error as e:
+                raise BadRequest(f"{e} in query: {sqlite_query}")
+
+        names = [column[0] for column in cursor.description or []]
+        field_to_index = {name: index for index, name in enumerate(names)}
+        schema = [
+            bigquery.SchemaField(name, self._field_type(values[0][index] if values else None))
+            for index, name in enumerate(names)
+        ]
+        rows = [bigquery.Row(row, field_to_index) for row in values[:max_results]]
+        return _RowIterator(rows, schema, len(values), bytes_processed)
+
+    @staticmethod
+    def _field_type(value: Any) -> str:
+        if isinstance(value, int):
+            return "INTEGER"
+        if isinstance(value, float):
+            return "FLOAT"
+        return "STRING"
+
+    def list_tables(self, dataset_ref: str) -> list[bigquery.Table]:
+        return [self.get_table(f"{dataset_ref}.{table_id}") for table_id in self._tables]
+
+    def get_table(self, table_ref: str) -> bigquery.Table:
+        table_id = table_ref.rsplit(".", 1)[-1]
+        fixture = self._tables.get(table_id)
+        if fixture is None:
+            raise NotFound(f"Not found: Table {table_ref}")
+        table = bigquery.Table(
+            table_ref,
+            schema=[
+                bigquery.SchemaField(field["name"], field["type"], description=field.get("description"))
+                for field in fixture["schema"]
+            ],
+        )
+        table.description = fixture.get("description")
+        table._properties["numRows"] = str(len(fixture["rows"]))
+        table._properties["lastModifiedTime"] = str(int(self._modified.timestamp() * 1000))
+        return table
+
+
+def local_toolset_functions(client: LocalBigQueryClient) -> list[Callable]:
+    """Build local replacements for the tools of the ADK `BigQueryToolset` backed by the local client.
+
+    Args:
+        client: The local client to run the tools against.
+
+    Returns:
+        list[Callable]: `execute_sql`, `list_dataset_ids` and `get_dataset_info` functions.
+    """
+
+    def execute_sql(project_id: str, query: str) -> dict:
+        """Run a BigQuery SQL query in the project and return the result.
+
+        Args:
+            project_id (str): The GCP project id in which the query should be executed.
+            query (str): The BigQuery SQL query to be executed.
+
+        Returns:
+            dict: Dictionary representing the result of the query.
+        """
+        try:
+            if client.query(query, job_config=bigquery.QueryJobConfig(dry_run=True)).statement_type != "SELECT":
+                return {"status": "ERROR", "error_details": "Read-only mode only supports SELECT statements."}
+            rows = client.query_and_wait(query, max_results=50)
+        except BadRequest as e:
+            return {"status": "ERROR", "error_details": str(e)}
+        return {"status": "SUCCESS", "rows": [dict(row.items()) for row in rows]}
+
+    def list_dataset_ids(project_id: str) -> list[str]:
+        """List BigQuery dataset ids in a Google Cloud project.
+
+        Args:
+            project_id (str): The Google Cloud project id.
+
+        Returns:
+            list[str]: List of the BigQuery dataset ids present in the project.
+        """
+        return [client.dataset_id]
+
+    def get_dataset_info(project_id: str, dataset_id: str) -> dict:
+        """Get metadata information about a BigQuery dataset.
+
+        Args:
+            project_id (str): The Google Cloud project id containing the dataset.
+            dataset_id (str): The BigQuery dataset id.
+
+        Returns:
+            dict: Dictionary representing the properties of the dataset.
+        """
+        return {
+            "kind": "bigquery#dataset",
+            "datasetReference": {"projectId": project_id, "datasetId": dataset_id},
+            "location": "US",
+        }
+
+    return [execute_sql, list_dataset_ids, get_dataset_info]
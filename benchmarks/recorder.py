@@ -0,0 +1,91 @@
+import time
+from collections import defaultdict
+from typing import Optional
+
+from google.adk.agents import BaseAgent, LoopAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmResponse
+from google.adk.plugins import BasePlugin
+
+
+def _agent_stats() -> dict:
+    return {"runs": 0, "wall_time_seconds": 0.0, "model_calls": 0, "prompt_tokens": 0, "response_tokens": 0}
+
+
+class BenchmarkRecorder(BasePlugin):
+    """Runner plugin collecting per-agent wall time, model calls, token counts and loop iterations.
+
+    Wall time of an agent includes its sub-agents. Runs of the same agent on concurrent branches are timed
+    separately and summed. Token counts come from the usage metadata of the model responses.
+    """
+
+    def __init__(self, root_agent: BaseAgent):
+        super().__init__(name="benchmark_recorder")
+        self.agents: dict[str, dict] = defaultdict(_agent_stats)
+        self.wall_time_seconds = 0.0
+        self._started: dict[tuple[str, str, Optional[str]], float] = {}
+        # A loop iteration starts whenever the first sub-agent of a loop starts.
+        self._loop_first_agents: dict[str, str] = {}
+        self._collect_loops(root_agent)
+        self._run_started: Optional[float] = None
+
+    def _collect_loops(self, agent: BaseAgent) -> None:
+        if isinstance(agent, LoopAgent) and agent.sub_agents:
+            self._loop_first_agents[agent.sub_agents[0].name] = agent.name
+        for sub_agent in agent.sub_agents:
+            self._collect_loops(sub_agent)
+
+    @staticmethod
+    def _run_key(agent: BaseAgent, callback_context: CallbackContext) -> tuple[str, str, Optional[str]]:
+        return agent.name, callback_context.invocation_id, callback_context._invocation_context.branch
+
+    async def before_run_callback(self, *, invocation_context) -> None:
+        self._run_started = time.perf_counter()
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        self.wall_time_seconds += time.perf_counter() - self._run_started
+
+    async def before_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext) -> None:
+        self.agents[agent.name]["runs"] += 1
+        self._started[self._run_key(agent, callback_context)] = time.perf_counter()
+
+    async def after_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext) -> None:
+        started = self._started.pop(self._run_key(agent, callback_context), None)
+        if started is not None:
+            self.agents[agent.name]["wall_time_seconds"] += time.perf_counter() - started
+
+    async def after_model_callback(self, *, callback_context: CallbackContext, llm_response: LlmResponse) -> None:
+        if llm_response.partial:
+            return
+        stats = self.agents[callback_context.agent_name]
+        stats["model_calls"] += 1
+        usage = llm_response.usage_metadata
+        if usage is not None:
+            stats["prompt_tokens"] += usage.prompt_token_count or 0
+            stats["response_tokens"] += usage.candidates_token_count or 0
+
+    def loop_iterations(self) -> dict[str, int]:
+        """Return the number of iterations every loop agent ran, summed over all runs of the loop."""
+        iterations = defaultdict(int)
+        for agent_name, loop_name in self._loop_first_agents.items():
+            iterations[loop_name] += self.agents[agent_name]["runs"] if agent_name in self.agents else 0
+        return dict(iterations)
+
+    def report(self) -> dict:
+        """Return the collected metrics.
+
+        Returns:
+            dict: `wall_time_seconds`, `totals` of model calls and tokens, per-agent stats in `agents` and
+                `loop_iterations`.
+        """
+        agents = {name: {**stats, "wall_time_seconds": round(stats["wall_time_seconds"], 4)}
+                  for name, stats in sorted(self.agents.items())}
+        return {
+            "wall_time_seconds": round(self.wall_time_seconds, 4),
+            "totals": {
+                key: sum(stats[key] for stats in agents.values())
+                for key in ("model_calls", "prompt_tokens", "response_tokens")
+            },
+            "agents": agents,
+            "loop_iterations": self.loop_iterations(),
+        }
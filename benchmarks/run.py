@@ -0,0 +1,239 @@
+"""Run offline benchmark scenarios of the agent graph and compare them against recorded baselines.
+
+Every scenario is a JSON file with:
+    - `agent`: Name of the agent in `dar.agent` to run, defaults to `research_pipeline`.
+    - `initial_state`: Session state before the first message, e.g. the approved `research_plan`.
+    - `user_messages`: Messages sent one after another, either a text or `{"text": ..., "state": {...}}` to
+      update the session state before the message is sent, e.g. to edit the plan between runs.
+    - `tables`: Fixture tables of the local SQL backend, see `LocalBigQueryClient`.
+    - `responses`: Scripted model responses per agent name, see `ScriptedLlm`.
+
+Usage:
+    python -m benchmarks.run benchmarks/scenarios/*.json --baseline-dir benchmarks/baselines
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.adk.tools.bigquery import BigQueryToolset
+from google.genai import types as genai_types
+from tabulate import tabulate
+
+import dar.agent
+from dar.config import CONFIG
+from dar.tools import bigquery_tools
+from dar.tools.metadata_cache import DatasetMetadataCache
+
+from benchmarks.local_bigquery import LocalBigQueryClient, local_toolset_functions
+from benchmarks.recorder import BenchmarkRecorder
+from benchmarks.scripted_llm import ScriptedLlm
+
+APP_NAME = "dar_benchmark"
+USER_ID = "benchmark"
+
+
+def _walk_agents(agent: BaseAgent, seen: set[int] | None = None):
+    """Yield the agent, its sub-agents and agents wrapped in an `AgentTool`, each once."""
+    seen = seen if seen is not None else set()
+    if id(agent) in seen:
+        return
+    seen.add(id(agent))
+    yield agent
+    for sub_agent in agent.sub_agents:
+        yield from _walk_agents(sub_agent, seen)
+    if isinstance(agent, LlmAgent):
+        for tool in agent.tools:
+            if isinstance(tool, AgentTool):
+                yield from _walk_agents(tool.agent, seen)
+
+
+def install_local_backend(agent: BaseAgent, client: LocalBigQueryClient) -> None:
+    """Route every BigQuery access of the agent graph to the local client.
+
+    The custom tools and executors go through `bigquery_tools.get_bigquery_client` and `get_metadata_cache` and read
+    results without a Storage Read API client, the ADK BigQuery toolsets are replaced with local functions of the
+    same names.
+    """
+    bigquery_tools.get_bigquery_client = lambda: client
+    bigquery_tools.get_bqstorage_client = lambda: None
+    metadata_cache = DatasetMetadataCache(
+        project_id=CONFIG.project_id,
+        dataset_id=CONFIG.dataset,
+        client_factory=lambda: client,
+        refresh_seconds=CONFIG.metadata_cache_refresh_seconds,
+    )
+    bigquery_tools.get_metadata_cache = lambda: metadata_cache
+    local_tools = local_toolset_functions(client)
+    for llm_agent in _walk_agents(agent):
+        if not isinstance(llm_agent, LlmAgent):
+            continue
+        tools = []
+        for tool in llm_agent.tools:
+            if isinstance(tool, BigQueryToolset):
+                tools.extend(
+                    function for function in local_tools
+                    if not isinstance(tool.tool_filter, list) or function.__name__ in tool.tool_filter
+                )
+            else:
+                tools.append(tool)
+        llm_agent.tools = tools
+
+
+def install_scripted_models(agent: BaseAgent, responses: dict[str, list]) -> dict[str, ScriptedLlm]:
+    """Replace the model of every LLM agent with a `ScriptedLlm` replaying the agent's scripted responses."""
+    models = {}
+    for llm_agent in _walk_agents(agent):
+        if isinstance(llm_agent, LlmAgent):
+            models[llm_agent.name] = ScriptedLlm(
+                model=f"scripted-{llm_agent.name}", responses=list(responses.get(llm_agent.name, []))
+            )
+            llm_agent.model = models[llm_agent.name]
+    unknown = set(responses) - set(models)
+    if unknown:
+        raise ValueError(f"Scripted responses for unknown agents: {', '.join(sorted(unknown))}")
+    return models
+
+
+async def run_scenario(scenario: dict) -> dict:
+    """Run a scenario end to end and collect its metrics.
+
+    Args:
+        scenario: Parsed scenario file.
+
+    Returns:
+        dict: The `BenchmarkRecorder` report extended with local SQL backend counters and the number of scripted
+            responses left unused per agent.
+    """
+    agent = getattr(dar.agent, scenario.get("agent", "research_pipeline"))
+    client = LocalBigQueryClient(CONFIG.project_id, CONFIG.dataset, scenario["tables"])
+    install_local_backend(agent, client)
+    models = install_scripted_models(agent, scenario["responses"])
+    recorder = BenchmarkRecorder(agent)
+
+    runner = InMemoryRunner(agent=agent, app_name=APP_NAME, plugins=[recorder])
+    state = {
+        "PROJECT": CONFIG.project_id,
+        "BQ_LOCATION": CONFIG.location,
+        "BQ_DATASET": CONFIG.dataset,
+        "BQ_CONNECTION_ID": CONFIG.connection_id,
+        "BQ_MODEL": CONFIG.bq_model,
+        **scenario.get("initial_state", {}),
+    }
+    session = await runner.session_service.create_session(app_name=APP_NAME, user_id=USER_ID, state=state)
+    for message in scenario["user_messages"]:
+        if isinstance(message, dict):
+            session = await runner.session_service.get_session(
+                app_name=APP_NAME, user_id=USER_ID, session_id=session.id
+            )
+            await runner.session_service.append_event(session, Event(
+                invocation_id=Event.new_id(), author="user", actions=EventActions(state_delta=message["state"])
+            ))
+            message = message["text"]
+        new_message = genai_types.Content(role="user", parts=[genai_types.Part(text=message)])
+        async for _ in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=new_message):
+            pass
+
+    report = recorder.report()
+    report["sql"] = {"queries": client.queries, "ai_function_calls": client.ai_function_calls}
+    report["unused_responses"] = {name: len(model.responses) for name, model in models.items() if model.responses}
+    return report
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """List the metrics of a report that regressed against the baseline.
+
+    Runs, model calls, loop iterations and SQL counters must not grow, token counts may grow by `tolerance`.
+    Wall time depends on the machine and is only reported.
+
+    Args:
+        report: Report of the current run.
+        baseline: Report recorded as baseline.
+        tolerance: Allowed relative growth of token counts.
+
+    Returns:
+        list[str]: One message per regressed metric.
+    """
+    regressions = []
+
+    def check(label: str, value: int, baseline_value: int, allowed_growth: float = 0.0):
+        if value > baseline_value * (1 + allowed_growth):
+            regressions.append(f"{label}: {value} > baseline {baseline_value}")
+
+    for agent_name, stats in report["agents"].items():
+        baseline_stats = baseline["agents"].get(agent_name)
+        if baseline_stats is None:
+            regressions.append(f"{agent_name}: agent not in baseline")
+            continue
+        for key in ("runs", "model_calls"):
+            check(f"{agent_name}.{key}", stats[key], baseline_stats[key])
+        for key in ("prompt_tokens", "response_tokens"):
+            check(f"{agent_name}.{key}", stats[key], baseline_stats[key], tolerance)
+    for loop_name, iterations in report["loop_iterations"].items():
+        check(f"{loop_name}.iterations", iterations, baseline["loop_iterations"].get(loop_name, 0))
+    for key, value in report["sql"].items():
+        check(f"sql.{key}", value, baseline["sql"].get(key, 0))
+    if report["unused_responses"]:
+        regressions.append(f"scripted responses left unused: {report['unused_responses']}")
+    return regressions
+
+
+def _print_report(name: str, report: dict) -> None:
+    rows = [
+        [agent_name, stats["runs"], stats["wall_time_seconds"], stats["model_calls"], stats["prompt_tokens"],
+         stats["response_tokens"]]
+        for agent_name, stats in report["agents"].items()
+    ]
+    print(f"\n## {name} ({report['wall_time_seconds']}s)\n")
+    print(tabulate(rows, headers=["agent", "runs", "wall time (s)", "model calls", "prompt tokens",
+                                  "response tokens"], tablefmt="github"))
+    print(f"\nTotals: {report['totals']}")
+    print(f"Loop iterations: {report['loop_iterations']}")
+    print(f"SQL: {report['sql']}")
+    if report["unused_responses"]:
+        print(f"Unused scripted responses: {report['unused_responses']}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="+", type=Path, help="Scenario JSON files.")
+    parser.add_argument("--baseline-dir", type=Path, help="Directory with one baseline report per scenario.")
+    parser.add_argument("--update-baseline", action="store_true", help="Record the reports as new baselines.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative growth of token counts.")
+    parser.add_argument("--output", type=Path, help="Write all reports to this JSON file.")
+    args = parser.parse_args(argv)
+
+    reports = {}
+    failed = False
+    for path in args.scenarios:
+        report = asyncio.run(run_scenario(json.loads(path.read_text())))
+        reports[path.stem] = report
+        _print_report(path.stem, report)
+
+        if not args.baseline_dir:
+            continue
+        baseline_path = args.baseline_dir / f"{path.stem}.json"
+        if args.update_baseline:
+            args.baseline_dir.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(report, indent=2) + "\n")
+            print(f"Recorded baseline {baseline_path}")
+        elif baseline_path.exists():
+            regressions = compare_to_baseline(report, json.loads(baseline_path.read_text()), args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {path.stem}: {regression}")
+            failed = failed or bool(regressions)
+        else:
+            print(f"No baseline for {path.stem} at {baseline_path}")
+
+    if args.output:
+        args.output.write_text(json.dumps(reports, indent=2) + "\n")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
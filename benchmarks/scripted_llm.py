@@ -0,0 +1,83 @@
+import json
+from collections.abc import AsyncGenerator
+from typing import Union
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.genai import types as genai_types
+from pydantic import Field
+
+from dar.tools.state_compaction import estimate_tokens
+
+ScriptedResponse = Union[str, dict]
+
+
+def request_text(llm_request: LlmRequest) -> str:
+    """Flatten everything a model request sends, instruction, tool declarations and contents, into one text."""
+    texts = []
+    system_instruction = llm_request.config.system_instruction if llm_request.config else None
+    if isinstance(system_instruction, str):
+        texts.append(system_instruction)
+    elif isinstance(system_instruction, genai_types.Content):
+        texts.extend(part.text for part in system_instruction.parts or [] if part.text)
+    for tool in (llm_request.config.tools if llm_request.config else None) or []:
+        texts.append(tool.model_dump_json(exclude_none=True))
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.text:
+                texts.append(part.text)
+            elif part.function_call:
+                texts.append(json.dumps({"name": part.function_call.name, "args": part.function_call.args}))
+            elif part.function_response:
+                texts.append(json.dumps(
+                    {"name": part.function_response.name, "response": part.function_response.response}, default=str
+                ))
+    return "\n".join(texts)
+
+
+def _response_parts(response: ScriptedResponse) -> list[genai_types.Part]:
+    if isinstance(response, str):
+        return [genai_types.Part(text=response)]
+    if "function_call" in response:
+        call = response["function_call"]
+        return [genai_types.Part(function_call=genai_types.FunctionCall(name=call["name"], args=call.get("args", {})))]
+    text = response["text"]
+    return [genai_types.Part(text=text if isinstance(text, str) else json.dumps(text))]
+
+
+class ScriptedLlm(BaseLlm):
+    """Model that replays scripted responses instead of calling Gemini.
+
+    Responses are either a text, `{"text": ...}` (a JSON value for agents with an output schema) or
+    `{"function_call": {"name": ..., "args": {...}}}`. A response with a `"match"` substring is only used for
+    requests containing it, so concurrent runs of the same agent receive their own responses; otherwise the
+    responses are replayed in order. Usage metadata is filled with token counts estimated by `estimate_tokens`.
+    """
+
+    responses: list[ScriptedResponse] = Field(default_factory=list)
+
+    def _next_response(self, prompt: str) -> ScriptedResponse:
+        for index, response in enumerate(self.responses):
+            if isinstance(response, dict) and "match" in response and response["match"] not in prompt:
+                continue
+            return self.responses.pop(index)
+        raise ValueError(f"No scripted response left for '{self.model}'.")
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        prompt = request_text(llm_request)
+        parts = _response_parts(self._next_response(prompt))
+        response_text = "\n".join(
+            part.text if part.text else json.dumps({"name": part.function_call.name, "args": part.function_call.args})
+            for part in parts
+        )
+        prompt_tokens = estimate_tokens(prompt)
+        response_tokens = estimate_tokens(response_text)
+        yield LlmResponse(
+            content=genai_types.Content(role="model", parts=parts),
+            usage_metadata=genai_types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=response_tokens,
+                total_token_count=prompt_tokens + response_tokens,
+            ),
+        )
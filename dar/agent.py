@@ -1,7 +1,11 @@
+import threading
+
 from google.adk.agents import LlmAgent, LoopAgent, SequentialAgent
 from google.adk.tools.agent_tool import AgentTool
 
-from dar.sub_agents.checkers import EscalationChecker
+from dar.cascade import cascade_model
+from dar.sub_agents.checkers import EscalationChecker, QueryExecutionChecker
+from dar.sub_agents.code_execution_agent import code_execution_agent, warm_code_executor
 from dar.sub_agents.research_agent.scratch_research import scratch_research_agent
 from dar.sub_agents.research_agent.plan_creator import plan_creator
 from dar.sub_agents.research_agent.report_revision import report_revision
@@ -11,7 +15,14 @@ from dar.sub_agents.sql_agent.query_understanding import query_understanding_age
 from dar.sub_agents.sql_agent.query_generation import query_generation_agent
 from dar.sub_agents.sql_agent.query_review_rewrite import query_review_rewrite_agent
 from dar.sub_agents.sql_agent.query_execution import query_execution_agent
+from dar.sub_agents.sql_agent.goal_fan_out import PlanGoalFanOut
 from dar.config import CONFIG, before_agent_callback
+from dar.telemetry import instrument_agent_tree
+from dar.tools.bigquery_tools import warm_metadata_cache
+from dar.tools.context_cache import install_context_cache
+from dar.tools.llm_response_cache import install_llm_response_cache
+from dar.tools.stage_cache import reuse_unchanged_stage
+from dar.tools.state_compaction import enforce_prompt_token_budget
 
 
 sql_agent = SequentialAgent(
@@ -24,6 +35,7 @@ sql_agent = SequentialAgent(
             name="query_refinement_loop",
             sub_agents=[
                 query_execution_agent,
+                QueryExecutionChecker(name="query_execution_checker"),
                 query_review_rewrite_agent,
             ],
             max_iterations=7
@@ -31,12 +43,20 @@ sql_agent = SequentialAgent(
     ],
 )
 
+sql_goal_fan_out = PlanGoalFanOut(
+    name="sql_goal_fan_out",
+    description="Splits the research plan into independent goals and runs the sql agent for each goal concurrently.",
+    sub_agents=[sql_agent],
+    max_concurrency=CONFIG.max_parallel_goals,
+)
+
 report_composer = LlmAgent(
-    model=CONFIG.critic_model,
+    model=cascade_model("report_composer"),
     name="report_composer",
     include_contents="none",
     description="Transforms research data and a markdown outline into a final, cited report.",
     output_key="final_report",
+    before_model_callback=enforce_prompt_token_budget,
     instruction="""
     Transform the provided data into a polished, professional, and meticulously cited research report.
 
@@ -54,25 +74,54 @@ report_composer = LlmAgent(
 )
 
 
+iterative_refinement_loop = LoopAgent(
+    name="iterative_refinement_loop",
+    max_iterations=CONFIG.max_feedback_iterations,
+    sub_agents=[
+        research_evaluator,
+        EscalationChecker(name="escalation_checker"),
+        report_revision,
+    ],
+)
+
+# When an edited plan is run again, the fan-out reuses the SQL outputs of unchanged goals and the report stages
+# below are skipped as long as the state they read is unchanged.
+reuse_unchanged_stage(
+    code_execution_agent,
+    input_keys=["research_plan", "query_execution_output"],
+    output_keys=["statistical_analysis_output"],
+)
+reuse_unchanged_stage(report_structure_planner, input_keys=["research_plan"], output_keys=["report_sections"])
+reuse_unchanged_stage(
+    scratch_research_agent,
+    input_keys=["research_plan", "query_execution_output", "statistical_analysis_output"],
+    output_keys=["section_research_findings"],
+)
+reuse_unchanged_stage(
+    iterative_refinement_loop,
+    input_keys=["research_plan", "query_execution_output", "statistical_analysis_output", "section_research_findings"],
+    output_keys=["research_evaluation", "final_revised_report"],
+)
+reuse_unchanged_stage(
+    report_composer,
+    input_keys=["research_plan", "section_research_findings", "report_sections"],
+    output_keys=["final_report"],
+)
+
 research_pipeline = SequentialAgent(
     name="research_pipeline",
     description="Executes a pre-approved research plan. It performs iterative research through query writing and"
-                " refinement, evaluation, and composes a final, cited report.",
+                " refinement, statistical analysis, evaluation, and composes a final, cited report.",
     sub_agents=[
-        sql_agent,
+        sql_goal_fan_out,
+        code_execution_agent,
         report_structure_planner,
         scratch_research_agent,
-        LoopAgent(
-            name="iterative_refinement_loop",
-            max_iterations=CONFIG.max_feedback_iterations,
-            sub_agents=[
-                research_evaluator,
-                EscalationChecker(name="escalation_checker"),
-                report_revision,
-            ],
-        ),
+        iterative_refinement_loop,
         report_composer,
     ],
+    # The code interpreters start while the queries run.
+    before_agent_callback=warm_code_executor,
 )
 
 research_initiator_agent = LlmAgent(
@@ -104,3 +153,14 @@ research_initiator_agent = LlmAgent(
 )
 
 root_agent = research_initiator_agent
+
+# Installed first, so the telemetry callbacks do not count replayed responses as model calls, and before the
+# context cache, whose cached content names must not be part of the response cache keys.
+if CONFIG.llm_cache_enabled:
+    install_llm_response_cache(root_agent)
+if CONFIG.context_cache_enabled:
+    install_context_cache(root_agent)
+if CONFIG.telemetry_enabled:
+    instrument_agent_tree(root_agent)
+if CONFIG.metadata_cache_warm_on_startup:
+    threading.Thread(target=warm_metadata_cache, name="metadata-cache-warmup", daemon=True).start()
@@ -0,0 +1,180 @@
+"""Run research requests from a JSONL file without user interaction.
+
+Every input line is a JSON object with the request text in `prompt` (or `body`, or `title`) and an optional `id`
+(or `request_id`, defaults to the line number). For every request a plan is drafted by `research_initiator_agent`,
+approved automatically and executed by `research_pipeline`. Requests run concurrently in a bounded worker pool.
+
+Every finished request is appended to the output JSONL as soon as it completes, with its plan, final report,
+wall time and the per-agent telemetry. When the output file exists, requests already completed successfully are
+skipped, so an interrupted batch resumes where it left off and failed requests are retried.
+
+Usage:
+    python -m dar.batch requests.jsonl --output reports.jsonl --workers 4
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from google.adk.runners import InMemoryRunner, Runner
+from google.genai import types as genai_types
+
+from dar.agent import research_pipeline, root_agent
+
+logger = logging.getLogger(__name__)
+
+APP_NAME = "dar_batch"
+USER_ID = "batch"
+APPROVAL_MESSAGE = "The plan is approved, run it."
+
+
+def load_requests(path: Path) -> list[dict]:
+    """Read the research requests of a JSONL file.
+
+    Args:
+        path: JSONL file with one request object per line, blank lines are ignored.
+
+    Returns:
+        list[dict]: Requests with `id` and `prompt`.
+    """
+    requests = []
+    for line_number, line in enumerate(path.read_text().splitlines(), start=1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        prompt = item.get("prompt") or item.get("body") or item.get("title")
+        if not prompt:
+            raise ValueError(f"{path}:{line_number}: request has no 'prompt', 'body' or 'title'")
+        request_id = str(item.get("id") or item.get("request_id") or line_number)
+        requests.append({"id": request_id, "prompt": prompt})
+    return requests
+
+
+def completed_request_ids(path: Path) -> set[str]:
+    """Return the ids of the requests an earlier run of the batch completed successfully."""
+    if not path.exists():
+        return set()
+    completed = set()
+    for line in path.read_text().splitlines():
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # The last line is cut off when the batch was killed while writing it.
+            continue
+        if record.get("status") == "success":
+            completed.add(record["id"])
+    return completed
+
+
+class BatchRunner:
+    """Runs research requests end to end, one session per request, and appends the results to a JSONL file."""
+
+    def __init__(self, output_path: Path, workers: int, timeout_seconds: Optional[float] = None):
+        self.output_path = output_path
+        self.workers = workers
+        self.timeout_seconds = timeout_seconds
+        self._planner = InMemoryRunner(agent=root_agent, app_name=APP_NAME)
+        # The pipeline runs on the planner's sessions, as if the initiator delegated to it after approval.
+        self._pipeline = Runner(
+            app_name=APP_NAME,
+            agent=research_pipeline,
+            session_service=self._planner.session_service,
+            artifact_service=self._planner.artifact_service,
+            memory_service=self._planner.memory_service,
+        )
+        self._write_lock = asyncio.Lock()
+
+    @staticmethod
+    async def _send(runner: Runner, session_id: str, text: str) -> None:
+        new_message = genai_types.Content(role="user", parts=[genai_types.Part(text=text)])
+        async for _ in runner.run_async(user_id=USER_ID, session_id=session_id, new_message=new_message):
+            pass
+
+    async def _research(self, request: dict) -> dict:
+        session = await self._planner.session_service.create_session(app_name=APP_NAME, user_id=USER_ID)
+        await self._send(self._planner, session.id, request["prompt"])
+        session = await self._planner.session_service.get_session(
+            app_name=APP_NAME, user_id=USER_ID, session_id=session.id
+        )
+        if not session.state.get("research_plan"):
+            raise RuntimeError("No research plan was drafted for the request.")
+
+        await self._send(self._pipeline, session.id, APPROVAL_MESSAGE)
+        session = await self._planner.session_service.get_session(
+            app_name=APP_NAME, user_id=USER_ID, session_id=session.id
+        )
+        if not session.state.get("final_report"):
+            raise RuntimeError("The research pipeline finished without a final report.")
+        return {
+            "session_id": session.id,
+            "research_plan": session.state.get("research_plan"),
+            "final_report": session.state.get("final_report"),
+            "telemetry": session.state.get("telemetry"),
+        }
+
+    async def _run_request(self, request: dict, semaphore: asyncio.Semaphore) -> bool:
+        async with semaphore:
+            logger.info(f"Starting request {request['id']}")
+            started = time.perf_counter()
+            record = {"id": request["id"], "prompt": request["prompt"]}
+            try:
+                result = await asyncio.wait_for(self._research(request), timeout=self.timeout_seconds)
+                record.update(status="success", **result)
+            except Exception as e:
+                logger.exception(f"Request {request['id']} failed")
+                record.update(status="error", error=f"{type(e).__name__}: {e}")
+            record["wall_time_s"] = round(time.perf_counter() - started, 2)
+            await self._append(record)
+            logger.info(f"Finished request {request['id']} with status {record['status']} in {record['wall_time_s']}s")
+            return record["status"] == "success"
+
+    async def _append(self, record: dict) -> None:
+        async with self._write_lock:
+            with self.output_path.open("a") as output:
+                output.write(json.dumps(record, default=str) + "\n")
+                output.flush()
+                os.fsync(output.fileno())
+
+    async def run(self, requests: list[dict]) -> tuple[int, int]:
+        """Run the requests not completed yet.
+
+        Args:
+            requests: Requests with `id` and `prompt`.
+
+        Returns:
+            tuple[int, int]: Number of requests that succeeded and failed in this run.
+        """
+        completed = completed_request_ids(self.output_path)
+        pending = [request for request in requests if request["id"] not in completed]
+        if len(pending) < len(requests):
+            logger.info(f"Skipping {len(requests) - len(pending)} requests completed in an earlier run")
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.workers)
+        outcomes = await asyncio.gather(*(self._run_request(request, semaphore) for request in pending))
+        return sum(outcomes), len(outcomes) - sum(outcomes)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("requests", type=Path, help="JSONL file with one research request per line.")
+    parser.add_argument("--output", type=Path, required=True, help="JSONL file the results are appended to.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of requests researched at the same time.")
+    parser.add_argument("--timeout", type=float, help="Seconds after which a single request is aborted.")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    batch_runner = BatchRunner(args.output, workers=args.workers, timeout_seconds=args.timeout)
+    succeeded, failed = asyncio.run(batch_runner.run(load_requests(args.requests)))
+    print(f"{succeeded} requests succeeded, {failed} failed, results in {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
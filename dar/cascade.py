@@ -0,0 +1,213 @@
+"""Model cascade for the critic agents: the worker model answers first, the critic model only when needed.
+
+A `CascadeLlm` sends every request to `CONFIG.worker_model` and checks the response for a confidence signal: an
+agent specific check such as a schema-valid `Feedback` or SQL that parses, and the certainty the model reports
+about its answer. Responses failing the check are discarded and the request is sent to `CONFIG.critic_model`.
+Which model answered and why a request was escalated is reported in the response's `custom_metadata` and counted
+per agent by the telemetry callbacks.
+"""
+import logging
+import re
+from collections.abc import AsyncGenerator
+from typing import Callable, Optional, Union
+
+import sqlglot
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types as genai_types
+from pydantic import ValidationError
+from sqlglot.errors import SqlglotError
+
+from dar.config import CONFIG
+from dar.schema import Feedback
+from dar.tools.context_cache import attach_context_cache
+from dar.tools.sql_utils import SQL_DIALECT, extract_sql, split_statements
+
+logger = logging.getLogger(__name__)
+
+CONFIDENCE_LEVELS = ("low", "medium", "high")
+CONFIDENCE_INSTRUCTION = (
+    "\n\nEnd your response with a separate last line `Confidence: high`, `Confidence: medium` or "
+    "`Confidence: low`, stating how certain you are that your response is correct and complete."
+)
+_CONFIDENCE_LINE_RE = re.compile(
+    r"\n?[ \t*_`]*confidence[ \t*_`]*:[ \t*_`]*(low|medium|high)\b[^\n]*\s*$", re.IGNORECASE
+)
+
+# Returns why a response text needs the stronger model, None if the response is good enough.
+ResponseCheck = Callable[[str], Optional[str]]
+
+
+def _below_minimum(confidence: str) -> bool:
+    minimum = CONFIG.cascade_min_confidence
+    return CONFIDENCE_LEVELS.index(confidence.lower()) < CONFIDENCE_LEVELS.index(minimum)
+
+
+def check_feedback(text: str) -> Optional[str]:
+    """Escalate evaluations that are not a valid `Feedback` or whose reported confidence is low."""
+    try:
+        feedback = Feedback.model_validate_json(text)
+    except ValidationError as e:
+        return f"the response is not a valid Feedback ({e.error_count()} errors)"
+    if feedback.confidence and _below_minimum(feedback.confidence):
+        return f"the reported confidence is {feedback.confidence}"
+    return None
+
+
+def check_sql(text: str) -> Optional[str]:
+    """Escalate responses without SQL or with a statement sqlglot cannot parse."""
+    statements = split_statements(extract_sql(text))
+    if not statements:
+        return "the response contains no SQL"
+    for statement in statements:
+        try:
+            sqlglot.parse_one(statement, read=SQL_DIALECT)
+        except SqlglotError as e:
+            return f"the SQL does not parse: {str(e).splitlines()[0]}"
+    return None
+
+
+def _response_text(response: LlmResponse) -> str:
+    parts = response.content.parts if response.content else None
+    return "".join(part.text for part in parts or [] if part.text and not part.thought)
+
+
+def _strip_confidence(response: LlmResponse) -> Optional[str]:
+    """Remove the confidence line from the last text part of a response and return the reported level."""
+    parts = [part for part in (response.content.parts if response.content else None) or []
+             if part.text and not part.thought]
+    if not parts:
+        return None
+    match = _CONFIDENCE_LINE_RE.search(parts[-1].text)
+    if match is None:
+        return None
+    parts[-1].text = parts[-1].text[:match.start()].rstrip()
+    return match.group(1).lower()
+
+
+class CascadeLlm(BaseLlm):
+    """Model that answers with `primary` and escalates to `fallback` when the answer fails its confidence check.
+
+    With `ask_confidence`, the primary model is asked to rate its certainty on a last line, which is removed from
+    the response; responses without a rating or with a rating below `CONFIG.cascade_min_confidence` are
+    escalated. Agents with an output schema report their confidence in the schema and leave it off. Responses
+    with function calls are not checked, the agent's final answer is.
+
+    Requests failing on the primary model, e.g. with a quota or server error or a timeout, are escalated as well.
+    When the fallback model returns nothing either, the primary response or an error response is returned, so the
+    agent always receives a response.
+
+    Both models are called without streaming, as a response can only be checked once it is complete; `stream` is
+    ignored and a single complete response is yielded. The token usage of an escalated response includes the
+    discarded primary response. Requests of agents listed in `CONFIG.context_cache_agents` reference the cached
+    instruction prefix of the model they are sent to, see `dar.tools.context_cache`.
+    """
+
+    primary: BaseLlm
+    fallback: BaseLlm
+    check: Optional[ResponseCheck] = None
+    ask_confidence: bool = False
+    # Name of the agent using the cascade, decides whether its requests use cached contents.
+    agent_name: str = ""
+
+    async def _generate(self, llm: BaseLlm, llm_request: LlmRequest, ask_confidence: bool) -> Optional[LlmResponse]:
+        config = llm_request.config.model_copy() if llm_request.config else genai_types.GenerateContentConfig()
+        if ask_confidence:
+            config.system_instruction = (config.system_instruction or "") + CONFIDENCE_INSTRUCTION
+        request = llm_request.model_copy(update={
+            "model": llm.model, "contents": list(llm_request.contents), "config": config
+        })
+        if self.agent_name in CONFIG.context_cache_agents:
+            await attach_context_cache(request, llm)
+        response = None
+        async for response in llm.generate_content_async(request, stream=False):
+            pass
+        return response
+
+    def _escalation_reason(self, response: Optional[LlmResponse]) -> Optional[str]:
+        if response is None or response.error_code or response.content is None:
+            return f"the model returned no answer ({response.error_code if response else 'empty'})"
+        if any(part.function_call for part in response.content.parts or []):
+            return None
+        if self.ask_confidence:
+            confidence = _strip_confidence(response)
+            if confidence is None:
+                return "no confidence was reported"
+            if _below_minimum(confidence):
+                return f"the reported confidence is {confidence}"
+        return self.check(_response_text(response)) if self.check else None
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        try:
+            response = await self._generate(self.primary, llm_request, self.ask_confidence)
+            reason = self._escalation_reason(response)
+        except Exception as e:  # noqa: BLE001 - any failure of the primary model is what the fallback is for.
+            response, reason = None, f"the model failed with {type(e).__name__}: {e}"
+        if reason is None:
+            response.custom_metadata = {
+                **(response.custom_metadata or {}), "cascade": {"model": self.primary.model, "escalated": False}
+            }
+            yield response
+            return
+
+        logger.info(f"Escalating from {self.primary.model} to {self.fallback.model}: {reason}")
+        escalated = await self._generate(self.fallback, llm_request, ask_confidence=False)
+        if escalated is None:
+            logger.warning(f"{self.fallback.model} returned no response after escalation: {reason}")
+            response = response or LlmResponse(
+                error_code="CASCADE_NO_RESPONSE",
+                error_message=f"{self.fallback.model} returned no response after escalation: {reason}",
+            )
+            response.custom_metadata = {
+                **(response.custom_metadata or {}),
+                "cascade": {"model": self.fallback.model, "escalated": True, "reason": reason},
+            }
+            yield response
+            return
+        primary_usage = response.usage_metadata if response else None
+        if primary_usage and escalated.usage_metadata:
+            escalated.usage_metadata.prompt_token_count = (
+                (escalated.usage_metadata.prompt_token_count or 0) + (primary_usage.prompt_token_count or 0)
+            )
+            escalated.usage_metadata.candidates_token_count = (
+                (escalated.usage_metadata.candidates_token_count or 0) + (primary_usage.candidates_token_count or 0)
+            )
+            escalated.usage_metadata.cached_content_token_count = (
+                (escalated.usage_metadata.cached_content_token_count or 0)
+                + (primary_usage.cached_content_token_count or 0)
+            )
+        escalated.custom_metadata = {
+            **(escalated.custom_metadata or {}),
+            "cascade": {"model": self.fallback.model, "escalated": True, "reason": reason},
+        }
+        yield escalated
+
+
+def cascade_model(
+    agent_name: str, check: Optional[ResponseCheck] = None, ask_confidence: bool = True
+) -> Union[str, BaseLlm]:
+    """The model of a critic agent.
+
+    Agents listed in `CONFIG.cascade_agents` get a `CascadeLlm` from `CONFIG.worker_model` to
+    `CONFIG.critic_model`, the others use `CONFIG.critic_model` directly.
+
+    Args:
+        agent_name: Name of the agent.
+        check: Confidence check of the agent's responses, see `check_feedback` and `check_sql`.
+        ask_confidence: Whether the worker model rates its certainty on a last line of a text response.
+
+    Returns:
+        Union[str, BaseLlm]: The model for `LlmAgent.model`.
+    """
+    if agent_name not in CONFIG.cascade_agents or CONFIG.worker_model == CONFIG.critic_model:
+        return CONFIG.critic_model
+    return CascadeLlm(
+        model=f"{CONFIG.worker_model}>{CONFIG.critic_model}",
+        primary=LLMRegistry.new_llm(CONFIG.worker_model),
+        fallback=LLMRegistry.new_llm(CONFIG.critic_model),
+        check=check,
+        ask_confidence=ask_confidence,
+        agent_name=agent_name,
+    )
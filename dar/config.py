@@ -1,16 +1,59 @@
 import os
+import json
 import logging
+import threading
 from google.adk.agents.callback_context import CallbackContext
 from pathlib import Path
 from typing import Optional, Tuple
 from dotenv import load_dotenv
 from dataclasses import dataclass, field
 
-import google.auth
+from dar.schema import BigQueryAnalysis
+
 from google.auth.credentials import Credentials
 
 logger = logging.getLogger(__name__)
 
+# Critic agents answered by the worker model first and escalated to the critic model, see `dar.cascade`.
+CASCADE_AGENTS = ("research_evaluator", "query_understanding_agent", "query_review_agent", "report_composer")
+# Agents whose model responses are replayed from the LLM response cache, see `dar.tools.llm_response_cache`.
+LLM_CACHE_AGENTS = ("plan_creator", "report_structure_planner", "query_understanding_agent")
+# Agents sending their static instruction prefix as cached content, see `dar.tools.context_cache`.
+CONTEXT_CACHE_AGENTS = ("query_generation_agent", "plan_creator", "report_revision", "research_evaluator")
+
+
+def _int_from_env(name: str, default: int) -> int:
+  """Read an integer environment variable, falling back to the default on invalid values."""
+  try:
+    return int(os.getenv(name, str(default)))
+  except ValueError:
+    logger.warning(f"Invalid {name} value, using default: {default}")
+    return default
+
+
+def _pairs_from_env(name: str) -> dict[str, str]:
+  """Read a comma-separated list of `key=value` pairs, skipping entries without a value."""
+  pairs = {}
+  for item in filter(None, (item.strip() for item in os.getenv(name, "").split(","))):
+    key, _, value = item.partition("=")
+    if not value.strip():
+      logger.warning(f"Invalid {name} entry, skipping: {item}")
+      continue
+    pairs[key.strip()] = value.strip()
+  return pairs
+
+
+def _budgets_from_env(name: str) -> dict[str, int]:
+  """Read a comma-separated list of `agent_name=tokens` pairs, skipping invalid entries."""
+  budgets = {}
+  for item in filter(None, (item.strip() for item in os.getenv(name, "").split(","))):
+    agent_name, _, value = item.partition("=")
+    try:
+      budgets[agent_name.strip()] = int(value)
+    except ValueError:
+      logger.warning(f"Invalid {name} entry, skipping: {item}")
+  return budgets
+
 
 @dataclass
 class Config:
@@ -25,18 +68,72 @@ class Config:
 
   # Authentication
   credentials: Optional[Credentials] = field(default=None, init=False)
+  _auth_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
   service_account_path: Optional[str] = field(default=None)
 
   # Model Configuration
   critic_model: str = field(default="gemini-2.5-pro")
   worker_model: str = field(default="gemini-2.5-flash")
   bq_model: str = field(default="gemini-2.5-flash")
+  cascade_agents: list[str] = field(default_factory=lambda: list(CASCADE_AGENTS))
+  cascade_min_confidence: str = field(default="medium")
   max_feedback_iterations: int = field(default=2)
 
+  # Query Execution Configuration
+  max_query_result_rows: int = field(default=50)
+  max_bytes_per_query: int = field(default=10 * 1024 ** 3)
+  max_bytes_per_session: int = field(default=100 * 1024 ** 3)
+  max_ai_rows_per_query: int = field(default=BigQueryAnalysis.model_fields["max_rows_per_query"].default)
+  max_parallel_goals: int = field(default=4)
+  query_cache_enabled: bool = field(default=True)
+  query_cache_dir: str = field(default=str(Path(__file__).parent.parent / ".cache" / "query_results"))
+  query_cache_ttl_seconds: int = field(default=24 * 60 * 60)
+  query_cache_max_bytes: int = field(default=512 * 1024 * 1024)
+  llm_cache_enabled: bool = field(default=False)
+  llm_cache_path: str = field(default=str(Path(__file__).parent.parent / ".cache" / "llm_responses.sqlite"))
+  llm_cache_ttl_seconds: int = field(default=7 * 24 * 60 * 60)
+  llm_cache_max_bytes: int = field(default=256 * 1024 * 1024)
+  llm_cache_agents: list[str] = field(default_factory=lambda: list(LLM_CACHE_AGENTS))
+  context_cache_enabled: bool = field(default=True)
+  context_cache_ttl_seconds: int = field(default=60 * 60)
+  context_cache_min_tokens: int = field(default=1024)
+  context_cache_agents: list[str] = field(default_factory=lambda: list(CONTEXT_CACHE_AGENTS))
+  metadata_cache_refresh_seconds: int = field(default=10 * 60)
+  metadata_cache_warm_on_startup: bool = field(default=False)
+  code_executor_pool_size: int = field(default=2)
+  code_executor_timeout_seconds: int = field(default=30)
+  code_executor_memory_mb: int = field(default=2048)
+  code_executor_max_sessions: int = field(default=8)
+  code_executor_warm_on_startup: bool = field(default=False)
+  bigquery_http_pool_size: int = field(default=16)
+  max_stored_result_rows: int = field(default=1_000_000)
+  result_store_max_bytes: int = field(default=1024 ** 3)
+  query_poll_initial_ms: int = field(default=250)
+  query_poll_max_ms: int = field(default=5000)
+  query_timeout_seconds: int = field(default=60 * 60)
+  sql_auto_fix_enabled: bool = field(default=True)
+  ai_sampling_enabled: bool = field(default=True)
+  ai_sample_method: str = field(default="hash")
+  ai_sample_margin_pct: int = field(default=5)
+  ai_sample_confidence_pct: int = field(default=95)
+  ai_sample_strata: dict[str, str] = field(default_factory=dict)
+  ai_result_cache_dataset: str = field(default="")
+
+  # Prompt Size Configuration
+  query_summary_rows: int = field(default=20)
+  query_output_token_budget: int = field(default=4000)
+  prompt_token_budget: int = field(default=64000)
+  prompt_token_budgets: dict[str, int] = field(default_factory=dict)
+
+  # Incremental Re-run Configuration
+  stage_reuse_enabled: bool = field(default=True)
+
+  # Telemetry Configuration
+  telemetry_enabled: bool = field(default=True)
+
   def __post_init__(self):
     """Initialize configuration after dataclass creation."""
     self._load_environment()
-    self._initialize_authentication()
     self._set_configuration_values()
     self.validate()
 
@@ -49,6 +146,29 @@ class Config:
     else:
       logger.info("No .env file found, using system environment variables")
 
+  def _resolve_service_account_path(self) -> Optional[str]:
+    """Return the first configured service account key file that exists, if any."""
+    service_account_path = (
+            os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or
+            os.getenv("SERVICE_ACCOUNT_KEY_PATH") or
+            self.service_account_path
+    )
+    if service_account_path and os.path.exists(service_account_path):
+      return service_account_path
+    return None
+
+  def _service_account_project_id(self) -> Optional[str]:
+    """Read the project ID from the service account key file without loading the credentials."""
+    service_account_path = self._resolve_service_account_path()
+    if not service_account_path:
+      return None
+    try:
+      with open(service_account_path, 'r') as f:
+        return json.load(f).get('project_id')
+    except (OSError, ValueError) as e:
+      logger.warning(f"Failed to read project ID from {service_account_path}: {e}")
+      return None
+
   def _initialize_authentication(self) -> Tuple[Optional[Credentials], Optional[str]]:
     """Initialize Google Cloud authentication.
 
@@ -64,20 +184,15 @@ class Config:
     project_id = None
 
     # Check for service account key file
-    service_account_path = (
-            os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or
-            os.getenv("SERVICE_ACCOUNT_KEY_PATH") or
-            self.service_account_path
-    )
+    service_account_path = self._resolve_service_account_path()
 
-    if service_account_path and os.path.exists(service_account_path):
+    if service_account_path:
       try:
         from google.oauth2 import service_account
         credentials = service_account.Credentials.from_service_account_file(
           service_account_path
         )
         # Get project_id from service account file
-        import json
         with open(service_account_path, 'r') as f:
           service_account_info = json.load(f)
           project_id = service_account_info.get('project_id')
@@ -93,6 +208,7 @@ class Config:
     # Fall back to Application Default Credentials if no service account
     if credentials is None:
       try:
+        import google.auth
         credentials, adc_project_id = google.auth.default()
         project_id = project_id or adc_project_id
         logger.info("Using Google Application Default Credentials")
@@ -112,13 +228,16 @@ class Config:
 
   def _set_configuration_values(self):
     """Set configuration values from environment variables with fallbacks."""
-    # Get project ID from multiple sources with priority
-    _, auth_project_id = self._initialize_authentication()
+    # Get project ID from multiple sources with priority. Credentials are only resolved here when the project
+    # cannot be determined otherwise, since the ADC lookup may query the metadata server.
     self.project_id = (
             os.getenv("GOOGLE_CLOUD_PROJECT") or
             os.getenv("GCP_PROJECT_ID") or
-            auth_project_id
+            self._service_account_project_id()
     )
+    if not self.project_id:
+      with self._auth_lock:
+        _, self.project_id = self._initialize_authentication()
 
     self.location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-east1").lower()
     self.dataset = os.getenv("GOOGLE_BQ_DATASET", "kaggle_BQ_AI")
@@ -129,6 +248,10 @@ class Config:
     self.critic_model = os.getenv("CRITIC_MODEL", os.getenv("ROOT_AGENT_MODEL", "gemini-2.5-pro"))
     self.worker_model = os.getenv("WORKER_MODEL", os.getenv("ROOT_AGENT_MODEL", "gemini-2.5-flash"))
     self.bq_model = os.getenv("BQ_MODEL", "gemini-2.5-flash")
+    cascade_agents = os.getenv("CASCADE_AGENTS")
+    if cascade_agents is not None:
+      self.cascade_agents = [name.strip() for name in cascade_agents.split(",") if name.strip()]
+    self.cascade_min_confidence = os.getenv("CASCADE_MIN_CONFIDENCE", self.cascade_min_confidence).lower()
 
     # Convert max_feedback_iterations to int with error handling
     try:
@@ -137,6 +260,70 @@ class Config:
       logger.warning("Invalid MAX_FEEDBACK_ITERATION value, using default: 2")
       self.max_feedback_iterations = 2
 
+    # Query execution configuration
+    self.max_query_result_rows = _int_from_env("MAX_QUERY_RESULT_ROWS", 50)
+    self.max_bytes_per_query = _int_from_env("MAX_BYTES_PER_QUERY", self.max_bytes_per_query)
+    self.max_bytes_per_session = _int_from_env("MAX_BYTES_PER_SESSION", self.max_bytes_per_session)
+    self.max_ai_rows_per_query = _int_from_env("MAX_AI_ROWS_PER_QUERY", self.max_ai_rows_per_query)
+    self.max_parallel_goals = _int_from_env("MAX_PARALLEL_GOALS", self.max_parallel_goals)
+    self.query_cache_enabled = os.getenv("QUERY_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+    self.query_cache_dir = os.getenv("QUERY_CACHE_DIR", self.query_cache_dir)
+    self.query_cache_ttl_seconds = _int_from_env("QUERY_CACHE_TTL_SECONDS", self.query_cache_ttl_seconds)
+    self.query_cache_max_bytes = _int_from_env("QUERY_CACHE_MAX_BYTES", self.query_cache_max_bytes)
+    self.llm_cache_enabled = os.getenv("LLM_CACHE_ENABLED", "0").lower() in ("1", "true", "yes")
+    self.llm_cache_path = os.getenv("LLM_CACHE_PATH", self.llm_cache_path)
+    self.llm_cache_ttl_seconds = _int_from_env("LLM_CACHE_TTL_SECONDS", self.llm_cache_ttl_seconds)
+    self.llm_cache_max_bytes = _int_from_env("LLM_CACHE_MAX_BYTES", self.llm_cache_max_bytes)
+    llm_cache_agents = os.getenv("LLM_CACHE_AGENTS")
+    if llm_cache_agents is not None:
+      self.llm_cache_agents = [name.strip() for name in llm_cache_agents.split(",") if name.strip()]
+    self.context_cache_enabled = os.getenv("CONTEXT_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+    self.context_cache_ttl_seconds = _int_from_env("CONTEXT_CACHE_TTL_SECONDS", self.context_cache_ttl_seconds)
+    self.context_cache_min_tokens = _int_from_env("CONTEXT_CACHE_MIN_TOKENS", self.context_cache_min_tokens)
+    context_cache_agents = os.getenv("CONTEXT_CACHE_AGENTS")
+    if context_cache_agents is not None:
+      self.context_cache_agents = [name.strip() for name in context_cache_agents.split(",") if name.strip()]
+    self.metadata_cache_refresh_seconds = _int_from_env(
+      "METADATA_CACHE_REFRESH_SECONDS", self.metadata_cache_refresh_seconds
+    )
+    self.metadata_cache_warm_on_startup = os.getenv("METADATA_CACHE_WARM_ON_STARTUP", "0").lower() in (
+      "1", "true", "yes"
+    )
+    self.code_executor_pool_size = _int_from_env("CODE_EXECUTOR_POOL_SIZE", self.code_executor_pool_size)
+    self.code_executor_timeout_seconds = _int_from_env(
+      "CODE_EXECUTOR_TIMEOUT_SECONDS", self.code_executor_timeout_seconds
+    )
+    self.code_executor_memory_mb = _int_from_env("CODE_EXECUTOR_MEMORY_MB", self.code_executor_memory_mb)
+    self.code_executor_max_sessions = _int_from_env("CODE_EXECUTOR_MAX_SESSIONS", self.code_executor_max_sessions)
+    self.code_executor_warm_on_startup = os.getenv("CODE_EXECUTOR_WARM_ON_STARTUP", "0").lower() in (
+      "1", "true", "yes"
+    )
+    self.bigquery_http_pool_size = _int_from_env("BIGQUERY_HTTP_POOL_SIZE", self.bigquery_http_pool_size)
+    self.max_stored_result_rows = _int_from_env("MAX_STORED_RESULT_ROWS", self.max_stored_result_rows)
+    self.result_store_max_bytes = _int_from_env("RESULT_STORE_MAX_BYTES", self.result_store_max_bytes)
+    self.query_poll_initial_ms = _int_from_env("QUERY_POLL_INITIAL_MS", self.query_poll_initial_ms)
+    self.query_poll_max_ms = _int_from_env("QUERY_POLL_MAX_MS", self.query_poll_max_ms)
+    self.query_timeout_seconds = _int_from_env("QUERY_TIMEOUT_SECONDS", self.query_timeout_seconds)
+    self.sql_auto_fix_enabled = os.getenv("SQL_AUTO_FIX_ENABLED", "1").lower() in ("1", "true", "yes")
+    self.ai_sampling_enabled = os.getenv("AI_SAMPLING_ENABLED", "1").lower() in ("1", "true", "yes")
+    self.ai_sample_method = os.getenv("AI_SAMPLE_METHOD", self.ai_sample_method).lower()
+    self.ai_sample_margin_pct = _int_from_env("AI_SAMPLE_MARGIN_PCT", self.ai_sample_margin_pct)
+    self.ai_sample_confidence_pct = _int_from_env("AI_SAMPLE_CONFIDENCE_PCT", self.ai_sample_confidence_pct)
+    self.ai_sample_strata = _pairs_from_env("AI_SAMPLE_STRATA")
+    self.ai_result_cache_dataset = os.getenv("AI_RESULT_CACHE_DATASET", self.ai_result_cache_dataset)
+
+    # Prompt size configuration
+    self.query_summary_rows = _int_from_env("QUERY_SUMMARY_ROWS", self.query_summary_rows)
+    self.query_output_token_budget = _int_from_env("QUERY_OUTPUT_TOKEN_BUDGET", self.query_output_token_budget)
+    self.prompt_token_budget = _int_from_env("PROMPT_TOKEN_BUDGET", self.prompt_token_budget)
+    self.prompt_token_budgets = _budgets_from_env("PROMPT_TOKEN_BUDGETS")
+
+    # Incremental re-run configuration
+    self.stage_reuse_enabled = os.getenv("STAGE_REUSE_ENABLED", "1").lower() in ("1", "true", "yes")
+
+    # Telemetry configuration
+    self.telemetry_enabled = os.getenv("TELEMETRY_ENABLED", "1").lower() in ("1", "true", "yes")
+
   def initialize_state_vars(self, callback_context: CallbackContext) -> None:
     """Initialize state variables in the callback context.
 
@@ -182,6 +369,60 @@ class Config:
     if self.max_feedback_iterations < 1:
       errors.append("max_feedback_iterations must be at least 1")
 
+    if self.cascade_min_confidence not in ("low", "medium", "high"):
+      errors.append("cascade_min_confidence must be one of low, medium, high")
+
+    if self.max_query_result_rows < 1:
+      errors.append("max_query_result_rows must be at least 1")
+
+    if self.bigquery_http_pool_size < 1:
+      errors.append("bigquery_http_pool_size must be at least 1")
+
+    if self.max_stored_result_rows < self.max_query_result_rows:
+      errors.append("max_stored_result_rows must be at least max_query_result_rows")
+
+    if self.query_poll_initial_ms < 1 or self.query_poll_max_ms < self.query_poll_initial_ms:
+      errors.append("query_poll_initial_ms must be positive and at most query_poll_max_ms")
+
+    if self.query_timeout_seconds < 0:
+      errors.append("query_timeout_seconds must not be negative")
+
+    if self.ai_sample_method not in ("hash", "system", "stratified"):
+      errors.append("ai_sample_method must be one of hash, system, stratified")
+
+    if not 0 < self.ai_sample_margin_pct < 100 or not 0 < self.ai_sample_confidence_pct < 100:
+      errors.append("ai_sample_margin_pct and ai_sample_confidence_pct must be between 1 and 99")
+
+    if self.llm_cache_ttl_seconds < 1 or self.llm_cache_max_bytes < 1:
+      errors.append("llm_cache_ttl_seconds and llm_cache_max_bytes must be positive")
+
+    if self.context_cache_ttl_seconds <= 120:
+      errors.append("context_cache_ttl_seconds must be more than 120")
+
+    if self.code_executor_pool_size < 1 or self.code_executor_max_sessions < 1:
+      errors.append("code_executor_pool_size and code_executor_max_sessions must be at least 1")
+
+    if self.code_executor_timeout_seconds < 1 or self.code_executor_memory_mb < 0:
+      errors.append("code_executor_timeout_seconds must be positive and code_executor_memory_mb not negative")
+
+    if self.result_store_max_bytes < 1:
+      errors.append("result_store_max_bytes must be positive")
+
+    if self.max_bytes_per_query < 1 or self.max_bytes_per_session < 1:
+      errors.append("max_bytes_per_query and max_bytes_per_session must be positive")
+
+    if self.max_ai_rows_per_query < 1:
+      errors.append("max_ai_rows_per_query must be at least 1")
+
+    if self.max_parallel_goals < 1:
+      errors.append("max_parallel_goals must be at least 1")
+
+    if self.query_output_token_budget < 1 or self.prompt_token_budget < 1:
+      errors.append("query_output_token_budget and prompt_token_budget must be positive")
+
+    if any(budget < 1 for budget in self.prompt_token_budgets.values()):
+      errors.append("prompt_token_budgets must be positive")
+
     if errors:
       error_msg = "Configuration validation failed:\n" + "\n".join(f"  - {error}" for error in errors)
       raise ValueError(error_msg)
@@ -189,6 +430,17 @@ class Config:
     logger.info("Configuration validation passed")
     return True
 
+  def prompt_token_budget_for(self, agent_name: str) -> int:
+    """Get the prompt token budget of an agent.
+
+    Args:
+        agent_name: Name of the agent
+
+    Returns:
+        int: The agent's budget from PROMPT_TOKEN_BUDGETS, or the default PROMPT_TOKEN_BUDGET
+    """
+    return self.prompt_token_budgets.get(agent_name, self.prompt_token_budget)
+
   @property
   def project_location(self) -> str:
     """Get the project location in the format required by BigQuery and Dataform.
@@ -223,7 +475,53 @@ class Config:
       "has_credentials": self.credentials is not None,
       "critic_model": self.critic_model,
       "worker_model": self.worker_model,
+      "cascade_agents": self.cascade_agents,
+      "cascade_min_confidence": self.cascade_min_confidence,
       "max_feedback_iterations": self.max_feedback_iterations,
+      "max_query_result_rows": self.max_query_result_rows,
+      "max_bytes_per_query": self.max_bytes_per_query,
+      "max_bytes_per_session": self.max_bytes_per_session,
+      "max_ai_rows_per_query": self.max_ai_rows_per_query,
+      "max_parallel_goals": self.max_parallel_goals,
+      "query_cache_enabled": self.query_cache_enabled,
+      "query_cache_dir": self.query_cache_dir,
+      "query_cache_ttl_seconds": self.query_cache_ttl_seconds,
+      "query_cache_max_bytes": self.query_cache_max_bytes,
+      "llm_cache_enabled": self.llm_cache_enabled,
+      "llm_cache_path": self.llm_cache_path,
+      "llm_cache_ttl_seconds": self.llm_cache_ttl_seconds,
+      "llm_cache_max_bytes": self.llm_cache_max_bytes,
+      "llm_cache_agents": self.llm_cache_agents,
+      "context_cache_enabled": self.context_cache_enabled,
+      "context_cache_ttl_seconds": self.context_cache_ttl_seconds,
+      "context_cache_min_tokens": self.context_cache_min_tokens,
+      "context_cache_agents": self.context_cache_agents,
+      "metadata_cache_refresh_seconds": self.metadata_cache_refresh_seconds,
+      "metadata_cache_warm_on_startup": self.metadata_cache_warm_on_startup,
+      "code_executor_pool_size": self.code_executor_pool_size,
+      "code_executor_timeout_seconds": self.code_executor_timeout_seconds,
+      "code_executor_memory_mb": self.code_executor_memory_mb,
+      "code_executor_max_sessions": self.code_executor_max_sessions,
+      "code_executor_warm_on_startup": self.code_executor_warm_on_startup,
+      "bigquery_http_pool_size": self.bigquery_http_pool_size,
+      "max_stored_result_rows": self.max_stored_result_rows,
+      "result_store_max_bytes": self.result_store_max_bytes,
+      "query_poll_initial_ms": self.query_poll_initial_ms,
+      "query_poll_max_ms": self.query_poll_max_ms,
+      "query_timeout_seconds": self.query_timeout_seconds,
+      "sql_auto_fix_enabled": self.sql_auto_fix_enabled,
+      "ai_sampling_enabled": self.ai_sampling_enabled,
+      "ai_sample_method": self.ai_sample_method,
+      "ai_sample_margin_pct": self.ai_sample_margin_pct,
+      "ai_sample_confidence_pct": self.ai_sample_confidence_pct,
+      "ai_sample_strata": self.ai_sample_strata,
+      "ai_result_cache_dataset": self.ai_result_cache_dataset,
+      "query_summary_rows": self.query_summary_rows,
+      "query_output_token_budget": self.query_output_token_budget,
+      "prompt_token_budget": self.prompt_token_budget,
+      "prompt_token_budgets": self.prompt_token_budgets,
+      "stage_reuse_enabled": self.stage_reuse_enabled,
+      "telemetry_enabled": self.telemetry_enabled,
     }
 
   def __repr__(self) -> str:
@@ -231,16 +529,18 @@ class Config:
     return f"Config({self.to_dict()})"
 
   def get_credentials(self) -> Credentials:
-    """Get the initialized Google Cloud credentials.
+    """Get the Google Cloud credentials, resolving them on first use.
 
     Returns:
         Credentials: Google Cloud credentials object
 
     Raises:
-        ValueError: If credentials are not initialized
+        ValueError: If no valid authentication method is available
     """
     if self.credentials is None:
-      raise ValueError("Credentials not initialized. Call _initialize_authentication() first.")
+      with self._auth_lock:
+        if self.credentials is None:
+          self._initialize_authentication()
     return self.credentials
 
   def get_auth_info(self) -> dict:
@@ -256,6 +556,10 @@ class Config:
       "project_id": self.project_id,
     }
 
+_config_instance: Optional[Config] = None
+_config_lock = threading.Lock()
+
+
 def get_config() -> Config:
   """Get or create the configuration singleton.
 
@@ -263,12 +567,25 @@ def get_config() -> Config:
       Config: The configuration instance
   """
   global _config_instance
-  if '_config_instance' not in globals():
-    _config_instance = Config()
+  if _config_instance is None:
+    with _config_lock:
+      if _config_instance is None:
+        _config_instance = Config()
   return _config_instance
 
+
+class _LazyConfig:
+  """Proxy to the configuration singleton that creates it on first attribute access."""
+
+  def __getattr__(self, name: str):
+    return getattr(get_config(), name)
+
+  def __repr__(self) -> str:
+    return repr(get_config())
+
+
 def before_agent_callback(callback_context: CallbackContext):
   """Initialize agent state with configuration values."""
   get_config().initialize_state_vars(callback_context)
 
-CONFIG = get_config()
+CONFIG: Config = _LazyConfig()  # type: ignore[assignment]
@@ -47,3 +47,7 @@ class Feedback(BaseModel):
         default=None,
         description="A list of specific corrections needed to fix hallucinated or questionable content. This should be null or empty if the grade is 'pass'.",
     )
+    confidence: Literal["high", "medium", "low"] | None = Field(
+        default=None,
+        description="How certain you are that the grade and corrections are right: 'high', 'medium' or 'low'.",
+    )
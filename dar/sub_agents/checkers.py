@@ -26,3 +26,25 @@ class EscalationChecker(BaseAgent):
             )
             # Yielding an event without content or actions just lets the flow continue.
             yield Event(author=self.name)
+
+
+class QueryExecutionChecker(BaseAgent):
+    """Checks the query execution status and escalates to stop the refinement loop on success."""
+
+    def __init__(self, name: str):
+        super().__init__(name=name)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        execution_status = ctx.session.state.get("query_execution_status")
+        if execution_status and execution_status.get("status") == "success":
+            logging.info(
+                f"[{self.name}] Query executed successfully. Escalating to stop loop."
+            )
+            yield Event(author=self.name, actions=EventActions(escalate=True))
+        else:
+            logging.info(
+                f"[{self.name}] Query execution failed or not found. Loop will continue."
+            )
+            yield Event(author=self.name)
@@ -1,28 +1,85 @@
-from google.adk.code_executors import VertexAiCodeExecutor
+import threading
+from typing import Optional
+
 from google.adk.agents import Agent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.genai import types as genai_types
+
 from dar.config import CONFIG
+from dar.tools.bigquery_tools import result_store
+from dar.tools.code_executor import WarmPoolCodeExecutor
+from dar.tools.state_compaction import enforce_prompt_token_budget
+
+
+def stored_query_results(invocation_context: InvocationContext) -> dict[str, memoryview]:
+    """Full results of the executed queries as Arrow IPC files named `query_result_<result id>.arrow`."""
+    statements = (invocation_context.session.state.get("query_execution_result") or {}).get("statements", [])
+    files = {}
+    for statement in statements:
+        buffer = result_store.get_buffer(statement.get("result_hash") or "")
+        if buffer is not None:
+            files[f"query_result_{statement['result_hash']}.arrow"] = memoryview(buffer)
+    return files
+
+
+code_executor = WarmPoolCodeExecutor(
+    optimize_data_file=True,
+    stateful=True,
+    pool_size=CONFIG.code_executor_pool_size,
+    timeout_seconds=CONFIG.code_executor_timeout_seconds,
+    memory_limit_mb=CONFIG.code_executor_memory_mb,
+    max_sessions=CONFIG.code_executor_max_sessions,
+    stage_files=stored_query_results,
+)
+if CONFIG.code_executor_warm_on_startup:
+    threading.Thread(target=code_executor.warm, name="code-executor-warmup", daemon=True).start()
+
+
+def warm_code_executor(callback_context: CallbackContext) -> None:
+    """Start the interpreters of the code execution agent, so they are ready once the queries ran.
+
+    Used as `before_agent_callback` of the research pipeline. Starting the processes does not wait for them.
+    """
+    code_executor.warm()
+    return None
+
+
+def skip_without_query_results(callback_context: CallbackContext) -> Optional[genai_types.Content]:
+    """Skip the statistical follow-up when no query returned rows to analyze."""
+    statements = (callback_context.state.get("query_execution_result") or {}).get("statements", [])
+    if any(statement.get("status") == "success" and statement.get("total_rows") for statement in statements):
+        return None
+    callback_context.state["statistical_analysis_output"] = ""
+    return genai_types.Content(role="model", parts=[genai_types.Part(
+        text="No query returned rows, the statistical analysis is skipped."
+    )])
+
 
 code_execution_agent = Agent(
     model=CONFIG.worker_model,
     name="code_execution_agent",
-    code_executor=VertexAiCodeExecutor(
-        optimize_data_file=True,
-        stateful=True,
-    ),
+    description="Runs statistical follow-up analyses on the full query results in a local Python interpreter.",
+    code_executor=code_executor,
+    output_key="statistical_analysis_output",
+    include_contents="none",
+    before_agent_callback=skip_without_query_results,
+    before_model_callback=enforce_prompt_token_budget,
     instruction="""
       # Guidelines
-    
-      **Objective:** Assist the user in achieving their data analysis goals within the context of a Python Colab notebook, **with emphasis on avoiding assumptions and ensuring accuracy.**
+
+      **Objective:** Complement the query results of a research plan with the statistics SQL does not give:
+      significance tests, confidence intervals, correlations, trend and regression fits, distributions and
+      outliers, **with emphasis on avoiding assumptions and ensuring accuracy.** The research agents cite your
+      findings next to the query results.
       Reaching that goal can involve multiple steps. When you need to generate code, you **don't** need to solve the goal in one go. Only generate the next step at a time.
-    
-      **Trustworthiness:** Always include the code in your response. Put it at the end in the section "Code:". This will ensure trust in your output.
-    
-      **Code Execution:** All code snippets provided will be executed within the Colab environment.
-    
+
+      **Code Execution:** All code snippets you write in a ```python block are executed in a local Python interpreter and their output is returned to you.
+
       **Statefulness:** All code snippets are executed and the variables stays in the environment. You NEVER need to re-initialize variables. You NEVER need to reload files. You NEVER need to re-import libraries.
-    
+
       **Imported Libraries:** The following libraries are ALREADY imported and should NEVER be imported again:
-    
+
       ```tool_code
       import io
       import math
@@ -31,8 +88,9 @@ code_execution_agent = Agent(
       import numpy as np
       import pandas as pd
       import scipy
+      import scipy.stats
       ```
-    
+
       **Output Visibility:** Always print the output of code execution to visualize results, especially for data exploration and analysis. For example:
         - To look a the shape of a pandas.DataFrame do:
           ```tool_code
@@ -41,7 +99,7 @@ code_execution_agent = Agent(
           The output will be presented to you as:
           ```tool_outputs
           (49, 7)
-    
+
           ```
         - To display the result of a numerical computation:
           ```tool_code
@@ -51,40 +109,44 @@ code_execution_agent = Agent(
           The output will be presented to you as:
           ```tool_outputs
           x=999751168
-    
+
           ```
         - You **never** generate ```tool_outputs yourself.
         - You can then use this output to decide on next steps.
         - Print variables (e.g., `print(f'{{variable=}}')`.
-        - Give out the generated code under 'Code:'.
-    
+
       **No Assumptions:** **Crucially, avoid making assumptions about the nature of the data or column names.** Base findings solely on the data itself. Always use the information obtained from `explore_df` to guide your analysis.
-    
-      **Available files:** Only use the files that are available as specified in the list of available files.
-    
-      **Data in prompt:** Take data for visualization from {query_execution_output}. You have to parse that data into a pandas DataFrame. ALWAYS parse all the data. NEVER edit the data that are given to you.
-    
-      **Answerability:** Some queries may not be answerable with the available data. In those cases, inform the user why you cannot process their query and suggest what type of data would be needed to fulfill their request.
-    
+
+      **Data:** The full result of every query is a file in the working directory named `query_result_<result id>.arrow`, where the result id is the `[result:<result id>]` tag of the result in the query results below. Load it with `pd.read_feather("query_result_<result id>.arrow")`. The rows shown in the query results are only a sample, NEVER type data from the prompt into code and NEVER edit the data.
+
+      **Limits:** A step running longer than the execution timeout is stopped and the interpreter restarts without the variables of earlier steps. Keep each step small and aggregate large results before plotting them.
+
+      **Answerability:** Some analyses may not be possible with the available results. In those cases, state why and what data would be needed instead of computing a weaker substitute.
+
       **WHEN YOU DO PREDICTION / MODEL FITTING, ALWAYS PLOT FITTED LINE AS WELL **
-    
-    
+
+
       TASK:
-      You need to assist the user with their queries by looking at the data and the context in the conversation.
-        You final answer should summarize the code and code execution relevant to the user query.
-    
-        You should include all pieces of data to answer the user query, such as the table from code execution results.
-        If you cannot answer the question directly, you should follow the guidelines above to generate the next step.
-        If the question can be answered directly with writing any code, you should do that.
-        If you doesn't have enough data to answer the question, you should ask for clarification from the user.
-    
+      Select the goals of the research plan that call for statistics beyond the query results, in particular the [ANALYSIS] goals, and compute them from the full results. Use at most 6 code steps. If no goal needs statistics, answer that without writing code.
+
+        Your final answer must not contain code. It summarizes the findings under the heading "## Statistical Analysis", one bullet per finding stating the goal it answers, the method, the sample size, the statistic with its p-value or confidence interval, and the `[result:<result id>]` tags of the results used.
+        Report numbers exactly as printed by the code execution, never round them differently or estimate them.
+
         You should NEVER install any package on your own like `pip install ...`.
         When plotting trends, you should make sure to sort and order the data by the x-axis.
-    
+
         NOTE: for pandas pandas.core.series.Series object, you can use .iloc[0] to access the first element rather than assuming it has the integer index 0"
         correct one: predicted_value = prediction.predicted_mean.iloc[0]
         error one: predicted_value = prediction.predicted_mean[0]
         correct one: confidence_interval_lower = confidence_intervals.iloc[0, 0]
         error one: confidence_interval_lower = confidence_intervals[0][0]
+
+      # Research Plan
+
+      {research_plan}
+
+      # Query Results
+
+      {query_execution_output}
     """,
 )
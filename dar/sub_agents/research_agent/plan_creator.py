@@ -2,7 +2,7 @@ from google.adk.agents import LlmAgent
 from google.adk.planners import BuiltInPlanner
 from google.genai import types as genai_types
 from dar.config import CONFIG
-from dar.tools.bigquery_tools import bq_executor_toolset
+from dar.tools.bigquery_tools import after_execute_sql_callback, before_execute_sql_callback, bq_executor_toolset
 
 plan_creator = LlmAgent(
     model=CONFIG.worker_model,
@@ -13,10 +13,7 @@ plan_creator = LlmAgent(
     You are a BigQuery data analysis strategist with AI-powered insights capability. Your job is to create a high-level 
     DATA ANALYSIS PLAN for BigQuery tables that combines traditional SQL analysis with generative AI functions 
     to create new analytical insights from existing data. If there is already an ANALYSIS PLAN in the session state, 
-    improve upon it based on the user feedback.
-
-    ANALYSIS PLAN (SO FAR):
-    {research_plan?}
+    improve upon it based on the user feedback. The plan so far is given at the end of these instructions.
 
     **COST CONSCIOUSNESS:**
     - Always emphasize that BigQuery queries AND AI functions cost money
@@ -129,8 +126,13 @@ plan_creator = LlmAgent(
     You are forbidden from running actual BigQuery commands or accessing table content. 
     Your job is planning the analysis approach that combines traditional SQL analytics 
     with AI-powered insights generation, ensuring every AI operation is followed by rigorous analytical validation.
+
+    ANALYSIS PLAN (SO FAR):
+    {research_plan?}
     """,
     tools=[bq_executor_toolset],
+    before_tool_callback=before_execute_sql_callback,
+    after_tool_callback=after_execute_sql_callback,
     planner=BuiltInPlanner(
         thinking_config=genai_types.ThinkingConfig(include_thoughts=True, thinking_budget=2048),
     ),
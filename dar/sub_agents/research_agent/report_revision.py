@@ -2,6 +2,8 @@ from google.adk.agents import LlmAgent
 from google.adk.planners import BuiltInPlanner
 from google.genai import types as genai_types
 from dar.config import CONFIG
+from dar.tools.section_evaluation import select_report_for_revision
+from dar.tools.state_compaction import enforce_prompt_token_budget
 
 report_revision = LlmAgent(
     model=CONFIG.worker_model,
@@ -17,15 +19,20 @@ report_revision = LlmAgent(
     the evaluation phase while preserving valid content.
     ## PRIMARY DIRECTIVE
 
-    You will receive:
-    1. **Original Research Findings** (from {section_research_findings})
-    2. **Evaluation Feedback** (from {research_evaluation}) containing:
+    You will receive, at the end of these instructions:
+    1. **Current Report**: the original research findings, or your revision of them from the previous pass
+    2. **Evaluation Feedback** containing:
        - Identified hallucinations and questionable content
        - Specific correction instructions
        - Issue types and locations
+       - The failing sections, named by the `section_identifier` of their corrections in `corrections_needed`
 
     Your task: Generate a CLEAN, ACCURATE final report with ALL hallucinations removed and ALL feedback addressed.
 
+    Change ONLY the sections named in `corrections_needed`. Copy every other section of the current report 
+    exactly, character for character and with its heading; those sections already passed the evaluation and are 
+    not evaluated again as long as they are unchanged.
+
     ## CRITICAL OPERATING RULES
 
     ### STRICT PROHIBITIONS
@@ -219,8 +226,18 @@ report_revision = LlmAgent(
     one with any questionable content.
 
     Your output should be the complete revised report, ready for final delivery.
+
+    ## INPUT
+
+    **Current Report:**
+    {report_revision_input}
+
+    **Evaluation Feedback:**
+    {research_evaluation}
     """,
     output_key="final_revised_report",
+    before_agent_callback=select_report_for_revision,
+    before_model_callback=enforce_prompt_token_budget,
     disallow_transfer_to_parent=True,
     disallow_transfer_to_peers=True,
 )
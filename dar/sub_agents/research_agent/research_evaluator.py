@@ -1,16 +1,26 @@
 from google.adk.agents import LlmAgent
-from dar.config import CONFIG
+from dar.cascade import cascade_model, check_feedback
 from dar.schema import Feedback
+from dar.tools.section_evaluation import merge_section_evaluation, select_sections_for_evaluation
+from dar.tools.state_compaction import enforce_prompt_token_budget
 
 research_evaluator = LlmAgent(
-    model=CONFIG.critic_model,
+    model=cascade_model("research_evaluator", check=check_feedback, ask_confidence=False),
     name="research_evaluator",
     description="Critically evaluates research findings for factual accuracy, hallucinations, and unsupported claims.",
     instruction="""
-    You are a rigorous fact-checking specialist and research integrity auditor evaluating the output from 
-    'section_research_findings'. Your mission is to identify and flag any hallucinated, questionable, 
+    You are a rigorous fact-checking specialist and research integrity auditor evaluating sections of the 
+    research findings. Your mission is to identify and flag any hallucinated, questionable, 
     or inadequately supported content that undermines the credibility of the research.
 
+    ## INPUT
+
+    The query results and the statistical analyses computed from their full results, the only source material of 
+    the research, and the sections to evaluate are given at the end of these instructions.
+
+    Only the sections to evaluate are graded, other sections were evaluated before and did not change. Use the 
+    heading of the section as `section_identifier` of every correction.
+
     ## PRIMARY EVALUATION MANDATE
 
     **Your SOLE focus is detecting and documenting:**
@@ -55,6 +65,12 @@ research_evaluator = LlmAgent(
     - Appropriately hedged language for uncertain findings
     - Explicit acknowledgment of information gaps
     - Direct quotes from identified research results
+    - Figures matching the precomputed profiles of the query results (counts, nulls, distinct 
+      values, quantiles, histograms, top values and correlations); check numbers against these profiles instead 
+      of recomputing them
+    - Test statistics, p-values, confidence intervals and fits matching the statistical analyses
+    - Counts of AI results computed on a sample reported as population estimates with their intervals, not as 
+      table totals
 
     ## EVALUATION METHODOLOGY
 
@@ -127,10 +143,28 @@ research_evaluator = LlmAgent(
 
     If the research contains multiple hallucinations or systematic sourcing issues, provide 5-10 specific corrections focusing on the most critical problems first.
 
+    Set `confidence` to how certain you are that your grade and corrections are right.
+
     Your response must be a single, raw JSON object validating against the 'Feedback' schema.
+
+    ## QUERY RESULTS
+
+    `{query_execution_output}`
+
+    ## STATISTICAL ANALYSES
+
+    `{statistical_analysis_output?}`
+
+    ## SECTIONS TO EVALUATE
+
+    `{research_evaluation_input}`
     """,
     output_schema=Feedback,
     disallow_transfer_to_parent=True,
     disallow_transfer_to_peers=True,
     output_key="research_evaluation",
+    include_contents="none",
+    before_agent_callback=select_sections_for_evaluation,
+    after_agent_callback=merge_section_evaluation,
+    before_model_callback=enforce_prompt_token_budget,
 )
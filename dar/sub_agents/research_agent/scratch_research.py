@@ -2,6 +2,7 @@ from google.adk.agents import LlmAgent
 from google.adk.planners import BuiltInPlanner
 from google.genai import types as genai_types
 from dar.config import CONFIG
+from dar.tools.state_compaction import enforce_prompt_token_budget
 
 scratch_research_agent = LlmAgent(
     model=CONFIG.worker_model,
@@ -22,6 +23,7 @@ scratch_research_agent = LlmAgent(
             1. **Information Boundary Compliance**: You MUST operate exclusively with:
                - Information provided in the `research_plan` state key
                - Results returned from {query_execution_output} function calls
+               - Statistical analyses computed from the full query results: {statistical_analysis_output?}
                - Your accumulated research summaries from Phase 1
                - **CRITICAL**: You are PROHIBITED from using any external tools, functions, or 
                     information sources beyond what is explicitly provided
@@ -37,6 +39,14 @@ scratch_research_agent = LlmAgent(
                     and analytical tradecraft
                - Distinguish between confirmed facts, assessments, and information gaps
                - Maintain objectivity and avoid confirmation bias
+               - Every query result comes with a precomputed profile (counts, nulls, distinct values, quantiles, 
+                    histograms, top values and correlations). Take these numbers from the profile instead of 
+                    recomputing them from the shown rows, the rows are only a sample of the result
+               - Take significance tests, confidence intervals, correlations and fits from the statistical 
+                    analyses with their method and sample size, never compute or estimate them yourself
+               - AI functions often run on a sample of the table. Report counts of such results as the 
+                    population estimates with their intervals shown under "AI functions ran on a sample", 
+                    never as totals of the table
 
             ---
 
@@ -55,7 +65,7 @@ scratch_research_agent = LlmAgent(
                  * Account for potential variations in how information might be indexed
 
             2. **Query Execution**
-               - Execute each query using ONLY {query_execution_output}
+               - Execute each query using ONLY the query execution results above
                - Do NOT attempt to use any other tools or functions
                - Capture all relevant information from returned results
                - If a research goal yields no successful results, simply skip it in your final output
@@ -161,7 +171,7 @@ scratch_research_agent = LlmAgent(
             ## Operational Constraints and Reminders
 
             ⚠**CRITICAL RESTRICTIONS:**
-            - You may ONLY use {query_execution_output} for information gathering
+            - You may ONLY use the query execution results and the statistical analyses for information gathering
             - You may NOT invoke any other tools, APIs, or functions
             - You may NOT generate information beyond what was explicitly found
             - You MUST complete all [RESEARCH] before any [DELIVERABLE]
@@ -183,4 +193,5 @@ scratch_research_agent = LlmAgent(
             why they're missing.
             """,
     output_key="section_research_findings",
+    before_model_callback=enforce_prompt_token_budget,
 )
@@ -0,0 +1,247 @@
+import asyncio
+import copy
+import logging
+import re
+from collections.abc import AsyncGenerator
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.sessions import Session
+from google.adk.utils.context_utils import Aclosing
+
+from dar.config import CONFIG
+from dar.tools.bigquery_tools import ByteBudget, shared_byte_budget
+from dar.tools.stage_cache import dataset_version, fingerprint
+
+_PLAN_ITEM_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])?\s*[*`]*\[(AI_QUERY|QUERY|ANALYSIS)\]")
+
+# State written by the SQL sub-pipeline of a goal, reused when the goal is unchanged in a later run.
+_GOAL_OUTPUT_KEYS = (
+    "query_understanding_output",
+    "query_generation_output",
+    "query_execution_output",
+    "query_execution_result",
+    "query_execution_status",
+    "query_cost_estimate",
+)
+
+
+def split_plan_goals(research_plan: str | None) -> list[str]:
+    """Split a research plan into goals that can be queried independently.
+
+    An `[AI_QUERY]` goal and the `[QUERY]` goals directly following it validate the same AI results, so they form
+    one group. Other `[QUERY]` goals are independent on their own. `[ANALYSIS]` goals are not queried, they are
+    handled by the research agents after all queries ran.
+
+    Args:
+        research_plan: The approved research plan with `[QUERY]`, `[AI_QUERY]` and `[ANALYSIS]` prefixed bullets.
+
+    Returns:
+        list[str]: The text of every goal group, in plan order.
+    """
+    items = []
+    for line in (research_plan or "").splitlines():
+        match = _PLAN_ITEM_RE.match(line)
+        if match:
+            items.append([match.group(1), line.strip()])
+        elif items and line.strip():
+            # Continuation of a bullet wrapped over several lines.
+            items[-1][1] += "\n" + line.strip()
+
+    groups = []
+    previous_tag = None
+    for tag, text in items:
+        if tag == "QUERY" and previous_tag in ("AI_QUERY", "QUERY") and groups and groups[-1]["has_ai"]:
+            groups[-1]["lines"].append(text)
+        elif tag in ("AI_QUERY", "QUERY"):
+            groups.append({"has_ai": tag == "AI_QUERY", "lines": [text]})
+        previous_tag = tag
+    return ["\n".join(group["lines"]) for group in groups]
+
+
+def _merge_sections(goals: list[str], values: list[str | None]) -> str:
+    sections = []
+    for index, (goal, value) in enumerate(zip(goals, values), start=1):
+        if value:
+            sections.append(f"## Goal {index}\n{goal}\n\n{value}")
+    return "\n\n".join(sections)
+
+
+class PlanGoalFanOut(BaseAgent):
+    """Runs its SQL sub-pipeline once per independent goal of the research plan, concurrently.
+
+    Every goal runs against its own copy of the session, in which 'research_plan' holds only that goal, so the
+    SQL agents of different goals never overwrite each other's state. Events are forwarded without their state
+    changes and the outputs of all goals are merged into the usual state keys once every goal finished. The
+    statements of all goals share one byte budget, the remainder of the session's.
+    Plans with a single goal run the sub-pipeline directly on the session.
+
+    The outputs of every successful goal are kept in 'query_goal_cache', keyed by a fingerprint of the goal text and
+    the dataset version. When the plan is edited and run again, unchanged goals reuse these outputs and only new or
+    edited goals are queried.
+    """
+
+    max_concurrency: int = 4
+    """The maximum number of goals queried at the same time."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        sql_agent = self.sub_agents[0]
+        state = ctx.session.state
+        goals = split_plan_goals(state.get("research_plan"))
+        version = await asyncio.to_thread(dataset_version) if CONFIG.stage_reuse_enabled else None
+        goal_fingerprints = [fingerprint(goal, version) if version else None for goal in goals]
+        goal_cache = state.get("query_goal_cache") or {}
+        cached_outputs = [goal_cache.get(goal_fingerprint) for goal_fingerprint in goal_fingerprints]
+        if any(cached_outputs):
+            logging.info(f"[{self.name}] Reusing the outputs of {sum(map(bool, cached_outputs))} unchanged goal(s).")
+
+        if len(goals) <= 1:
+            if cached_outputs and cached_outputs[0]:
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta={**cached_outputs[0], "query_review_rewrite_output": None}),
+                )
+                return
+            async with Aclosing(sql_agent.run_async(ctx)) as agen:
+                async for event in agen:
+                    yield event
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                actions=EventActions(state_delta={
+                    "query_goal_cache": self._goal_cache(goal_fingerprints, [ctx.session.state]),
+                }),
+            )
+            return
+
+        pending = [index for index, outputs in enumerate(cached_outputs) if not outputs]
+        logging.info(f"[{self.name}] Running {len(pending)} plan goals with concurrency {self.max_concurrency}.")
+        branch_sessions = {index: self._create_branch_session(ctx.session, goals[index]) for index in pending}
+        queue: asyncio.Queue[Event | None] = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        byte_budget = ByteBudget(max(0, CONFIG.max_bytes_per_session - state.get("query_bytes_processed_total", 0)))
+
+        async def run_goal(index: int, session: Session):
+            async with semaphore:
+                branch = f"{self.name}.goal_{index}"
+                branch_ctx = ctx.model_copy(update={
+                    "session": session,
+                    "branch": f"{ctx.branch}.{branch}" if ctx.branch else branch,
+                })
+                async with Aclosing(sql_agent.run_async(branch_ctx)) as agen:
+                    async for event in agen:
+                        self._apply_to_branch(session, event)
+                        await queue.put(event.model_copy(update={
+                            "actions": event.actions.model_copy(update={"state_delta": {}}),
+                        }))
+
+        async def run_all_goals():
+            # Set in the context of the runner task, which the goals inherit and the caller of this agent does not.
+            shared_byte_budget.set(byte_budget)
+            try:
+                await asyncio.gather(*(run_goal(index + 1, session) for index, session in branch_sessions.items()))
+            finally:
+                await queue.put(None)
+
+        runner = asyncio.create_task(run_all_goals())
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            await runner
+        finally:
+            runner.cancel()
+
+        base_bytes = state.get("query_bytes_processed_total", 0)
+        branch_states = [
+            branch_sessions[index].state if index in branch_sessions
+            else {**cached_outputs[index], "query_bytes_processed_total": base_bytes}
+            for index in range(len(goals))
+        ]
+        state_delta = self._merge_goal_states(state, goals, branch_states)
+        state_delta["query_goal_cache"] = self._goal_cache(goal_fingerprints, branch_states)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
+
+    @staticmethod
+    def _goal_cache(goal_fingerprints: list[str | None], branch_states: list[dict]) -> dict:
+        """Outputs of the successful goals of this run per goal fingerprint, replacing those of earlier runs."""
+        return {
+            goal_fingerprint: {key: branch_state.get(key) for key in _GOAL_OUTPUT_KEYS}
+            for goal_fingerprint, branch_state in zip(goal_fingerprints, branch_states)
+            if goal_fingerprint and (branch_state.get("query_execution_status") or {}).get("status") == "success"
+        }
+
+    @staticmethod
+    def _create_branch_session(session: Session, goal: str) -> Session:
+        state = copy.deepcopy(session.state)
+        state["research_plan"] = goal
+        return session.model_copy(update={"state": state, "events": list(session.events)})
+
+    @staticmethod
+    def _apply_to_branch(session: Session, event: Event) -> None:
+        if event.partial:
+            return
+        for key, value in event.actions.state_delta.items():
+            if not key.startswith("temp:"):
+                session.state[key] = value
+        session.events.append(event)
+
+    @staticmethod
+    def _merge_goal_states(state: dict, goals: list[str], branch_states: list[dict]) -> dict:
+        results = [branch_state.get("query_execution_result") or {} for branch_state in branch_states]
+        statuses = [branch_state.get("query_execution_status") or {} for branch_state in branch_states]
+        errors = [status.get("error") for status in statuses if status.get("status") != "success"]
+        status = "error" if errors else "success"
+        base_bytes = state.get("query_bytes_processed_total", 0)
+
+        state_delta = {
+            "query_understanding_output": _merge_sections(
+                goals, [branch_state.get("query_understanding_output") for branch_state in branch_states]
+            ),
+            "query_generation_output": _merge_sections(
+                goals, [branch_state.get("query_generation_output") for branch_state in branch_states]
+            ),
+            "query_review_rewrite_output": None,
+            "query_execution_output": _merge_sections(
+                goals, [branch_state.get("query_execution_output") for branch_state in branch_states]
+            ),
+            "query_execution_result": {
+                "status": status,
+                "statements": [statement for result in results for statement in result.get("statements", [])],
+            },
+            "query_execution_status": {"status": status, "error": "\n".join(str(error) for error in errors) or None},
+            "query_cost_estimate": [
+                estimate
+                for branch_state in branch_states
+                for estimate in branch_state.get("query_cost_estimate") or []
+            ],
+            "query_bytes_processed_total": base_bytes + sum(
+                branch_state.get("query_bytes_processed_total", 0) - base_bytes for branch_state in branch_states
+            ),
+            "query_goal_results": [
+                {
+                    "goal": goal,
+                    "status": (branch_state.get("query_execution_status") or {}).get("status"),
+                    "query_generation_output": branch_state.get("query_generation_output"),
+                    "query_execution_output": branch_state.get("query_execution_output"),
+                }
+                for goal, branch_state in zip(goals, branch_states)
+            ],
+        }
+        cache_stats = [
+            branch_state["query_cache_stats"] for branch_state in branch_states if "query_cache_stats" in branch_state
+        ]
+        if cache_stats:
+            # The counters are process-wide, the snapshot with the most lookups is the latest one.
+            state_delta["query_cache_stats"] = max(cache_stats, key=lambda stats: stats["hits"] + stats["misses"])
+        return state_delta
@@ -1,38 +1,235 @@
-from google.adk.agents import LlmAgent
-from dar.tools.bigquery_tools import bq_executor_toolset
+import asyncio
+import logging
+from collections.abc import AsyncGenerator
+
+import pyarrow as pa
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types as genai_types
+from tabulate import tabulate
+
 from dar.config import CONFIG
+from dar.telemetry import record_bigquery_job
+from dar.tools.bigquery_tools import ByteBudget, query_result_cache, result_store, run_query, shared_byte_budget
+from dar.tools.profiling import profile_dataframe, render_profile
+from dar.tools.result_store import ARROW_MIME_TYPE
+from dar.tools.sampling import estimate_population, render_sampling
+from dar.tools.state_compaction import estimate_tokens
+from dar.tools.sql_utils import extract_sql, split_statements
+
+
+def render_markdown(statement_results: list[dict], max_rows: int) -> str:
+    """Render structured statement results as bounded markdown summaries for the downstream agents.
+
+    Every successful result is tagged with its `result_hash` for citation and summarized by its row count, its
+    profile (one line per column and the correlations), the samples AI functions ran on with the population
+    estimates of its counts, and its first `max_rows` rows.
+
+    Args:
+        statement_results: Results returned by `run_query`, one per executed statement, with `result_hash` and
+            `profile` set.
+        max_rows: Maximum number of rows shown per result.
+
+    Returns:
+        str: Markdown with one section per statement.
+    """
+    sections = []
+    for index, result in enumerate(statement_results, start=1):
+        header = f"### Query {index}" if len(statement_results) > 1 else "### Query result"
+        if result.get("rejected"):
+            sections.append(
+                f"{header}\n\n**Rejected before execution by the cost gate:** {result['error']}\n\n"
+                f"```sql\n{result['query']}\n```"
+            )
+            continue
+        if result.get("validation_errors"):
+            errors = "\n".join(f"- {error}" for error in result["validation_errors"])
+            sections.append(
+                f"{header}\n\n**Rejected by static validation before execution:**\n{errors}\n\n"
+                f"```sql\n{result['query']}\n```"
+            )
+            continue
+        if result["status"] != "success":
+            sections.append(
+                f"{header}\n\n**Execution failed:** {result['error']}\n\n```sql\n{result['query']}\n```"
+            )
+            continue
+        header += f" [result:{result['result_hash']}]"
+        if not result["rows"]:
+            sections.append(f"{header}\n\nThe query returned no rows.")
+            continue
+        stats = "\n".join(f"- {line}" for line in render_profile(result["profile"]))
+        summary = f"{result['total_rows']} rows. Profile of the {result['profile']['rows']} stored rows:\n{stats}"
+        if result.get("sampling"):
+            sampling = render_sampling(result["sampling"], result.get("population_estimates", []))
+            summary += "\n\nAI functions ran on a sample:\n" + "\n".join(f"- {line}" for line in sampling)
+        if result.get("ai_result_cache"):
+            summary += (
+                f"\n\nAI functions computed {result['ai_result_cache']['new_results']} new results, the other rows "
+                f"were read from the AI result cache."
+            )
+        shown_rows = result["rows"][:max_rows]
+        table = tabulate(shown_rows, headers="keys", tablefmt="github") if shown_rows else ""
+        footer = f"Showing {len(shown_rows)} of {result['total_rows']} rows."
+        if result.get("original_query"):
+            footer += (
+                " AI functions ran on a sample, see the executed query below." if result.get("sampling")
+                else " AI function calls were capped by lowering LIMITs, see the executed query below."
+            )
+            footer += f"\n\n```sql\n{result['query']}\n```"
+        sections.append(f"{header}\n\n{summary}\n\n{table}\n\n{footer}")
+    return "\n\n".join(sections)
+
+
+def render_within_budget(statement_results: list[dict], token_budget: int, max_rows: int) -> str:
+    """Render the results with as many rows as fit into the token budget, halving the rows shown until they fit.
+
+    Args:
+        statement_results: Results returned by `run_query`, with `result_hash` and `profile` set.
+        token_budget: Maximum estimated tokens of the markdown.
+        max_rows: Maximum number of rows shown per result.
+
+    Returns:
+        str: Markdown of `render_markdown`, cut off at the budget if even the summaries without rows exceed it.
+    """
+    markdown = render_markdown(statement_results, max_rows)
+    while estimate_tokens(markdown) > token_budget and max_rows > 0:
+        max_rows //= 2
+        markdown = render_markdown(statement_results, max_rows)
+    if estimate_tokens(markdown) > token_budget:
+        markdown = markdown[:token_budget * 4] + "\n...[truncated, the full results are stored as artifacts]"
+    return markdown
+
+
+class QueryExecutor(BaseAgent):
+    """Executes the current SQL query in BigQuery directly and stores structured and markdown results in state.
+
+    The query is taken from 'query_review_rewrite_output' when the review agent already rewrote it, otherwise from
+    'query_generation_output'. No model is involved, so the rows in the output are exactly the rows BigQuery returned.
+    Statements run as concurrent BigQuery jobs that share the per-session byte budget tracked in
+    'query_bytes_processed_total', and with the statements of the other goals when run by `PlanGoalFanOut`.
+
+    Full results are kept as Arrow tables in `result_store` and saved as Arrow IPC file artifacts named after their
+    result hash, for downstream agents and code execution to load without re-running the query; state and the
+    injected 'query_execution_output' only hold bounded summaries. Every result is profiled locally with
+    `profile_dataframe`, so the research agents read precomputed statistics instead of deriving them from rows.
+    Counts of results whose AI functions ran on a sample of one table are extrapolated with `estimate_population`.
+    """
+
+    def __init__(self, name: str, description: str = ""):
+        super().__init__(name=name, description=description)
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        state = ctx.session.state
+        sql = extract_sql(state.get("query_review_rewrite_output") or state.get("query_generation_output"))
+        statements = split_statements(sql)
+        bytes_processed_total = state.get("query_bytes_processed_total", 0)
+
+        if statements:
+            # Goals queried concurrently share one budget, a single goal may not spend what the others reserved.
+            byte_budget = shared_byte_budget.get() or ByteBudget(
+                max(0, CONFIG.max_bytes_per_session - bytes_processed_total)
+            )
+            # Cancelling the invocation cancels the jobs of all statements still running.
+            statement_results = await asyncio.gather(
+                *(run_query(statement, byte_budget=byte_budget) for statement in statements)
+            )
+            for result in statement_results:
+                bytes_processed_total += result["bytes_processed"] or 0
+                record_bigquery_job(ctx.invocation_id, self.name, result["bytes_processed"], result["slot_millis"])
+        else:
+            statement_results = [{
+                "status": "error",
+                "query": sql,
+                "schema": [],
+                "rows": [],
+                "total_rows": 0,
+                "bytes_processed": None,
+                "slot_millis": None,
+                "bytes_estimated": None,
+                "ai_row_calls_estimated": None,
+                "rejected": False,
+                "validation_errors": [],
+                "sampling": [],
+                "ai_result_cache": None,
+                "error": "No SQL query found in the generated output.",
+            }]
+
+        errors = [result["error"] for result in statement_results if result["status"] != "success"]
+        status = "error" if errors else "success"
+        logging.info(f"[{self.name}] Executed {len(statement_results)} statement(s), status: {status}.")
+
+        artifact_delta = {}
+        for result in statement_results:
+            if result["status"] != "success":
+                continue
+            if result_store.get_buffer(result.get("result_hash", "")) is None:
+                # Results served from the query cache whose Arrow table is gone are stored from their JSON rows.
+                result["result_hash"] = result_store.put(result["query"], pa.Table.from_pylist(result["rows"]))
+            result["profile"] = await asyncio.to_thread(
+                profile_dataframe, result_store.get_dataframe(result["result_hash"]), result["schema"]
+            )
+            if len(result.get("sampling") or []) == 1 and result["total_rows"] <= len(result["rows"]):
+                result["population_estimates"] = estimate_population(
+                    result["query"], result["rows"], result["sampling"][0]
+                )
+            result["artifact"] = await self._save_result_artifact(ctx, result, artifact_delta)
+
+        markdown = render_within_budget(statement_results, CONFIG.query_output_token_budget, CONFIG.query_summary_rows)
+        state_delta = {
+            "query_execution_result": {
+                "status": status,
+                "statements": [
+                    {key: value for key, value in result.items() if key != "rows"} for result in statement_results
+                ],
+            },
+            "query_execution_status": {"status": status, "error": "\n".join(errors) or None},
+            "query_execution_output": markdown,
+            "query_cost_estimate": [
+                {
+                    "bytes_estimated": result["bytes_estimated"],
+                    "ai_row_calls_estimated": result["ai_row_calls_estimated"],
+                    "rejected": result["rejected"],
+                }
+                for result in statement_results
+            ],
+            "query_bytes_processed_total": bytes_processed_total,
+        }
+        if query_result_cache is not None:
+            state_delta["query_cache_stats"] = query_result_cache.stats()
+
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            content=genai_types.Content(role="model", parts=[genai_types.Part(text=markdown)]),
+            actions=EventActions(state_delta=state_delta, artifact_delta=artifact_delta),
+        )
+
+    @staticmethod
+    async def _save_result_artifact(ctx: InvocationContext, result: dict, artifact_delta: dict) -> str | None:
+        """Save a full statement result as an Arrow IPC file artifact of the session and return its filename."""
+        if ctx.artifact_service is None:
+            return None
+        filename = f"query_result_{result['result_hash']}.arrow"
+        version = await ctx.artifact_service.save_artifact(
+            app_name=ctx.app_name,
+            user_id=ctx.user_id,
+            session_id=ctx.session.id,
+            filename=filename,
+            artifact=genai_types.Part.from_bytes(
+                data=result_store.get_buffer(result["result_hash"]).to_pybytes(), mime_type=ARROW_MIME_TYPE
+            ),
+        )
+        artifact_delta[filename] = version
+        return filename
 
 
-query_execution_agent = LlmAgent(
+query_execution_agent = QueryExecutor(
     name="query_execution_agent",
-    model=CONFIG.worker_model,
-    description=f"This agent is responsible for execution of queries in the bigquery and present the result as "
-                f"markdown table",
-    tools=[bq_executor_toolset],
-    output_key="query_execution_output",
-    instruction="""
-    Execute the current SQL query using BigQuery tools.
-
-    Original Query:
-    {query_generation_output}
-
-    Current Query:
-    {query_review_rewrite_output?}
-
-    Project: {PROJECT}, Dataset: {BQ_DATASET}, Location: {BQ_LOCATION}
-
-    After execution:
-
-    **IF SUCCESSFUL** (query returns results without errors):
-    - Display the results of query execution.
-    - Ensure the content strictly matches the query output (no fabricated or altered values).
-    - Do not include any additional text, commentary, or explanations outside the query execution results.
-    
-    **IF FAILED** (query has errors, syntax issues, or execution problems):
-    - Output the specific error details for the review agent
-    - Include error type, line numbers, and problematic parts
-    - Do not call any functions
-
-    The loop will automatically handle failed executions by triggering query refinement.
-    """,
+    description="This agent is responsible for execution of queries in the bigquery and present the result as "
+                "markdown table",
 )
@@ -1,22 +1,31 @@
 from google.adk.agents import LlmAgent
-from dar.tools.bigquery_tools import bq_meta_extractor_toolset
+from google.adk.agents.callback_context import CallbackContext
+from dar.tools.bigquery_tools import bq_meta_extractor_toolset, bq_metadata_tools, inject_schema_digest
 from dar.config import CONFIG
 
+
+def clear_previous_rewrite(callback_context: CallbackContext):
+    """Drop the rewritten query of a previous run so the executor picks up the newly generated query."""
+    if callback_context.state.get("query_review_rewrite_output"):
+        callback_context.state["query_review_rewrite_output"] = None
+
 query_generation_agent = LlmAgent(
     name="query_generation_agent",
     model=CONFIG.worker_model,
     description="This agent is responsible for generating bigquery queries in standard sql dialect",
-    tools=[bq_meta_extractor_toolset],
+    tools=[*bq_metadata_tools, bq_meta_extractor_toolset],
     output_key="query_generation_output",
+    before_agent_callback=[clear_previous_rewrite, inject_schema_digest],
     instruction = """
         You are playing role of BigQuery SQL writer specializing in both traditional SQL and AI-enhanced queries with immediate statistical validation.
         Your job is to write BigQuery SQLs that combine AI functions with statistical analysis of their results in single query executions.
     
         **INPUT:**
-        - Use the analysis done by the query understanding agent as below:
-          {query_understanding_output}
+        - Use the analysis done by the query understanding agent, given at the end of these instructions.
         - Use the project as {PROJECT}, location as {BQ_LOCATION}, dataset as {BQ_DATASET} for generating the BigQuery queries.
-        - Use the `bigquery_toolset` (or INFORMATION_SCHEMA queries) for metadata extraction for understanding the tables, columns, datatypes and description of the columns.
+        - Use the dataset schema below for the tables, columns, datatypes and description of the columns:
+          {BQ_SCHEMA_DIGEST?}
+        - Use the `get_table_info` tool only for tables that are missing from the schema above.
     
         **CORE PRINCIPLE: AI + IMMEDIATE VALIDATION**
         Every AI function call must be combined with statistical analysis of its results in the same query. AI work alone has no value - it must be analyzed.
@@ -181,11 +190,14 @@ query_generation_agent = LlmAgent(
         **QUERY WRITING GUIDELINES:**
         - Always use CTEs: AI results first, validation second.
         - Validate AI output with: range checks, category validation, correlations, distribution checks, regex keyword checks.
-        - Include LIMITs (100–1000 rows) for cost control.
+        - Include LIMITs (100–1000 rows) for cost control. A CTE applying AI functions to a single table without ORDER BY is run on a representative sample of that table instead of its LIMIT, so keep such CTEs unordered and free of joins, and count rows with COUNT(*) AS alias to get population estimates.
         - Use CASE for business rules and validations.
         - Use CAST for numeric conversions when AI.GENERATE_INT / DOUBLE is unavailable.
     
         **OUTPUT:**
         Generate complete BigQuery SQL queries that combine AI functions with immediate statistical analysis. Each query must yield actionable insights that validate AI outputs.
+
+        **ANALYSIS OF THE QUERY UNDERSTANDING AGENT:**
+        {query_understanding_output}
     """
 )
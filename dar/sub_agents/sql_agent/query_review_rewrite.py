@@ -1,11 +1,15 @@
 from google.adk.agents import LlmAgent
-from dar.config import CONFIG
+from dar.cascade import cascade_model, check_sql
+from dar.tools.sql_autofix import auto_fix_failed_query
+from dar.tools.state_compaction import enforce_prompt_token_budget
 
 query_review_rewrite_agent = LlmAgent(
     name="query_review_agent",
-    model=CONFIG.critic_model,
+    model=cascade_model("query_review_agent", check=check_sql),
     description=f"This agent is responsible for reviewing queries in the bigquery",
     output_key="query_review_rewrite_output",
+    before_agent_callback=auto_fix_failed_query,
+    before_model_callback=enforce_prompt_token_budget,
     instruction="""
         You are a BigQuery SQL reviewer operating in a refinement loop. Your task is to analyze execution results and improve queries.
     
@@ -13,6 +17,7 @@ query_review_rewrite_agent = LlmAgent(
         - Query understanding: {query_understanding_output}
         - Original generated query: {query_generation_output}
         - Previous execution result: {query_execution_output}
+        - Dry-run cost estimate per statement (bytes, row-level AI calls, whether it was rejected): {query_cost_estimate?}
         - Project: {PROJECT}, Dataset: {BQ_DATASET}, Location: {BQ_LOCATION}, BQ Model: {BQ_MODEL}, BQ CONNECTION ID: {BQ_CONNECTION_ID}
     
         **ANALYSIS:**
@@ -27,6 +32,7 @@ query_review_rewrite_agent = LlmAgent(
         - Apply appropriate fixes based on error type:
     
         **COMMON FIXES:**
+        - **Rejected by static validation**: Fix exactly the reported table, column or AI function argument, the message names the closest valid names
         - **Syntax Errors**: Fix SQL syntax, missing commas, parentheses
         - **Table/Column Not Found**: Use bigquery_toolset to verify correct names
         - **Type Mismatches**: Add proper CAST() or SAFE_CAST() functions
@@ -35,6 +41,7 @@ query_review_rewrite_agent = LlmAgent(
         - **Aggregation Errors**: Add missing GROUP BY clauses
         - **NULL Handling**: Add NULL checks for AI function inputs
         - **Limit Issues**: Add LIMIT 10 for final SELECT statements
+        - **Rejected by the cost gate**: Shrink the query instead of rewriting it from scratch: select only the needed columns, filter early, lower the LIMIT of the CTE applying AI functions and never aggregate AI results in the same SELECT that calls the AI function
         - **: Always check compliance:  
             - Project: {PROJECT}, Dataset: {BQ_DATASET}, Location: {BQ_LOCATION}, BQ Model: {BQ_MODEL}, BQ CONNECTION ID: {BQ_CONNECTION_ID}
         - **Table**: is query executed successfully but table view malformed, then fix table
@@ -1,14 +1,15 @@
 from google.adk.agents import LlmAgent
-from dar.config import CONFIG
-from dar.tools.bigquery_tools import bq_meta_extractor_toolset
+from dar.cascade import cascade_model
+from dar.tools.bigquery_tools import bq_meta_extractor_toolset, bq_metadata_tools, inject_schema_digest
 
 query_understanding_agent = LlmAgent(
     name="query_understanding_agent",
-    model=CONFIG.critic_model,
+    model=cascade_model("query_understanding_agent"),
     description = "This agent is responsible for understanding the intent of the user question and identifying "
                   "tables/columns involved to answer the query",
-    tools=[bq_meta_extractor_toolset],
+    tools=[*bq_metadata_tools, bq_meta_extractor_toolset],
     output_key="query_understanding_output",
+    before_agent_callback=inject_schema_digest,
     instruction="""
         You are a data analyst who analyzes research plans to identify data requirements and query strategies.
     
@@ -24,6 +25,10 @@ query_understanding_agent = LlmAgent(
         - [AI_QUERY] steps → AI-enhanced analysis (classification, scoring, text generation) FOLLOWED BY statistical validation
         - [ANALYSIS] steps → Result synthesis and interpretation
     
+        **DATASET SCHEMA:**
+        {BQ_SCHEMA_DIGEST?}
+        Rely on this schema for table and column names. Call `get_table_info` only if a table you need is missing above.
+    
         **AI FUNCTION OPPORTUNITIES WITH VALIDATION:**
         Look for plan steps that mention:
         - Classification, sentiment, categorization → AI.GENERATE_BOOL/INT + distribution analysis
@@ -0,0 +1,282 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Optional
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.tools import BaseTool, ToolContext
+from google.adk.tools.agent_tool import AgentTool
+from opentelemetry import trace
+from tabulate import tabulate
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AgentStats:
+    """Resource usage of one agent, summed over its runs. Wall time includes the agent's sub-agents."""
+
+    runs: int = 0
+    wall_time_ms: float = 0.0
+    model: Optional[str] = None
+    model_calls: int = 0
+    # Model calls answered through a `dar.cascade.CascadeLlm` and those of them escalated to the fallback model.
+    cascade_calls: int = 0
+    escalations: int = 0
+    model_time_ms: float = 0.0
+    input_tokens: int = 0
+    # Input tokens served from a cached content, billed at the reduced cached rate.
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    tool_calls: int = 0
+    tool_time_ms: float = 0.0
+    bytes_processed: int = 0
+    slot_millis: int = 0
+
+    def merge(self, other: "AgentStats") -> None:
+        for stats_field in fields(self):
+            value = getattr(other, stats_field.name)
+            if stats_field.name == "model":
+                self.model = value or self.model
+            else:
+                setattr(self, stats_field.name, getattr(self, stats_field.name) + value)
+
+
+_lock = threading.Lock()
+# Stats of the running invocations per invocation id and agent name.
+_invocation_stats: dict[str, dict[str, AgentStats]] = {}
+# Number of agents currently running per invocation id; the run ends when the outermost agent finishes.
+_invocation_depth: dict[str, int] = {}
+# Start times of the running agents, model calls and tool calls per invocation id. Those whose end callback never
+# ran, e.g. because the call raised or was cancelled, are dropped with the invocation's stats once it finished.
+_started: dict[str, dict[tuple, float]] = {}
+
+
+def _run_key(callback_context: CallbackContext) -> tuple[Optional[str], str]:
+    return callback_context._invocation_context.branch, callback_context.agent_name
+
+
+def _stats(invocation_id: str, agent_name: str) -> AgentStats:
+    return _invocation_stats.setdefault(invocation_id, {}).setdefault(agent_name, AgentStats())
+
+
+def _start(invocation_id: str, key: tuple) -> None:
+    _started.setdefault(invocation_id, {})[key] = time.perf_counter()
+
+
+def _elapsed_ms(invocation_id: str, key: tuple) -> float:
+    started = _started.get(invocation_id, {}).pop(key, None)
+    return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+
+def _escalation_rate(agent_stats: AgentStats) -> str:
+    if not agent_stats.cascade_calls:
+        return ""
+    return f"{agent_stats.escalations}/{agent_stats.cascade_calls}"
+
+
+def render_summary(stats: dict[str, AgentStats]) -> str:
+    """Render agent stats as a markdown table with a total row.
+
+    Args:
+        stats: Stats per agent name.
+
+    Returns:
+        str: Markdown table.
+    """
+    totals = AgentStats()
+    rows = []
+    for agent_name, agent_stats in sorted(stats.items(), key=lambda item: -item[1].wall_time_ms):
+        totals.merge(agent_stats)
+        rows.append([
+            agent_name, agent_stats.runs, round(agent_stats.wall_time_ms / 1000, 2), agent_stats.model or "",
+            agent_stats.model_calls, _escalation_rate(agent_stats), agent_stats.input_tokens,
+            agent_stats.cached_input_tokens, agent_stats.output_tokens, agent_stats.tool_calls,
+            round(agent_stats.tool_time_ms / 1000, 2), agent_stats.bytes_processed, agent_stats.slot_millis,
+        ])
+    rows.append([
+        "**total**", "", "", "", totals.model_calls, _escalation_rate(totals), totals.input_tokens,
+        totals.cached_input_tokens, totals.output_tokens, totals.tool_calls, round(totals.tool_time_ms / 1000, 2),
+        totals.bytes_processed, totals.slot_millis,
+    ])
+    headers = ["agent", "runs", "wall time (s)", "model", "model calls", "escalations", "input tokens",
+               "cached input tokens", "output tokens", "tool calls", "tool time (s)", "BQ bytes processed",
+               "BQ slot ms"]
+    return tabulate(rows, headers=headers, tablefmt="github")
+
+
+def _finish_invocation(callback_context: CallbackContext) -> None:
+    """Merge the stats of a finished invocation into the session totals in state and log them."""
+    invocation_stats = _invocation_stats.pop(callback_context.invocation_id, {})
+    _invocation_depth.pop(callback_context.invocation_id, None)
+    _started.pop(callback_context.invocation_id, None)
+    session_stats = {
+        agent_name: AgentStats(**agent_stats)
+        for agent_name, agent_stats in (callback_context.state.get("telemetry") or {}).items()
+    }
+    for agent_name, agent_stats in invocation_stats.items():
+        session_stats.setdefault(agent_name, AgentStats()).merge(agent_stats)
+
+    callback_context.state["telemetry"] = {
+        agent_name: asdict(agent_stats) for agent_name, agent_stats in session_stats.items()
+    }
+    callback_context.state["telemetry_summary"] = render_summary(session_stats)
+    logger.info(json.dumps({
+        "event": "invocation_telemetry",
+        "invocation_id": callback_context.invocation_id,
+        "agents": {agent_name: asdict(agent_stats) for agent_name, agent_stats in invocation_stats.items()},
+    }))
+
+
+def before_agent(callback_context: CallbackContext) -> None:
+    key = _run_key(callback_context)
+    with _lock:
+        _stats(callback_context.invocation_id, callback_context.agent_name).runs += 1
+        _invocation_depth[callback_context.invocation_id] = _invocation_depth.get(callback_context.invocation_id, 0) + 1
+        _start(callback_context.invocation_id, ("agent", *key))
+
+
+def after_agent(callback_context: CallbackContext) -> None:
+    key = _run_key(callback_context)
+    with _lock:
+        elapsed_ms = _elapsed_ms(callback_context.invocation_id, ("agent", *key))
+        agent_stats = _stats(callback_context.invocation_id, callback_context.agent_name)
+        agent_stats.wall_time_ms += elapsed_ms
+        depth = _invocation_depth.get(callback_context.invocation_id, 1) - 1
+        _invocation_depth[callback_context.invocation_id] = depth
+
+        logger.info(json.dumps({
+            "event": "agent_run",
+            "invocation_id": callback_context.invocation_id,
+            "agent": callback_context.agent_name,
+            "wall_time_ms": round(elapsed_ms, 1),
+        }))
+        span = trace.get_current_span()
+        span.set_attribute("dar.agent.model_calls", agent_stats.model_calls)
+        span.set_attribute("dar.agent.escalations", agent_stats.escalations)
+        span.set_attribute("dar.agent.input_tokens", agent_stats.input_tokens)
+        span.set_attribute("dar.agent.output_tokens", agent_stats.output_tokens)
+        span.set_attribute("dar.agent.tool_calls", agent_stats.tool_calls)
+        span.set_attribute("dar.bigquery.bytes_processed", agent_stats.bytes_processed)
+        span.set_attribute("dar.bigquery.slot_millis", agent_stats.slot_millis)
+
+        if depth <= 0:
+            _finish_invocation(callback_context)
+
+
+def before_model(callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+    with _lock:
+        _stats(callback_context.invocation_id, callback_context.agent_name).model = llm_request.model
+        _start(callback_context.invocation_id, ("model", *_run_key(callback_context)))
+
+
+def after_model(callback_context: CallbackContext, llm_response: LlmResponse) -> None:
+    if llm_response.partial:
+        return
+    key = _run_key(callback_context)
+    with _lock:
+        agent_stats = _stats(callback_context.invocation_id, callback_context.agent_name)
+        elapsed_ms = _elapsed_ms(callback_context.invocation_id, ("model", *key))
+        agent_stats.model_calls += 1
+        agent_stats.model_time_ms += elapsed_ms
+        usage = llm_response.usage_metadata
+        input_tokens = (usage.prompt_token_count or 0) if usage else 0
+        output_tokens = (usage.candidates_token_count or 0) if usage else 0
+        cached_tokens = (usage.cached_content_token_count or 0) if usage else 0
+        agent_stats.input_tokens += input_tokens
+        agent_stats.cached_input_tokens += cached_tokens
+        agent_stats.output_tokens += output_tokens
+        cascade = (llm_response.custom_metadata or {}).get("cascade")
+        if cascade:
+            agent_stats.cascade_calls += 1
+            agent_stats.escalations += int(cascade["escalated"])
+        logger.info(json.dumps({
+            "event": "model_call",
+            "invocation_id": callback_context.invocation_id,
+            "agent": callback_context.agent_name,
+            "model": cascade["model"] if cascade else agent_stats.model,
+            "latency_ms": round(elapsed_ms, 1),
+            "input_tokens": input_tokens,
+            "cached_input_tokens": cached_tokens,
+            "output_tokens": output_tokens,
+            **({"escalated": cascade["escalated"], "escalation_reason": cascade.get("reason")} if cascade else {}),
+        }))
+
+
+def before_tool(tool: BaseTool, args: dict[str, Any], tool_context: ToolContext) -> None:
+    with _lock:
+        _start(tool_context.invocation_id, ("tool", tool_context.function_call_id))
+
+
+def after_tool(tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: Any) -> None:
+    with _lock:
+        # Tool calls served by an earlier before_tool_callback were not timed and count with zero duration.
+        elapsed_ms = _elapsed_ms(tool_context.invocation_id, ("tool", tool_context.function_call_id))
+        agent_stats = _stats(tool_context.invocation_id, tool_context.agent_name)
+        agent_stats.tool_calls += 1
+        agent_stats.tool_time_ms += elapsed_ms
+        logger.info(json.dumps({
+            "event": "tool_call",
+            "invocation_id": tool_context.invocation_id,
+            "agent": tool_context.agent_name,
+            "tool": tool.name,
+            "latency_ms": round(elapsed_ms, 1),
+        }))
+
+
+def record_bigquery_job(invocation_id: str, agent_name: str, bytes_processed: int, slot_millis: int) -> None:
+    """Attribute the bytes processed and slot time of a BigQuery job run by an agent without a tool call.
+
+    Jobs of invocations not run by an instrumented agent tree, e.g. with `CONFIG.telemetry_enabled` off, are not
+    recorded, since no finished invocation would ever remove their stats.
+
+    Args:
+        invocation_id: The invocation the agent runs in.
+        agent_name: Name of the agent that ran the job.
+        bytes_processed: Bytes processed by the job.
+        slot_millis: Slot milliseconds consumed by the job.
+    """
+    with _lock:
+        if invocation_id not in _invocation_depth:
+            return
+        agent_stats = _stats(invocation_id, agent_name)
+        agent_stats.bytes_processed += bytes_processed or 0
+        agent_stats.slot_millis += slot_millis or 0
+    span = trace.get_current_span()
+    span.add_event("bigquery_job", {"bytes_processed": bytes_processed or 0, "slot_millis": slot_millis or 0})
+
+
+def _append_callback(callbacks: list, callback, first: bool) -> list:
+    if callback in callbacks:
+        return callbacks
+    return [callback, *callbacks] if first else [*callbacks, callback]
+
+
+def instrument_agent_tree(agent: BaseAgent) -> None:
+    """Wire the telemetry callbacks into an agent, its sub-agents and agents wrapped in an `AgentTool`.
+
+    Before-callbacks are appended and after-callbacks prepended to the existing ones, so runs skipped or served
+    by another callback are not timed and the recorded time covers only the agent, model or tool itself. At the
+    end of every invocation the session totals are stored in the 'telemetry' and 'telemetry_summary' state keys.
+
+    Args:
+        agent: Root of the agent tree.
+    """
+    agent.before_agent_callback = _append_callback(agent.canonical_before_agent_callbacks, before_agent, first=False)
+    agent.after_agent_callback = _append_callback(agent.canonical_after_agent_callbacks, after_agent, first=True)
+    if isinstance(agent, LlmAgent):
+        agent.before_model_callback = _append_callback(
+            agent.canonical_before_model_callbacks, before_model, first=False
+        )
+        agent.after_model_callback = _append_callback(agent.canonical_after_model_callbacks, after_model, first=True)
+        agent.before_tool_callback = _append_callback(agent.canonical_before_tool_callbacks, before_tool, first=False)
+        agent.after_tool_callback = _append_callback(agent.canonical_after_tool_callbacks, after_tool, first=True)
+        for tool in agent.tools:
+            if isinstance(tool, AgentTool):
+                instrument_agent_tree(tool.agent)
+    for sub_agent in agent.sub_agents:
+        instrument_agent_tree(sub_agent)
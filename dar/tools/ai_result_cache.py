@@ -0,0 +1,247 @@
+import hashlib
+from typing import Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from dar.tools.cost_guard import ai_selects
+from dar.tools.sql_utils import SQL_DIALECT, find_ai_calls
+
+# SQL type of the `result` field of the cached AI functions, results are stored as STRING and cast back on read.
+RESULT_TYPES = {"GENERATE": "STRING", "GENERATE_BOOL": "BOOL", "GENERATE_INT": "INT64", "GENERATE_DOUBLE": "FLOAT64"}
+CACHE_TABLE_COLUMNS = {
+    "prompt_hash": "STRING",
+    "row_hash": "STRING",
+    "endpoint": "STRING",
+    "result": "STRING",
+    "created_at": "TIMESTAMP",
+}
+# Named arguments that choose where a call runs rather than what it returns; the endpoint is a key column.
+_ROUTING_ARGUMENTS = {"connection_id", "endpoint"}
+
+
+def cache_table_id(project_id: str, cache_dataset: str, dataset_id: str) -> str:
+    """Id of the AI result cache table of a dataset, one table per researched dataset."""
+    return f"{project_id}.{cache_dataset}.ai_results_{dataset_id}"
+
+
+def _in_projection(node: exp.Expression, select: exp.Select) -> bool:
+    while node.parent is not select:
+        node = node.parent
+    return node.arg_key == "expressions"
+
+
+def _prompt_parts(function: exp.Anonymous) -> Optional[list[exp.Expression]]:
+    positional = [arg for arg in function.expressions if not isinstance(arg, exp.Kwarg)]
+    if len(positional) != 1:
+        return None
+    prompt = positional[0]
+    return list(prompt.expressions) if isinstance(prompt, exp.Tuple) else [prompt]
+
+
+def _endpoint(function: exp.Anonymous) -> Optional[str]:
+    """Literal `endpoint` of a call, empty for the default model and None if it is not a literal."""
+    for arg in function.expressions:
+        if isinstance(arg, exp.Kwarg) and arg.this.name.lower() == "endpoint":
+            return arg.expression.this if isinstance(arg.expression, exp.Literal) else None
+    return ""
+
+
+def _prompt_hash(function: exp.Anonymous) -> str:
+    """Hash of everything a call's result depends on except the row values: the function, prompt and options.
+
+    Column qualifiers are dropped, so statements aliasing the same table differently share cached results.
+    """
+    normalized = function.copy()
+    for column in normalized.find_all(exp.Column):
+        column.set("table", None)
+    prompt = next(arg for arg in normalized.expressions if not isinstance(arg, exp.Kwarg))
+    options = sorted(
+        arg.sql(dialect=SQL_DIALECT) for arg in normalized.expressions
+        if isinstance(arg, exp.Kwarg) and arg.this.name.lower() not in _ROUTING_ARGUMENTS
+    )
+    key = "|".join([normalized.name.upper(), prompt.sql(dialect=SQL_DIALECT), *options])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _row_hash(parts: list[exp.Expression]) -> exp.Expression:
+    """Hash of the row values a prompt is built from."""
+    fields = ", ".join(f"{part.sql(dialect=SQL_DIALECT)} AS _p{index}" for index, part in enumerate(parts))
+    return sqlglot.parse_one(f"TO_HEX(SHA256(TO_JSON_STRING(STRUCT({fields}))))", read=SQL_DIALECT)
+
+
+def _cacheable_parts(field: exp.Expression) -> Optional[list[exp.Expression]]:
+    """Row-dependent prompt parts of a `AI.<function>(...).result` read, None if the call cannot be cached.
+
+    Calls over aggregates, window functions or subqueries depend on more than their row and are not cached.
+    """
+    if not isinstance(field, exp.Dot) or field.expression.name.lower() != "result":
+        return None
+    function = field.this.expression
+    parts = _prompt_parts(function)
+    if function.name.upper() not in RESULT_TYPES or parts is None or _endpoint(function) is None:
+        return None
+    row_parts = [part for part in parts if not isinstance(part, exp.Literal)]
+    for part in row_parts:
+        if part.find(exp.AggFunc, exp.Window, exp.Subquery, exp.Select) or find_ai_calls(part):
+            return None
+    return row_parts or None
+
+
+def _qualify_star(select: exp.Select) -> bool:
+    """Qualify a bare `*` with the only source of a SELECT, so the joined cache lookups are not selected too."""
+    stars = [projection for projection in select.expressions if isinstance(projection, exp.Star)]
+    if not stars:
+        return True
+    source = select.args["from"].this
+    if select.args.get("joins") or not source.alias_or_name:
+        return False
+    for star in stars:
+        star.replace(exp.Column(this=star.copy(), table=exp.to_identifier(source.alias_or_name)))
+    return True
+
+
+def _used_ctes(ctes: Optional[exp.With], query: exp.Expression) -> list[exp.CTE]:
+    """The CTEs a query reads from, directly or through other CTEs, in definition order."""
+    if ctes is None:
+        return []
+    needed = {table.name for table in query.find_all(exp.Table) if not table.db}
+    used = []
+    for cte in reversed(ctes.expressions):
+        if cte.alias_or_name in needed:
+            used.insert(0, cte)
+            needed |= {table.name for table in cte.this.find_all(exp.Table) if not table.db}
+    return used
+
+
+def _cached_results(prompt_hash: str, endpoint: str) -> str:
+    """Condition selecting the cached results of a call; NULL results stored by older fills count as missing."""
+    return (
+        f"prompt_hash = {exp.Literal.string(prompt_hash).sql()} AND endpoint = {exp.Literal.string(endpoint).sql()} "
+        f"AND result IS NOT NULL"
+    )
+
+
+def _fill_statement(
+    cache_table: str, ctes: Optional[exp.With], rows: exp.Select, field: exp.Dot, prompt_hash: str, endpoint: str
+) -> str:
+    """INSERT computing and storing the results of a call for the rows of `rows` missing from the cache.
+
+    `rows` selects `_ai_row_hash` and the row-dependent prompt parts as `_ai_part_<n>`, in prompt order. NULL
+    results, e.g. of a failed model call, are not stored, so the next statement calls the model again for them.
+    """
+    call = field.copy()
+    parts = [part for part in _prompt_parts(call.this.expression) if not isinstance(part, exp.Literal)]
+    for index, part in enumerate(parts):
+        part.replace(exp.column(f"_ai_part_{index}"))
+
+    with_sql = "".join(f"{cte.sql(dialect=SQL_DIALECT)}, " for cte in _used_ctes(ctes, rows))
+    any_parts = ", ".join(f"ANY_VALUE(_ai_part_{i}) AS _ai_part_{i}" for i in range(len(parts)))
+    cached_rows = f"SELECT row_hash FROM `{cache_table}` WHERE {_cached_results(prompt_hash, endpoint)}"
+    return (
+        f"INSERT INTO `{cache_table}` ({', '.join(CACHE_TABLE_COLUMNS)})\n"
+        f"WITH {with_sql}_ai_rows AS ({rows.sql(dialect=SQL_DIALECT)})\n"
+        f"SELECT {exp.Literal.string(prompt_hash).sql()}, _ai_row_hash, {exp.Literal.string(endpoint).sql()}, "
+        f"_ai_result, CURRENT_TIMESTAMP()\n"
+        f"FROM (\n"
+        f"  SELECT _ai_row_hash, CAST({call.sql(dialect=SQL_DIALECT)} AS STRING) AS _ai_result\n"
+        f"  FROM (SELECT _ai_row_hash, {any_parts} FROM _ai_rows GROUP BY _ai_row_hash)\n"
+        f"  WHERE _ai_row_hash NOT IN ({cached_rows})\n"
+        f")\n"
+        f"WHERE _ai_result IS NOT NULL"
+    )
+
+
+def plan_ai_result_cache(sql: str, cache_table: str) -> tuple[str, list[str]]:
+    """Rewrite the row-level AI calls of a statement to read their results from the AI result cache table.
+
+    Every `AI.GENERATE[_BOOL|_INT|_DOUBLE](...).result` in the select list of a SELECT is keyed by the hash of
+    its function, prompt and options (`prompt_hash`), the hash of the row values its prompt is built from
+    (`row_hash`) and its `endpoint`. The SELECT gets a LEFT JOIN to the cached results of the call and the call
+    becomes `COALESCE(cached result, call)`, so only rows missing from the cache call the model.
+
+    For every cached call an INSERT statement is returned that computes and stores the results of the rows the
+    SELECT reads that are missing from the cache. Run before the statement, it turns all calls of the statement
+    into cache hits. To make both read the same rows, a SELECT with a LIMIT is ordered by the row hash.
+
+    SELECTs with AI calls outside the select list, e.g. in WHERE, or with ORDER BY and LIMIT are not rewritten,
+    their rows depend on the results. Calls over aggregates or subqueries are left as they are.
+
+    Args:
+        sql: SQL statement.
+        cache_table: Fully qualified id of the cache table, see `cache_table_id`.
+
+    Returns:
+        tuple: The rewritten statement and the INSERT statements filling the cache, the statement unchanged and
+            no INSERT statements when no call can be cached.
+    """
+    try:
+        expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    except SqlglotError:
+        return sql, []
+
+    planned = []
+    for select, _ in list(ai_selects(expression).values()):
+        calls = [call for call in find_ai_calls(select) if call.find_ancestor(exp.Select) is select]
+        if select.args.get("from") is None or not all(_in_projection(call, select) for call in calls):
+            continue
+        aggregating = bool(select.args.get("group") or select.args.get("distinct")) or any(
+            projection.find(exp.AggFunc) for projection in select.expressions
+        )
+        limit = None if aggregating else select.args.get("limit")
+        if limit is not None and select.args.get("order"):
+            continue
+        fields = [(call.parent, _cacheable_parts(call.parent)) for call in calls]
+        fields = [(field, parts) for field, parts in fields if parts]
+        if not fields or not _qualify_star(select):
+            continue
+
+        rows = exp.Select()
+        for arg in ("from", "joins", "where"):
+            if select.args.get(arg):
+                rows.set(arg, select.args[arg].copy() if arg != "joins" else [j.copy() for j in select.args[arg]])
+        if limit is not None:
+            order_key = _row_hash(fields[0][1])
+            select.order_by(order_key.copy(), copy=False)
+            rows.order_by(order_key, copy=False)
+            rows.set("limit", limit.copy())
+
+        lookups = {}
+        for field, parts in fields:
+            function = field.this.expression
+            prompt_hash, endpoint = _prompt_hash(function), _endpoint(function)
+            row_hash = _row_hash(parts)
+            key = (prompt_hash, endpoint, row_hash.sql(dialect=SQL_DIALECT))
+            if key not in lookups:
+                alias = f"_ai_cache_{len(planned)}"
+                lookups[key] = alias
+                lookup = sqlglot.parse_one(
+                    f"SELECT row_hash AS _ai_row_hash, ANY_VALUE(result) AS _ai_result FROM `{cache_table}` "
+                    f"WHERE {_cached_results(prompt_hash, endpoint)} GROUP BY row_hash",
+                    read=SQL_DIALECT,
+                )
+                select.join(
+                    exp.Subquery(this=lookup, alias=exp.TableAlias(this=exp.to_identifier(alias))),
+                    on=exp.EQ(this=exp.column("_ai_row_hash", table=alias), expression=row_hash),
+                    join_type="left",
+                    copy=False,
+                )
+                planned_rows = rows.copy()
+                planned_rows.set("expressions", [
+                    exp.alias_(row_hash.copy(), "_ai_row_hash"),
+                    *(exp.alias_(part.copy(), f"_ai_part_{i}") for i, part in enumerate(parts)),
+                ])
+                planned.append((planned_rows, field.copy(), prompt_hash, endpoint))
+            result_type = exp.DataType.build(RESULT_TYPES[function.name.upper()], dialect=SQL_DIALECT)
+            cached = exp.TryCast(this=exp.column("_ai_result", table=lookups[key]), to=result_type)
+            field.replace(exp.Coalesce(this=cached, expressions=[field.copy()]))
+    if not planned:
+        return sql, []
+
+    ctes = expression.args.get("with")
+    fills = [
+        _fill_statement(cache_table, ctes, rows, field, prompt_hash, endpoint)
+        for rows, field, prompt_hash, endpoint in planned
+    ]
+    return expression.sql(dialect=SQL_DIALECT), fills
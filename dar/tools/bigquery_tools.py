@@ -1,18 +1,747 @@
-import google.auth
+import asyncio
+import functools
+import json
+import logging
+import threading
+import types
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+import pyarrow as pa
+from google.api_core.client_info import ClientInfo
+from google.api_core.exceptions import BadRequest, GoogleAPIError
+from google.auth.credentials import Credentials
+from google.auth.exceptions import GoogleAuthError
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import bigquery
+from google.cloud import bigquery_storage
+from requests.adapters import HTTPAdapter
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
 from google.adk.tools.bigquery import BigQueryCredentialsConfig
 from google.adk.tools.bigquery import BigQueryToolset
 from google.adk.tools.bigquery.config import BigQueryToolConfig
 from google.adk.tools.bigquery.config import WriteMode
+from google.adk.tools.bigquery import client as adk_bigquery_client
+from google.adk.tools.google_tool import GoogleTool
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools import BaseTool, ToolContext
+
+from dar.config import CONFIG
+from dar.tools.ai_result_cache import CACHE_TABLE_COLUMNS, cache_table_id, plan_ai_result_cache
+from dar.tools.cost_guard import cap_ai_rows, estimate_ai_row_calls
+from dar.tools.metadata_cache import DatasetMetadataCache
+from dar.tools.query_cache import QueryResultCache, referenced_tables
+from dar.tools.result_store import ArrowResultStore
+from dar.tools.sampling import sample_ai_sources
+from dar.tools.sql_validation import describe_parse_error, validate_sql
+
+logger = logging.getLogger(__name__)
 
 tool_config = BigQueryToolConfig(write_mode=WriteMode.BLOCKED)
 
-application_default_credentials, _ = google.auth.default()
-credentials_config = BigQueryCredentialsConfig(
-    credentials=application_default_credentials
+
+
+def _pooled_session(credentials: Credentials) -> AuthorizedSession:
+    """Authorized HTTP session with a bounded pool of keep-alive connections, shared by all threads of a client.
+
+    Callers beyond `CONFIG.bigquery_http_pool_size` concurrent requests wait for a free connection instead of
+    opening new ones, so TLS handshakes and token refreshes happen once per connection, not once per call.
+    """
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(
+        pool_connections=CONFIG.bigquery_http_pool_size,
+        pool_maxsize=CONFIG.bigquery_http_pool_size,
+        pool_block=True,
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+@functools.lru_cache(maxsize=16)
+def _project_client(project_id: str) -> bigquery.Client:
+    credentials = CONFIG.get_credentials()
+    return bigquery.Client(
+        project=project_id,
+        location=CONFIG.location,
+        credentials=credentials,
+        client_info=ClientInfo(user_agent=adk_bigquery_client.USER_AGENT),
+        _http=_pooled_session(credentials),
+    )
+
+
+def get_bigquery_client() -> bigquery.Client:
+    """Get the process-wide pooled BigQuery client shared by the toolsets and the custom executor agents.
+
+    Returns:
+        bigquery.Client: Client bound to the configured project, location and credentials.
+    """
+    return _project_client(CONFIG.project_id)
+
+
+def get_shared_bigquery_client(*, project: Optional[str], credentials: Credentials) -> bigquery.Client:
+    """Drop-in replacement of the ADK BigQuery tools' client factory that reuses the pooled client of a project.
+
+    The ADK tools construct a new client, and with it a new HTTP session, on every call. Calls with the shared
+    configuration credentials get the pooled client of their project instead; other credentials, e.g. of an
+    end-user OAuth flow, still get a client of their own.
+    """
+    if credentials is not CONFIG.get_credentials():
+        return bigquery.Client(
+            project=project, credentials=credentials, client_info=ClientInfo(user_agent=adk_bigquery_client.USER_AGENT)
+        )
+    if not project or project == CONFIG.project_id:
+        return get_bigquery_client()
+    return _project_client(project)
+
+
+def _with_shared_client(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Copy of an ADK BigQuery tool function whose `client` module resolves to `get_shared_bigquery_client`.
+
+    The ADK tools call `client.get_bigquery_client` through their module globals; the copy gets its own globals
+    with a replacement `client`, so the ADK module itself and tools outside these toolsets are left unchanged.
+    """
+    if func.__globals__.get("client") is not adk_bigquery_client:
+        return func
+    shared_client = types.SimpleNamespace(**vars(adk_bigquery_client))
+    shared_client.get_bigquery_client = get_shared_bigquery_client
+    tool_globals = {**func.__globals__, "client": shared_client}
+    shared_func = types.FunctionType(func.__code__, tool_globals, func.__name__, func.__defaults__, func.__closure__)
+    shared_func.__kwdefaults__ = func.__kwdefaults__
+    return functools.update_wrapper(shared_func, func)
+
+
+def _in_thread(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap a blocking tool function into a coroutine that runs it in a worker thread, keeping its signature."""
+
+    @functools.wraps(func)
+    async def run_in_thread(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    return run_in_thread
+
+
+class SharedClientBigQueryToolset(BigQueryToolset):
+    """BigQuery toolset whose tools share the pooled client of `get_bigquery_client` and never block the event loop.
+
+    The shared configuration credentials are taken once the tools are first requested, since resolving them can
+    query the metadata server. The blocking BigQuery calls of the tools run in worker threads, so concurrent
+    sessions and plan goals keep making progress while a query runs.
+    """
+
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> list[BaseTool]:
+        if self._credentials_config is None:
+            self._credentials_config = BigQueryCredentialsConfig(credentials=CONFIG.get_credentials())
+        return [
+            GoogleTool(
+                func=_in_thread(_with_shared_client(tool.func)),
+                credentials_config=self._credentials_config,
+                tool_settings=self._tool_settings,
+            )
+            for tool in await super().get_tools(readonly_context)
+        ]
+
+
+bq_executor_toolset = SharedClientBigQueryToolset(bigquery_tool_config=tool_config)
+bq_meta_extractor_toolset = SharedClientBigQueryToolset(
+    tool_filter=['list_dataset_ids', 'get_dataset_info']
+)
+
+
+@functools.lru_cache(maxsize=1)
+def get_bqstorage_client() -> Optional[bigquery_storage.BigQueryReadClient]:
+    """Get the process-wide BigQuery Storage Read API client used to stream large query results.
+
+    Returns:
+        Optional[bigquery_storage.BigQueryReadClient]: Client bound to the configured credentials, None if it cannot
+            be created, results are then read through the REST API.
+    """
+    try:
+        return bigquery_storage.BigQueryReadClient(credentials=CONFIG.get_credentials())
+    except (GoogleAuthError, GoogleAPIError, ValueError) as e:
+        logger.warning(f"Failed to create the BigQuery Storage client, query results are read through REST: {e}")
+        return None
+
+
+@functools.lru_cache(maxsize=1)
+def get_metadata_cache() -> DatasetMetadataCache:
+    """Get the process-wide metadata cache of the configured dataset, created on first use.
+
+    Returns:
+        DatasetMetadataCache: Cache of the configured project and dataset, read with the pooled client.
+    """
+    return DatasetMetadataCache(
+        project_id=CONFIG.project_id,
+        dataset_id=CONFIG.dataset,
+        client_factory=get_bigquery_client,
+        refresh_seconds=CONFIG.metadata_cache_refresh_seconds,
+    )
+
+
+def warm_metadata_cache() -> None:
+    """Load the metadata of the configured dataset ahead of the first request, see `DatasetMetadataCache.warm`."""
+    get_metadata_cache().warm()
+
+
+async def list_table_ids(project_id: str, dataset_id: str) -> list[str]:
+    """List table ids in a BigQuery dataset.
+
+    Args:
+        project_id (str): The Google Cloud project id containing the dataset.
+        dataset_id (str): The BigQuery dataset id.
+
+    Returns:
+        list[str]: List of the tables ids present in the dataset.
+    """
+    metadata_cache = get_metadata_cache()
+    try:
+        if (project_id, dataset_id) == (metadata_cache.project_id, metadata_cache.dataset_id):
+            return await asyncio.to_thread(metadata_cache.list_table_ids)
+        tables = await asyncio.to_thread(lambda: list(get_bigquery_client().list_tables(f"{project_id}.{dataset_id}")))
+        return [table.table_id for table in tables]
+    except GoogleAPIError as e:
+        return [f"ERROR: {e}"]
+
+
+async def get_table_info(project_id: str, dataset_id: str, table_id: str) -> dict:
+    """Get metadata information about a BigQuery table.
+
+    Args:
+        project_id (str): The Google Cloud project id containing the dataset.
+        dataset_id (str): The BigQuery dataset id containing the table.
+        table_id (str): The BigQuery table id.
+
+    Returns:
+        dict: Dictionary representing the properties of the table, including its schema.
+    """
+    metadata_cache = get_metadata_cache()
+    try:
+        if (project_id, dataset_id) == (metadata_cache.project_id, metadata_cache.dataset_id):
+            table_info = await asyncio.to_thread(metadata_cache.get_table_info, table_id)
+            if table_info is not None:
+                return table_info
+            return {"status": "ERROR", "error_details": f"Table {table_id} not found in {metadata_cache.dataset_ref}."}
+        table = await asyncio.to_thread(get_bigquery_client().get_table, f"{project_id}.{dataset_id}.{table_id}")
+        return table.to_api_repr()
+    except GoogleAPIError as e:
+        return {"status": "ERROR", "error_details": str(e)}
+
+
+bq_metadata_tools = [list_table_ids, get_table_info]
+
+
+async def inject_schema_digest(callback_context: CallbackContext):
+    """Put the cached schema digest of the configured dataset into the 'BQ_SCHEMA_DIGEST' state key."""
+    try:
+        digest = await asyncio.to_thread(get_metadata_cache().schema_digest)
+    except GoogleAPIError as e:
+        logger.warning(f"Failed to build schema digest: {e}")
+        return
+    if callback_context.state.get("BQ_SCHEMA_DIGEST") != digest:
+        callback_context.state["BQ_SCHEMA_DIGEST"] = digest
+
+
+query_result_cache = (
+    QueryResultCache(
+        cache_dir=CONFIG.query_cache_dir,
+        ttl_seconds=CONFIG.query_cache_ttl_seconds,
+        max_bytes=CONFIG.query_cache_max_bytes,
+    )
+    if CONFIG.query_cache_enabled
+    else None
 )
 
-bq_executor_toolset = BigQueryToolset(credentials_config=credentials_config, bigquery_tool_config=tool_config)
-bq_meta_extractor_toolset = BigQueryToolset(
-    credentials_config=credentials_config,
-    tool_filter=['list_dataset_ids', 'get_dataset_info', 'list_table_ids', 'get_table_info']
-)
\ No newline at end of file
+result_store = ArrowResultStore(max_bytes=CONFIG.result_store_max_bytes)
+
+
+def get_table_versions(query: str) -> Optional[dict[str, int]]:
+    """Get the last-modified time of every table a statement reads from.
+
+    Args:
+        query: SQL statement to inspect.
+
+    Returns:
+        Optional[dict[str, int]]: Table reference to last-modified epoch milliseconds, or None if the referenced
+            tables cannot be determined.
+    """
+    tables = referenced_tables(query, CONFIG.project_id, CONFIG.dataset)
+    if tables is None:
+        return None
+    metadata_cache = get_metadata_cache()
+    try:
+        versions = {}
+        for table in tables:
+            project_id, dataset_id, table_id = table.split(".", 2)
+            if (project_id, dataset_id) == (metadata_cache.project_id, metadata_cache.dataset_id):
+                versions[table] = metadata_cache.table_last_modified(table_id)
+            else:
+                versions[table] = int(get_bigquery_client().get_table(table).modified.timestamp() * 1000)
+        return versions
+    except (GoogleAPIError, AttributeError) as e:
+        logger.warning(f"Failed to resolve table versions for the query cache: {e}")
+        return None
+
+
+def _result_cache_key(query: str, namespace: str) -> Optional[str]:
+    """Build the query result cache key, or return None when the result must not be cached."""
+    if query_result_cache is None:
+        return None
+    table_versions = get_table_versions(query)
+    if table_versions is None:
+        return None
+    return query_result_cache.make_key(query, f"{CONFIG.project_id}.{CONFIG.dataset}", table_versions, namespace)
+
+
+def _to_json_value(value: Any) -> Any:
+    """Convert a BigQuery cell value into a JSON serializable value."""
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        value = str(value)
+    return value
+
+
+def _read_arrow(row_iterator: bigquery.table.RowIterator, max_rows: int) -> pa.Table:
+    """Stream the rows of a finished query into an Arrow table of at most `max_rows` rows.
+
+    Results that do not fit into the first page are read as Arrow record batches through the BigQuery Storage
+    Read API, smaller ones from the first page returned with the query, so no JSON rows are materialized.
+    """
+    batches = []
+    num_rows = 0
+    for batch in row_iterator.to_arrow_iterable(bqstorage_client=get_bqstorage_client()):
+        if num_rows + batch.num_rows > max_rows:
+            batch = batch.slice(0, max_rows - num_rows)
+        batches.append(batch)
+        num_rows += batch.num_rows
+        if num_rows >= max_rows:
+            logger.info(f"Stored the first {num_rows} of {row_iterator.total_rows} result rows")
+            break
+    if not batches:
+        return pa.table({field.name: pa.array([]) for field in row_iterator.schema})
+    return pa.Table.from_batches(batches)
+
+
+def _table_rows(table: exp.Table) -> Optional[int]:
+    """Row count of a table of the configured dataset from the metadata cache, None for other tables."""
+    if (table.catalog or CONFIG.project_id, table.db or CONFIG.dataset) != (CONFIG.project_id, CONFIG.dataset):
+        return None
+    table_info = get_metadata_cache().get_table_info(table.name)
+    if table_info is None or table_info.get("numRows") is None:
+        return None
+    return int(table_info["numRows"])
+
+
+def apply_ai_row_cap(query: str) -> tuple[str, Optional[int], Optional[str]]:
+    """Check the estimated number of row-level AI calls of a statement against `CONFIG.max_ai_rows_per_query`.
+
+    Statements over the cap, or whose AI calls cannot be bounded, are rewritten with lower LIMITs when possible.
+
+    Args:
+        query: SQL statement.
+
+    Returns:
+        tuple: The statement to run, its estimated AI calls and an error message if the statement must be rejected.
+    """
+    max_ai_rows = CONFIG.max_ai_rows_per_query
+    try:
+        estimate = estimate_ai_row_calls(query, _table_rows)
+    except SqlglotError:
+        # Leave statements sqlglot cannot parse to BigQuery, the byte budget still applies.
+        return query, None, None
+    if estimate is not None and estimate <= max_ai_rows:
+        return query, estimate, None
+
+    capped_query = cap_ai_rows(query, max_ai_rows)
+    if capped_query is None:
+        return query, estimate, (
+            f"Estimated {estimate if estimate is not None else 'unbounded'} row-level AI function calls exceed "
+            f"the limit of {max_ai_rows}. Apply AI functions in a CTE with a LIMIT of at most {max_ai_rows} rows "
+            f"and aggregate its results in a separate step."
+        )
+    logger.info(f"Capped AI function calls of the query to {max_ai_rows} rows (estimated: {estimate})")
+    return capped_query, estimate_ai_row_calls(capped_query, _table_rows), None
+
+
+class ByteBudget:
+    """Bytes the statements of a session may still process, shared by statements running concurrently.
+
+    Every statement reserves its dry-run estimate before its job is submitted and settles the reservation with
+    the bytes it actually processed, so statements running at the same time cannot overrun the budget together.
+    """
+
+    def __init__(self, remaining: int):
+        self.remaining = remaining
+        self._lock = threading.Lock()
+
+    def reserve(self, estimated: int) -> Optional[int]:
+        """Reserve the estimated bytes of a statement.
+
+        Args:
+            estimated: Bytes the dry run estimated.
+
+        Returns:
+            Optional[int]: Bytes the statement may bill at most, None if the estimate exceeds the remaining budget.
+        """
+        with self._lock:
+            if estimated > self.remaining:
+                return None
+            allowance = self.remaining
+            self.remaining -= estimated
+            return allowance
+
+    def settle(self, estimated: int, processed: Optional[int]) -> None:
+        """Replace the reservation of a finished, failed or cancelled statement with the bytes it processed."""
+        with self._lock:
+            self.remaining += estimated - (processed or 0)
+
+
+# Byte budget of the statements of all plan goals queried concurrently by `PlanGoalFanOut`, unset outside of them.
+shared_byte_budget: ContextVar[Optional[ByteBudget]] = ContextVar("shared_byte_budget", default=None)
+
+
+@functools.lru_cache(maxsize=None)
+def _ensure_ai_result_cache_table(table_id: str) -> bool:
+    """Create the AI result cache table if it does not exist, once per process.
+
+    Returns:
+        bool: Whether the table can be used; if it cannot be created the cache stays disabled until restart.
+    """
+    table = bigquery.Table(
+        table_id, schema=[bigquery.SchemaField(name, field_type) for name, field_type in CACHE_TABLE_COLUMNS.items()]
+    )
+    table.clustering_fields = ["prompt_hash", "row_hash"]
+    try:
+        get_bigquery_client().create_table(table, exists_ok=True)
+        return True
+    except GoogleAPIError as e:
+        logger.warning(f"AI result cache disabled, failed to create table {table_id}: {e}")
+        return False
+
+
+def _plan_ai_result_cache(result: dict, query: str) -> tuple[str, list[str], int]:
+    """Rewrite a statement to read row-level AI results from the cache table of the dataset.
+
+    See `plan_ai_result_cache`. The rewritten statement and the INSERT statements filling the cache are dry-run; if any of them fails, the
+    statement runs without the cache.
+
+    Returns:
+        tuple: The statement to submit, the INSERT statements to run before it and their estimated bytes.
+    """
+    table_id = cache_table_id(CONFIG.project_id, CONFIG.ai_result_cache_dataset, CONFIG.dataset)
+    if not _ensure_ai_result_cache_table(table_id):
+        return query, [], 0
+    cached_query, fills = plan_ai_result_cache(query, table_id)
+    if not fills:
+        return query, [], 0
+    client = get_bigquery_client()
+    dry_run_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+    try:
+        client.query(cached_query, job_config=dry_run_config)
+        fill_bytes = sum(client.query(fill, job_config=dry_run_config).total_bytes_processed or 0 for fill in fills)
+    except GoogleAPIError as e:
+        logger.warning(f"Running the query without the AI result cache, the cached statement failed the dry run: {e}")
+        return query, [], 0
+    result["ai_result_cache"] = {"table": table_id, "cached_calls": len(fills), "new_results": 0}
+    return cached_query, fills, fill_bytes
+
+
+def _prepare_query(
+    result: dict, max_rows: int, byte_budget: ByteBudget
+) -> tuple[Optional[str], Optional[int], str, list[str]]:
+    """Validate a statement, sample and cap its AI calls, look up its cached result and gate it through a dry run.
+
+    Statements failing `validate_sql` against the cached dataset schema are rejected without a BigQuery round
+    trip. Statements sqlglot cannot parse are left to the dry run, as sqlglot does not cover all of GoogleSQL;
+    if the dry run fails too, the position sqlglot reports is added to the BigQuery error. With
+    `CONFIG.ai_result_cache_dataset` set, row-level AI calls read their results from the AI result cache table;
+    `result["query"]` keeps the statement without the cache lookups.
+
+    Args:
+        result: Result of `run_query`, updated in place with the rewritten statement, estimates and rejections.
+        max_rows: Maximum number of JSON rows, part of the cache key.
+        byte_budget: Budget the estimated bytes are reserved from.
+
+    Returns:
+        tuple: The result cache key, the bytes the jobs may bill, the statement to submit and the INSERT
+            statements filling the AI result cache to run before it. The bytes are None if the statement must not
+            be submitted because it was rejected, failed the dry run or `result` was served from the cache.
+    """
+    query = result["query"]
+    syntax_error = None
+    try:
+        result["validation_errors"] = validate_sql(
+            query, CONFIG.project_id, CONFIG.dataset, get_metadata_cache().table_columns()
+        )
+    except SqlglotError as e:
+        # Includes the TokenError of unterminated strings and quoted identifiers, which is not a ParseError.
+        syntax_error = describe_parse_error(e)
+    if result["validation_errors"]:
+        result["error"] = "\n".join(result["validation_errors"])
+        return None, None, query, []
+
+    if CONFIG.ai_sampling_enabled:
+        sampled_query, result["sampling"] = sample_ai_sources(
+            query,
+            _table_rows,
+            max_ai_rows=CONFIG.max_ai_rows_per_query,
+            margin=CONFIG.ai_sample_margin_pct / 100,
+            confidence=CONFIG.ai_sample_confidence_pct / 100,
+            method=CONFIG.ai_sample_method,
+            strata=CONFIG.ai_sample_strata,
+        )
+        if result["sampling"]:
+            result.update(query=sampled_query, original_query=query)
+            query = sampled_query
+
+    capped_query, result["ai_row_calls_estimated"], error = apply_ai_row_cap(query)
+    if error:
+        result.update(rejected=True, error=error)
+        return None, None, query, []
+    if capped_query != query:
+        result.update(query=capped_query, original_query=result.get("original_query", query))
+        query = capped_query
+
+    cache_key = _result_cache_key(query, namespace=f"run_query:{max_rows}")
+    if cache_key and (cached_result := query_result_cache.get(cache_key)) is not None:
+        logger.info("Serving query result from cache")
+        result.update(cached_result, cached=True, bytes_processed=0, slot_millis=0)
+        return cache_key, None, query, []
+
+    executed_query, fills, fill_bytes = query, [], 0
+    if CONFIG.ai_result_cache_dataset:
+        executed_query, fills, fill_bytes = _plan_ai_result_cache(result, query)
+    try:
+        dry_run_job = get_bigquery_client().query(
+            executed_query, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        )
+    except BadRequest as e:
+        if syntax_error:
+            raise BadRequest(f"{e.message}\n{syntax_error}") from e
+        raise
+    if dry_run_job.statement_type != "SELECT":
+        result["error"] = "Read-only mode only supports SELECT statements."
+        return cache_key, None, query, []
+    result["bytes_estimated"] = (dry_run_job.total_bytes_processed or 0) + fill_bytes
+    estimated = result["bytes_estimated"] or 0
+    allowance = byte_budget.reserve(estimated) if estimated <= CONFIG.max_bytes_per_query else None
+    if allowance is None:
+        result.update(rejected=True, error=(
+            f"The query would process {estimated} bytes, over the budget of "
+            f"{min(byte_budget.remaining, CONFIG.max_bytes_per_query)} bytes. Select fewer columns, filter on "
+            f"partitioned or clustered columns, or sample the table."
+        ))
+        return cache_key, None, query, []
+    return cache_key, min(allowance, CONFIG.max_bytes_per_query), executed_query, fills
+
+
+def _cancel_job(job: bigquery.QueryJob) -> None:
+    try:
+        job.cancel()
+        logger.info(f"Cancelled BigQuery job {job.job_id}")
+    except GoogleAPIError as e:
+        logger.warning(f"Failed to cancel BigQuery job {job.job_id}: {e}")
+
+
+async def _wait_for_job(job: bigquery.QueryJob) -> None:
+    """Poll a submitted job until it is done, backing off exponentially between polls.
+
+    The event loop stays free while the job runs. When the awaiting task is cancelled, e.g. because the session
+    was abandoned or the invocation ended, or the job runs longer than `CONFIG.query_timeout_seconds`, the job is
+    cancelled in BigQuery, so it stops processing bytes and AI calls nobody waits for.
+
+    Raises:
+        asyncio.TimeoutError: The job did not finish within the timeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CONFIG.query_timeout_seconds if CONFIG.query_timeout_seconds else None
+    delay = CONFIG.query_poll_initial_ms / 1000
+    try:
+        while not await asyncio.to_thread(job.done):
+            if deadline is not None and loop.time() + delay > deadline:
+                raise asyncio.TimeoutError(
+                    f"BigQuery job {job.job_id} did not finish within {CONFIG.query_timeout_seconds} seconds."
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CONFIG.query_poll_max_ms / 1000)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        # Not awaited: the cancelled task must not block on the request, the executor thread completes it.
+        loop.run_in_executor(None, _cancel_job, job)
+        raise
+
+
+def _read_job_result(job: bigquery.QueryJob, result: dict, max_rows: int) -> None:
+    """Read the rows of a finished job into `result_store` and the JSON rows of `result`."""
+    row_iterator = job.result()
+    arrow_table = _read_arrow(row_iterator, max(max_rows, CONFIG.max_stored_result_rows))
+    result["schema"] = [{"name": field.name, "type": field.field_type} for field in row_iterator.schema]
+    result["rows"] = [
+        {key: _to_json_value(value) for key, value in row.items()}
+        for row in arrow_table.slice(0, max_rows).to_pylist()
+    ]
+    result["total_rows"] = row_iterator.total_rows
+    result["stored_rows"] = arrow_table.num_rows
+    result["result_hash"] = result_store.put(result["query"], arrow_table)
+
+
+async def _fill_ai_result_cache(statement: str, maximum_bytes_billed: int, result: dict) -> int:
+    """Run an INSERT statement of `plan_ai_result_cache`, counting its new results in `result["ai_result_cache"]`.
+
+    A failed INSERT is logged and skipped; the statement it fills the cache for calls the model for the missing
+    rows itself.
+
+    Returns:
+        int: Bytes the statement processed.
+    """
+    job = None
+    try:
+        job = await asyncio.to_thread(
+            get_bigquery_client().query,
+            statement,
+            job_config=bigquery.QueryJobConfig(maximum_bytes_billed=maximum_bytes_billed or None),
+        )
+        await _wait_for_job(job)
+        await asyncio.to_thread(job.result)
+        result["ai_result_cache"]["new_results"] += job.num_dml_affected_rows or 0
+    except (GoogleAPIError, asyncio.TimeoutError) as e:
+        logger.warning(f"Failed to fill the AI result cache: {e}")
+    if job is not None and job.done(reload=False):
+        return job.total_bytes_processed or 0
+    return 0
+
+
+async def run_query(query: str, max_rows: Optional[int] = None, byte_budget: Optional[ByteBudget] = None) -> dict:
+    """Run a single read-only SQL statement in BigQuery and return a structured result.
+
+    Like the `execute_sql` tool in `WriteMode.BLOCKED`, the statement is dry-run first and anything other than
+    a SELECT statement is rejected. Before that, the statement is validated locally against the cached dataset
+    schema, see `_prepare_query`. The dry run also gates the cost: the estimated bytes are reserved from the byte
+    budget and statements over it, or over `CONFIG.max_bytes_per_query`, are rejected before they run; the
+    allowance is enforced as `maximum_bytes_billed` of the job. Row-level AI calls over a single table run on a
+    sample when `CONFIG.ai_sampling_enabled`, and are capped by `apply_ai_row_cap`. With
+    `CONFIG.ai_result_cache_dataset` set, their results are read from and written back to the AI result cache table
+    of the dataset, so only rows not seen before call the model, see `plan_ai_result_cache`.
+    Successful results are served from and stored in `query_result_cache`.
+
+    The job is submitted without waiting for it and polled by `_wait_for_job`, so long `AI.GENERATE*` queries
+    do not hold the event loop or a thread, several statements can run concurrently, and the job is cancelled
+    when the calling task is. The full result is streamed into an Arrow table kept in `result_store`; only its
+    first `max_rows` rows are converted into JSON rows. Results served from the cache carry the JSON rows only,
+    their Arrow table may have been evicted from `result_store`.
+
+    Args:
+        query: The SQL statement to execute.
+        max_rows: Maximum number of rows returned as JSON rows, defaults to `CONFIG.max_query_result_rows`.
+        byte_budget: Budget shared with the other statements of the session, defaults to a budget of
+            `CONFIG.max_bytes_per_query`.
+
+    Returns:
+        dict: Result with keys `status` ("success" or "error"), `query`, `schema`, `rows`, `total_rows`,
+            `bytes_processed`, `slot_millis`, `bytes_estimated`, `ai_row_calls_estimated`, `rejected`,
+            `validation_errors` (errors of the static validation, the statement did not run), `sampling` (the
+            tables read through a sample, see `sample_ai_sources`), `ai_result_cache` (the cache table and the
+            number of `new_results` computed for the cached AI calls, None if the cache was not used) and `error`.
+            Rewritten statements keep the input in `original_query`, results served from the cache have `cached` set.
+            Successful results also have `job_id`, `result_hash`, the id of the full result in `result_store`, and
+            `stored_rows`, the number of rows kept there (at most `CONFIG.max_stored_result_rows`).
+    """
+    max_rows = max_rows or CONFIG.max_query_result_rows
+    if byte_budget is None:
+        byte_budget = ByteBudget(CONFIG.max_bytes_per_query)
+
+    result = {
+        "status": "error",
+        "query": query,
+        "schema": [],
+        "rows": [],
+        "total_rows": 0,
+        "bytes_processed": None,
+        "slot_millis": None,
+        "bytes_estimated": None,
+        "ai_row_calls_estimated": None,
+        "rejected": False,
+        "validation_errors": [],
+        "sampling": [],
+        "ai_result_cache": None,
+        "error": None,
+    }
+    try:
+        cache_key, maximum_bytes_billed, executed_query, fills = await asyncio.to_thread(
+            _prepare_query, result, max_rows, byte_budget
+        )
+    except GoogleAPIError as e:
+        logger.warning(f"Query dry run failed: {e}")
+        result["error"] = str(e)
+        return result
+    if maximum_bytes_billed is None:
+        return result
+
+    job = None
+    fill_bytes_processed = 0
+    try:
+        for fill in fills:
+            fill_bytes_processed += await _fill_ai_result_cache(fill, maximum_bytes_billed, result)
+        job = await asyncio.to_thread(
+            get_bigquery_client().query,
+            executed_query,
+            job_config=bigquery.QueryJobConfig(maximum_bytes_billed=maximum_bytes_billed or None),
+        )
+        await _wait_for_job(job)
+        await asyncio.to_thread(_read_job_result, job, result, max_rows)
+        result.update(
+            status="success",
+            job_id=job.job_id,
+            bytes_processed=(job.total_bytes_processed or 0) + fill_bytes_processed,
+            slot_millis=job.slot_millis,
+        )
+    except (GoogleAPIError, asyncio.TimeoutError) as e:
+        logger.warning(f"Query execution failed: {e}")
+        result["error"] = str(e)
+        return result
+    finally:
+        if job is not None and job.done(reload=False):
+            result["bytes_processed"] = (job.total_bytes_processed or 0) + fill_bytes_processed
+        elif fill_bytes_processed:
+            result["bytes_processed"] = fill_bytes_processed
+        byte_budget.settle(result["bytes_estimated"] or 0, result["bytes_processed"])
+
+    if cache_key:
+        query_result_cache.put(cache_key, result, bytes_processed=result["bytes_processed"])
+    return result
+
+
+# Invocation state key of the cache key of an `execute_sql` call, from the before to the after tool callback. A
+# temp key is not persisted, so keys of calls that raised or were cancelled end with their invocation.
+_TOOL_CACHE_KEY_PREFIX = "temp:execute_sql_cache_key:"
+
+
+def before_execute_sql_callback(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext
+) -> Optional[dict]:
+    """Serve `execute_sql` tool calls of `bq_executor_toolset` from the query result cache."""
+    if tool.name != "execute_sql":
+        return None
+    cache_key = _result_cache_key(args.get("query", ""), namespace="execute_sql")
+    if cache_key is None:
+        return None
+    cached_response = query_result_cache.get(cache_key)
+    if cached_response is not None:
+        logger.info("Serving execute_sql tool response from cache")
+        return cached_response
+    tool_context.state[_TOOL_CACHE_KEY_PREFIX + tool_context.function_call_id] = cache_key
+    return None
+
+
+def after_execute_sql_callback(
+    tool: BaseTool, args: dict[str, Any], tool_context: ToolContext, tool_response: Any
+) -> Optional[dict]:
+    """Store successful `execute_sql` tool responses in the query result cache."""
+    state_key = _TOOL_CACHE_KEY_PREFIX + tool_context.function_call_id
+    cache_key = tool_context.state.get(state_key)
+    if cache_key:
+        tool_context.state[state_key] = None
+    if cache_key and isinstance(tool_response, dict) and tool_response.get("status") == "SUCCESS":
+        query_result_cache.put(cache_key, tool_response)
+    return None
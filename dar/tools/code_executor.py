@@ -0,0 +1,262 @@
+import atexit
+import json
+import logging
+import os
+import select
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Callable, Optional
+
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.code_executors import BaseCodeExecutor
+from google.adk.code_executors.code_execution_utils import CodeExecutionInput, CodeExecutionResult, File
+from pydantic import Field, PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).with_name("code_worker.py")
+# Time a new interpreter has to import the analysis libraries before it is discarded.
+STARTUP_TIMEOUT_SECONDS = 60
+# Largest file a step may write, and the output of a step returned to the model.
+MAX_FILE_MB = 64
+MAX_OUTPUT_CHARS = 20_000
+# Environment passed on to the interpreters; credentials and other settings of the agent are not.
+_INHERITED_ENV = ("PATH", "HOME", "LANG", "LC_ALL", "TZ")
+
+
+class _Worker:
+    """A warm interpreter process, see `dar/tools/code_worker.py`."""
+
+    def __init__(self, memory_mb: int):
+        self.workdir = tempfile.mkdtemp(prefix="dar-code-")
+        env = {name: os.environ[name] for name in _INHERITED_ENV if name in os.environ}
+        env.update(
+            TMPDIR=self.workdir,
+            MPLBACKEND="Agg",
+            OMP_NUM_THREADS="1",
+            OPENBLAS_NUM_THREADS="1",
+            MKL_NUM_THREADS="1",
+        )
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-I", str(WORKER_SCRIPT),
+                "--workdir", self.workdir,
+                "--memory-mb", str(memory_mb),
+                "--file-mb", str(MAX_FILE_MB),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            cwd=self.workdir,
+            bufsize=0,
+            start_new_session=True,
+        )
+        # Requests are written with a deadline like results are read, a worker not reading its input cannot block.
+        os.set_blocking(self.process.stdin.fileno(), False)
+        self.ready = False
+        self.staged_files: set[str] = set()
+
+    def _write_message(self, message: dict, deadline: float) -> None:
+        fd = self.process.stdin.fileno()
+        data = memoryview(json.dumps(message).encode("utf-8") + b"\n")
+        while data:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            _, writable, _ = select.select([], [fd], [], remaining)
+            if writable:
+                try:
+                    data = data[os.write(fd, data):]
+                except BlockingIOError:
+                    pass
+
+    def _read_message(self, deadline: float) -> dict:
+        fd = self.process.stdout.fileno()
+        chunks = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            readable, _, _ = select.select([fd], [], [], remaining)
+            if not readable:
+                continue
+            chunk = os.read(fd, 1 << 16)
+            if not chunk:
+                raise EOFError(f"the interpreter exited with code {self.process.wait()}")
+            chunks.append(chunk)
+            if chunk.endswith(b"\n"):
+                return json.loads(b"".join(chunks))
+
+    def wait_ready(self) -> None:
+        """Block until the interpreter imported its libraries, raises if it failed to start."""
+        if self.ready:
+            return
+        message = self._read_message(time.monotonic() + STARTUP_TIMEOUT_SECONDS)
+        if not message.get("ready"):
+            raise RuntimeError(f"The code interpreter failed to start:\n{message.get('error', '')}")
+        self.ready = True
+
+    def stage(self, files: dict[str, bytes]) -> None:
+        """Write files into the working directory, each once per interpreter."""
+        for name, data in files.items():
+            name = os.path.basename(name)
+            if name not in self.staged_files:
+                with open(os.path.join(self.workdir, name), "wb") as f:
+                    f.write(data)
+                self.staged_files.add(name)
+
+    def run(self, code: str, input_files: list[File], timeout: float) -> dict:
+        deadline = time.monotonic() + timeout
+        request = {"code": code, "files": [{"name": f.name, "content": f.content} for f in input_files]}
+        self._write_message(request, deadline)
+        return self._read_message(deadline)
+
+    def close(self) -> None:
+        if self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            stream.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class WarmPoolCodeExecutor(BaseCodeExecutor):
+    """Runs code in local interpreter processes started ahead of use with the analysis libraries imported.
+
+    `pool_size` idle interpreters are kept warm, each has `io`, `math`, `re`, `numpy`, `pandas`, `scipy` and
+    `matplotlib.pyplot` imported as in the prompt of the code execution agent, so a step only pays for running
+    its code. A stateful executor binds one interpreter per execution id (the session), whose variables persist
+    between steps; at most `max_sessions` are kept, the least recently used one is closed first. Without state,
+    every step runs in a fresh interpreter that is discarded afterwards.
+
+    Interpreters run as separate processes with a minimal environment in a temporary working directory, their
+    address space limited to `memory_limit_mb`. A step running longer than `timeout_seconds` or crashing its
+    interpreter kills the process; the error is returned as the step's stderr and the session starts over in a
+    fresh interpreter. Open matplotlib figures and the images and CSV files a step writes are returned as
+    output files. Files returned by `stage_files` for the invocation are written into the working directory
+    before a step, without passing through the interpreter's input. This isolates the agent process from the
+    generated code, it is not a security boundary.
+    """
+
+    stateful: bool = True
+    pool_size: int = Field(default=2, ge=1)
+    timeout_seconds: float = Field(default=30, gt=0)
+    memory_limit_mb: int = Field(default=2048, ge=0)
+    max_sessions: int = Field(default=8, ge=1)
+    # Name and bytes-like content of the files an invocation's code reads, e.g. stored query results.
+    stage_files: Optional[Callable[[InvocationContext], dict[str, bytes]]] = None
+
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _pool: deque = PrivateAttr(default_factory=deque)
+    _sessions: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+
+    def model_post_init(self, __context) -> None:
+        atexit.register(self.close)
+
+    def warm(self) -> None:
+        """Start interpreters until `pool_size` are idle. Returns without waiting for them to be ready."""
+        with self._lock:
+            while len(self._pool) < self.pool_size:
+                self._pool.append(_Worker(self.memory_limit_mb))
+
+    def _take_worker(self) -> _Worker:
+        while True:
+            with self._lock:
+                worker = self._pool.popleft() if self._pool else None
+            self.warm()
+            if worker is None:
+                continue
+            try:
+                worker.wait_ready()
+                return worker
+            except (TimeoutError, EOFError, ValueError) as e:
+                worker.close()
+                raise RuntimeError(f"The code interpreter failed to start: {e}") from e
+            except RuntimeError:
+                worker.close()
+                raise
+
+    def _session_worker(self, execution_id: Optional[str]) -> _Worker:
+        if execution_id is None or not self.stateful:
+            return self._take_worker()
+        with self._lock:
+            worker = self._sessions.get(execution_id)
+            if worker is not None:
+                self._sessions.move_to_end(execution_id)
+                return worker
+        worker = self._take_worker()
+        with self._lock:
+            self._sessions[execution_id] = worker
+            evicted = []
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        for old_worker in evicted:
+            old_worker.close()
+        return worker
+
+    def _end_session(self, execution_id: Optional[str], worker: _Worker) -> None:
+        with self._lock:
+            if execution_id is not None and self._sessions.get(execution_id) is worker:
+                del self._sessions[execution_id]
+        worker.close()
+
+    def execute_code(
+        self,
+        invocation_context: InvocationContext,
+        code_execution_input: CodeExecutionInput,
+    ) -> CodeExecutionResult:
+        execution_id = code_execution_input.execution_id if self.stateful else None
+        started = time.perf_counter()
+        try:
+            worker = self._session_worker(execution_id)
+        except RuntimeError as e:
+            return CodeExecutionResult(stderr=str(e))
+
+        try:
+            if self.stage_files is not None:
+                worker.stage(self.stage_files(invocation_context))
+            result = worker.run(code_execution_input.code, code_execution_input.input_files, self.timeout_seconds)
+        except TimeoutError:
+            self._end_session(execution_id, worker)
+            return CodeExecutionResult(
+                stderr=f"Execution timed out after {self.timeout_seconds:g} seconds. The interpreter was restarted,"
+                       " variables defined in earlier steps are lost."
+            )
+        except (EOFError, OSError, ValueError) as e:
+            self._end_session(execution_id, worker)
+            return CodeExecutionResult(
+                stderr=f"The interpreter crashed ({e}), e.g. by exceeding the memory limit of "
+                       f"{self.memory_limit_mb} MB. It was restarted, variables defined in earlier steps are lost."
+            )
+        if execution_id is None:
+            worker.close()
+
+        logger.debug(f"Code execution step of {execution_id} took {(time.perf_counter() - started) * 1000:.0f} ms")
+        stdout = result["stdout"]
+        if len(stdout) > MAX_OUTPUT_CHARS:
+            stdout = stdout[:MAX_OUTPUT_CHARS] + f"\n... [{len(stdout) - MAX_OUTPUT_CHARS} more characters truncated]"
+        return CodeExecutionResult(
+            stdout=stdout,
+            stderr=result["stderr"][-MAX_OUTPUT_CHARS:],
+            output_files=[File(**output_file) for output_file in result["files"]],
+        )
+
+    def close(self) -> None:
+        """Stop all interpreters, idle and bound to sessions."""
+        with self._lock:
+            workers = [*self._pool, *self._sessions.values()]
+            self._pool.clear()
+            self._sessions.clear()
+        for worker in workers:
+            worker.close()
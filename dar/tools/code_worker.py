@@ -0,0 +1,143 @@
+"""Interpreter process of `WarmPoolCodeExecutor`, run as a script and never imported.
+
+Imports the libraries of the code execution agent's prompt, applies the resource limits and then executes the code
+of every request in one persistent namespace. Requests and results are single JSON lines on stdin and on a
+duplicate of the original stdout; file descriptor 1 itself goes to /dev/null, so output written by native code
+cannot corrupt the protocol. Python-level output of the executed code is captured and returned with the result.
+"""
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import traceback
+
+_PRELUDE = '''
+import io
+import math
+import re
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import scipy
+import scipy.stats
+
+
+def crop(s: str, max_chars: int = 64) -> str:
+    """Crops a string to max_chars characters."""
+    return s[: max_chars - 3] + "..." if len(s) > max_chars else s
+
+
+def explore_df(df: pd.DataFrame) -> None:
+    """Prints some information about a pandas DataFrame."""
+    with pd.option_context("display.max_columns", None, "display.expand_frame_repr", False):
+        df_info = pd.concat(
+            (
+                df.dtypes.rename("Dtype"),
+                (len(df) - df.isnull().sum()).apply(lambda x: f"{x} / {df.shape[0]} non-null").rename("Non-Null Count"),
+                df.apply(lambda x: len(x.unique())).rename("Unique Values Count"),
+                df.apply(lambda x: crop(str(list(x.unique())))).rename("Unique Values"),
+            ),
+            axis=1,
+        )
+        df_info.index.name = "Columns"
+        print(f"Total rows: {df.shape[0]}\\nTotal columns: {df.shape[1]}\\n\\n{df_info}")
+'''
+# Renders a figure once at startup, so fonts and the Agg backend are loaded before the first plot of a step.
+_WARM_UP = '''
+figure = plt.figure()
+plt.plot([0, 1], [0, 1])
+plt.title("warm-up")
+figure.savefig(io.BytesIO(), format="png")
+plt.close("all")
+pd.DataFrame({"x": [1.0, 2.0]}).describe()
+'''
+_OUTPUT_FILE_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".csv": "text/csv"}
+
+
+def _limit_resources(memory_mb: int, file_mb: int) -> None:
+    try:
+        import resource
+    except ImportError:
+        return
+    for limit, value in (
+        (resource.RLIMIT_AS, memory_mb * 1024 * 1024),
+        (resource.RLIMIT_FSIZE, file_mb * 1024 * 1024),
+        (resource.RLIMIT_CORE, 0),
+    ):
+        if value > 0:
+            resource.setrlimit(limit, (value, value))
+
+
+def _snapshot() -> dict[str, float]:
+    return {entry.name: entry.stat().st_mtime for entry in os.scandir(".") if entry.is_file()}
+
+
+def _execute(namespace: dict, request: dict, step: int) -> dict:
+    for input_file in request.get("files") or []:
+        with open(os.path.basename(input_file["name"]), "wb") as f:
+            f.write(base64.b64decode(input_file["content"]))
+    before = _snapshot()
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            exec(compile(request["code"], f"<step {step}>", "exec"), namespace)
+        except BaseException as e:  # noqa: B036 - SystemExit and KeyboardInterrupt end the step, not the worker.
+            # Starts the traceback at the executed code, the frame of this function is not part of the step.
+            traceback.print_exception(type(e), e, e.__traceback__.tb_next, file=stderr)
+
+    output_files = []
+    plt = sys.modules.get("matplotlib.pyplot")
+    if plt is not None:
+        for number in plt.get_fignums():
+            buffer = io.BytesIO()
+            plt.figure(number).savefig(buffer, format="png", bbox_inches="tight")
+            output_files.append({
+                "name": f"figure_{step}_{number}.png",
+                "content": base64.b64encode(buffer.getvalue()).decode(),
+                "mime_type": "image/png",
+            })
+        plt.close("all")
+    for name, modified in _snapshot().items():
+        mime_type = _OUTPUT_FILE_TYPES.get(os.path.splitext(name)[1].lower())
+        if mime_type and before.get(name) != modified:
+            with open(name, "rb") as f:
+                content = base64.b64encode(f.read()).decode()
+            output_files.append({"name": name, "content": content, "mime_type": mime_type})
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "files": output_files}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workdir", required=True)
+    parser.add_argument("--memory-mb", type=int, default=0)
+    parser.add_argument("--file-mb", type=int, default=0)
+    args = parser.parse_args()
+
+    protocol = os.fdopen(os.dup(1), "w", buffering=1)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.chdir(args.workdir)
+    _limit_resources(args.memory_mb, args.file_mb)
+
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    try:
+        exec(_PRELUDE, namespace)
+        exec(_WARM_UP, dict(namespace))
+        protocol.write(json.dumps({"ready": True}) + "\n")
+    except Exception:
+        protocol.write(json.dumps({"ready": False, "error": traceback.format_exc()}) + "\n")
+        return
+
+    for step, line in enumerate(sys.stdin, start=1):
+        protocol.write(json.dumps(_execute(namespace, json.loads(line), step)) + "\n")
+
+
+if __name__ == "__main__":
+    main()
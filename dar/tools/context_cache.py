@@ -0,0 +1,235 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from typing import Optional
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import BaseLlm, Gemini, LlmRequest, LlmResponse
+from google.adk.tools.agent_tool import AgentTool
+from google.adk.utils.instructions_utils import inject_session_state
+from google.genai import errors as genai_errors
+from google.genai import types as genai_types
+
+from dar.config import CONFIG
+from dar.tools.state_compaction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# State keys set once per session, they may be part of a cached instruction prefix.
+STABLE_STATE_KEYS = {"PROJECT", "BQ_LOCATION", "BQ_DATASET", "BQ_MODEL", "BQ_CONNECTION_ID", "BQ_SCHEMA_DIGEST"}
+# Cached contents are extended when less than this remains of their TTL, so no request uses an expiring cache.
+REFRESH_MARGIN_SECONDS = 120
+# A prefix whose cache could not be created is sent uncached for this long before the next attempt.
+RETRY_AFTER_SECONDS = 600
+
+# Same placeholder syntax as the ADK instruction templates.
+_PLACEHOLDER_RE = re.compile(r"{+[^{}]*}+")
+
+
+def static_template(instruction: str) -> str:
+    """The part of an instruction template before its first placeholder of a state key changing within a session."""
+    for match in _PLACEHOLDER_RE.finditer(instruction):
+        key = match.group().lstrip("{").rstrip("}").strip().removesuffix("?")
+        if key not in STABLE_STATE_KEYS:
+            return instruction[:match.start()]
+    return instruction
+
+
+class ContextCacheRegistry:
+    """Cached contents of static system instructions, created once per model and prefix and reused by every call.
+
+    A cached content holds the system instruction and tools of a request. Requests referencing it send only their
+    contents and generation config, the provider bills the cached tokens at the reduced cached rate. Caches are
+    created with a TTL of `ttl_seconds` and extended while they are used; unused caches expire at the provider.
+    Prefixes below `min_tokens` are not cached, the providers reject them.
+    """
+
+    def __init__(self, ttl_seconds: int, min_tokens: int):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self._lock = threading.Lock()
+        # Cache name and expiry time per model and prefix key.
+        self._caches: dict[str, tuple[str, float]] = {}
+        self._retry_at: dict[str, float] = {}
+        # Rendered static instruction prefix per agent name, registered by `register_static_prefix`.
+        self._prefixes: dict[str, str] = {}
+        self._stats = {"hits": 0, "creations": 0, "refreshes": 0, "failures": 0}
+
+    def register_static_prefix(self, agent_name: str, prefix: str) -> None:
+        with self._lock:
+            self._prefixes[agent_name] = prefix
+
+    def _split(self, system_instruction: str) -> Optional[tuple[str, str]]:
+        """Split a system instruction after the registered static prefix it contains into static and dynamic part."""
+        with self._lock:
+            prefixes = list(self._prefixes.values())
+        for prefix in prefixes:
+            position = system_instruction.find(prefix)
+            if prefix and position >= 0:
+                end = position + len(prefix)
+                return system_instruction[:end].rstrip(), system_instruction[end:].strip()
+        return None
+
+    @staticmethod
+    def _key(model: str, config: genai_types.GenerateContentConfig) -> str:
+        payload = json.dumps(
+            {
+                "model": model,
+                "system_instruction": config.system_instruction,
+                "tools": [tool.model_dump(exclude_none=True) for tool in config.tools or []],
+                "tool_config": config.tool_config.model_dump(exclude_none=True) if config.tool_config else None,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def _cache_name(self, llm: Gemini, model: str, config: genai_types.GenerateContentConfig) -> Optional[str]:
+        key = self._key(model, config)
+        now = time.time()
+        with self._lock:
+            cached = self._caches.get(key)
+            if cached and cached[1] - now > REFRESH_MARGIN_SECONDS:
+                self._stats["hits"] += 1
+                return cached[0]
+            if self._retry_at.get(key, 0) > now:
+                return None
+
+        ttl = f"{self.ttl_seconds}s"
+        if cached and cached[1] > now:
+            try:
+                await llm.api_client.aio.caches.update(
+                    name=cached[0], config=genai_types.UpdateCachedContentConfig(ttl=ttl)
+                )
+                with self._lock:
+                    self._caches[key] = (cached[0], now + self.ttl_seconds)
+                    self._stats["refreshes"] += 1
+                return cached[0]
+            except genai_errors.APIError as e:
+                logger.info(f"Failed to extend cached content {cached[0]}, creating a new one: {e}")
+
+        try:
+            cache = await llm.api_client.aio.caches.create(
+                model=model,
+                config=genai_types.CreateCachedContentConfig(
+                    system_instruction=config.system_instruction,
+                    tools=config.tools,
+                    tool_config=config.tool_config,
+                    ttl=ttl,
+                    display_name=f"dar-{key[:16]}",
+                ),
+            )
+        except (genai_errors.APIError, ValueError) as e:
+            logger.warning(f"Failed to create cached content for {model}, sending the instruction uncached: {e}")
+            with self._lock:
+                self._retry_at[key] = now + RETRY_AFTER_SECONDS
+                self._stats["failures"] += 1
+            return None
+        with self._lock:
+            self._caches[key] = (cache.name, now + self.ttl_seconds)
+            self._stats["creations"] += 1
+        return cache.name
+
+    async def attach(self, llm_request: LlmRequest, llm: BaseLlm) -> bool:
+        """Reference the cached content of the request's static instruction prefix in a request to a Gemini model.
+
+        The static part of the system instruction and the tools move into the cached content, the dynamic rest of
+        the system instruction becomes the first user turn. Requests without a registered prefix, to other
+        models, or whose cache is not available are left unchanged.
+
+        Args:
+            llm_request: The request as it is sent to the model.
+            llm: The model the request is sent to.
+
+        Returns:
+            bool: Whether the request references a cached content.
+        """
+        config = llm_request.config
+        if not isinstance(llm, Gemini) or config is None or config.cached_content:
+            return False
+        if not isinstance(config.system_instruction, str):
+            return False
+        split = self._split(config.system_instruction)
+        if split is None:
+            return False
+        static, dynamic = split
+        tools_text = json.dumps([tool.model_dump(exclude_none=True) for tool in config.tools or []], default=str)
+        if estimate_tokens(static) + estimate_tokens(tools_text) < self.min_tokens:
+            return False
+
+        cache_config = config.model_copy(update={"system_instruction": static})
+        cache_name = await self._cache_name(llm, llm_request.model or llm.model, cache_config)
+        if cache_name is None:
+            return False
+        config.cached_content = cache_name
+        config.system_instruction = None
+        config.tools = None
+        config.tool_config = None
+        if dynamic:
+            llm_request.contents.insert(0, genai_types.Content(role="user", parts=[genai_types.Part(text=dynamic)]))
+        return True
+
+    def stats(self) -> dict:
+        """Return counters of reused, created, extended and failed cached contents."""
+        with self._lock:
+            return dict(self._stats)
+
+
+context_cache = (
+    ContextCacheRegistry(ttl_seconds=CONFIG.context_cache_ttl_seconds, min_tokens=CONFIG.context_cache_min_tokens)
+    if CONFIG.context_cache_enabled
+    else None
+)
+
+
+async def attach_context_cache(llm_request: LlmRequest, llm: BaseLlm) -> bool:
+    """Reference the cached static instruction prefix in a request, see `ContextCacheRegistry.attach`."""
+    if context_cache is None:
+        return False
+    return await context_cache.attach(llm_request, llm)
+
+
+async def use_context_cache(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """Send the static instruction prefix of an agent as cached content instead of with every request.
+
+    Used as `before_model_callback` of agents listed in `CONFIG.context_cache_agents`. The static prefix is the
+    instruction template up to its first placeholder of a state key changing within a session, rendered with the
+    session-wide keys in `STABLE_STATE_KEYS` such as the schema digest; the instructions of cached agents keep
+    their per-call inputs at the end. Requests to a `CascadeLlm` reference the cache of the model answering them.
+    Models other than Gemini, e.g. in offline tests, and failures to create a cache leave requests unchanged.
+    """
+    if context_cache is None or callback_context.agent_name not in CONFIG.context_cache_agents:
+        return None
+    agent = callback_context._invocation_context.agent
+    if not isinstance(agent.instruction, str):
+        return None
+    template = static_template(agent.instruction)
+    if not template.strip():
+        return None
+    context_cache.register_static_prefix(agent.name, await inject_session_state(template, callback_context))
+    await context_cache.attach(llm_request, agent.canonical_model)
+    return None
+
+
+def install_context_cache(agent: BaseAgent) -> None:
+    """Wire `use_context_cache` into an agent, its sub-agents and agents wrapped in an `AgentTool`.
+
+    The callback is appended to the before-model callbacks, so the prompt is final when it is split. Install
+    after the LLM response cache, whose keys must not depend on the name of a cached content. Which agents use
+    cached contents is decided per request by `CONFIG.context_cache_agents`.
+
+    Args:
+        agent: Root of the agent tree.
+    """
+    if isinstance(agent, LlmAgent):
+        if use_context_cache not in agent.canonical_before_model_callbacks:
+            agent.before_model_callback = [*agent.canonical_before_model_callbacks, use_context_cache]
+        for tool in agent.tools:
+            if isinstance(tool, AgentTool):
+                install_context_cache(tool.agent)
+    for sub_agent in agent.sub_agents:
+        install_context_cache(sub_agent)
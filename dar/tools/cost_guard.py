@@ -0,0 +1,143 @@
+from typing import Callable, Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from dar.tools.sql_utils import SQL_DIALECT, find_ai_calls
+
+TableRows = Callable[[exp.Table], Optional[int]]
+
+
+def _literal_limit(select: exp.Select) -> Optional[int]:
+    limit = select.args.get("limit")
+    if limit is None:
+        return None
+    value = limit.expression
+    if isinstance(value, exp.Literal) and not value.is_string:
+        return int(value.this)
+    return None
+
+
+def _limit_bounds_calls(select: exp.Select) -> bool:
+    """Whether the LIMIT of a SELECT also bounds the rows its AI calls run on.
+
+    The select list of a plain projection is evaluated for the returned rows only. Grouping, DISTINCT, aggregates,
+    window functions and ORDER BY need every input row first, and AI calls in WHERE or JOIN conditions decide
+    which rows are returned, so their calls run on all rows before the LIMIT applies.
+    """
+    if select.args.get("group") or select.args.get("distinct") or select.args.get("order"):
+        return False
+    if any(projection.find(exp.AggFunc, exp.Window) for projection in select.expressions):
+        return False
+    for call in find_ai_calls(select):
+        if call.find_ancestor(exp.Select) is not select:
+            continue
+        node = call
+        while node.parent is not select:
+            node = node.parent
+        if node.arg_key != "expressions":
+            return False
+    return True
+
+
+def _estimate_rows(
+    query: exp.Expression, ctes: dict[str, exp.Expression], table_rows: TableRows, apply_limit: bool = True
+) -> Optional[int]:
+    """Estimate an upper bound of the rows a query produces, None if it cannot be bounded.
+
+    Without `apply_limit`, the rows the query reads are estimated instead, e.g. those its AI calls run on.
+    """
+    if isinstance(query, exp.Subquery):
+        return _estimate_rows(query.this, ctes, table_rows, apply_limit)
+    if not isinstance(query, exp.Select):
+        return None
+
+    limit = _literal_limit(query) if apply_limit else None
+    source_rows = None
+    from_ = query.args.get("from")
+    if from_ is not None and not query.args.get("joins"):
+        source = from_.this
+        if isinstance(source, exp.Table) and not source.db and source.name in ctes:
+            source_rows = _estimate_rows(ctes[source.name], ctes, table_rows)
+        elif isinstance(source, exp.Table):
+            source_rows = table_rows(source)
+        elif isinstance(source, exp.Subquery):
+            source_rows = _estimate_rows(source, ctes, table_rows)
+
+    if limit is not None and source_rows is not None:
+        return min(limit, source_rows)
+    return limit if limit is not None else source_rows
+
+
+def ai_selects(expression: exp.Expression) -> dict[int, tuple[exp.Select, int]]:
+    """Group AI function calls by the SELECT evaluating them, keyed by the id of the SELECT node."""
+    selects = {}
+    for call in find_ai_calls(expression):
+        select = call.find_ancestor(exp.Select)
+        if select is None:
+            continue
+        _, count = selects.get(id(select), (select, 0))
+        selects[id(select)] = (select, count + 1)
+    return selects
+
+
+def estimate_ai_row_calls(sql: str, table_rows: TableRows) -> Optional[int]:
+    """Estimate how many row-level `AI.GENERATE*` calls a statement makes.
+
+    Every SELECT containing AI functions is bounded by its own LIMIT or by the rows of its source table or CTE.
+    The LIMIT is ignored when the calls run before it, see `_limit_bounds_calls`.
+
+    Args:
+        sql: SQL statement.
+        table_rows: Returns the row count of a base table, or None if unknown.
+
+    Returns:
+        Optional[int]: Estimated number of AI calls, 0 without AI functions, None if it cannot be bounded.
+
+    Raises:
+        SqlglotError: If the statement cannot be parsed.
+    """
+    expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+
+    ctes = {cte.alias_or_name: cte.this for cte in expression.find_all(exp.CTE)}
+    total = 0
+    for select, call_count in ai_selects(expression).values():
+        rows = _estimate_rows(select, ctes, table_rows, apply_limit=_limit_bounds_calls(select))
+        if rows is None:
+            return None
+        total += rows * call_count
+    return total
+
+
+def cap_ai_rows(sql: str, max_rows: int) -> Optional[str]:
+    """Rewrite a statement so that it makes at most `max_rows` row-level AI calls by lowering LIMITs.
+
+    Only plain projections can be capped with a LIMIT; a SELECT that aggregates, sorts or filters on AI results
+    evaluates the AI function on every input row regardless of its LIMIT, so such statements are not rewritten.
+
+    Args:
+        sql: SQL statement.
+        max_rows: Maximum number of row-level AI calls of the whole statement, split evenly between the calls.
+
+    Returns:
+        Optional[str]: The rewritten statement, or None if it cannot be capped.
+    """
+    try:
+        expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    except SqlglotError:
+        return None
+
+    selects = ai_selects(expression).values()
+    call_count = sum(count for _, count in selects)
+    if not call_count:
+        return sql
+    rows_per_select = max(1, max_rows // call_count)
+
+    for select, _ in selects:
+        if not _limit_bounds_calls(select):
+            return None
+        limit = _literal_limit(select)
+        if limit is None or limit > rows_per_select:
+            select.limit(rows_per_select, copy=False)
+    return expression.sql(dialect=SQL_DIALECT)
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.tools.agent_tool import AgentTool
+from pydantic import BaseModel, ValidationError
+
+from dar.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+)
+"""
+
+
+def _json_default(value: Any) -> Any:
+    # Output schemas are passed as pydantic classes, their JSON schema is what the model sees.
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        return value.model_json_schema()
+    if isinstance(value, bytes):
+        return hashlib.sha256(value).hexdigest()
+    return str(value)
+
+
+class LlmResponseCache:
+    """Size-bounded SQLite cache of final model responses keyed on the complete model request.
+
+    Entries are keyed on the model name, the rendered contents (system instruction included) and the generation
+    config with its tools and response schema, so any change to the prompt, the state injected into it or the
+    model settings produces a different key. Entries expire after `ttl_seconds`, and the least recently used
+    entries are evicted once the stored responses grow over `max_bytes`.
+    """
+
+    def __init__(self, path: str | Path, ttl_seconds: int, max_bytes: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(llm_request: LlmRequest) -> str:
+        """Build the cache key of a model request.
+
+        Args:
+            llm_request: The request as it is sent to the model, after all before-model callbacks.
+
+        Returns:
+            str: Hex digest identifying the response.
+        """
+        payload = json.dumps(
+            {
+                "model": llm_request.model,
+                "contents": [content.model_dump(exclude_none=True) for content in llm_request.contents],
+                "config": llm_request.config.model_dump(exclude_none=True) if llm_request.config else None,
+            },
+            sort_keys=True,
+            default=_json_default,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(_SCHEMA)
+        return self._connection
+
+    def get(self, key: str) -> Optional[LlmResponse]:
+        """Return the cached response for the key, or None on a miss or an expired entry."""
+        with self._lock:
+            try:
+                connection = self._connect()
+                row = connection.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None or time.time() - row[1] > self.ttl_seconds:
+                    if row is not None:
+                        connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._stats["misses"] += 1
+                    return None
+                response = LlmResponse.model_validate_json(row[0])
+                # Touch the entry so that eviction removes the least recently used responses first.
+                connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+            except (sqlite3.Error, OSError, ValidationError) as e:
+                logger.warning(f"Failed to read model response from cache: {e}")
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            return response
+
+    def put(self, key: str, model: str, llm_response: LlmResponse) -> None:
+        """Store a response and evict the least recently used entries over the size limit."""
+        response = llm_response.model_dump_json(exclude_none=True)
+        now = time.time()
+        with self._lock:
+            try:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, response, len(response), now, now),
+                )
+                self._stats["stores"] += 1
+                self._evict(connection)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Failed to store model response in cache: {e}")
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        total_size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+        for key, size in connection.execute("SELECT key, size FROM responses ORDER BY used_at").fetchall():
+            if total_size <= self.max_bytes:
+                break
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total_size -= size
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the hit rate."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+llm_response_cache = (
+    LlmResponseCache(
+        path=CONFIG.llm_cache_path,
+        ttl_seconds=CONFIG.llm_cache_ttl_seconds,
+        max_bytes=CONFIG.llm_cache_max_bytes,
+    )
+    if CONFIG.llm_cache_enabled
+    else None
+)
+
+# Invocation state key prefix of the cache key and model of a request waiting for its response. A temp key is not
+# persisted, so the key of a request that raised or was cancelled ends with its invocation.
+_PENDING_KEY_PREFIX = "temp:llm_cache_pending:"
+
+
+def _pending_key(callback_context: CallbackContext) -> str:
+    branch = callback_context._invocation_context.branch or ""
+    return f"{_PENDING_KEY_PREFIX}{branch}:{callback_context.agent_name}"
+
+
+def serve_cached_response(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """Answer a model request of a cached agent from the LLM response cache, skipping the model on a hit.
+
+    Only agents listed in `CONFIG.llm_cache_agents` are served. On a miss the key of the request is kept for
+    `store_model_response`, which caches the response once the model answered.
+    """
+    if llm_response_cache is None or callback_context.agent_name not in CONFIG.llm_cache_agents:
+        return None
+    key = LlmResponseCache.make_key(llm_request)
+    cached = llm_response_cache.get(key)
+    if cached is not None:
+        logger.info(f"[{callback_context.agent_name}] Replaying the cached response of {llm_request.model}")
+        cached.custom_metadata = {**(cached.custom_metadata or {}), "llm_cache": "hit"}
+        return cached
+    callback_context.state[_pending_key(callback_context)] = [key, llm_request.model]
+    return None
+
+
+def store_model_response(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    """Cache the complete response of a request missed by `serve_cached_response`.
+
+    Partial, failed and empty responses are not cached, the next identical request asks the model again.
+    """
+    if llm_response_cache is None or llm_response.partial:
+        return None
+    pending_key = _pending_key(callback_context)
+    pending = callback_context.state.get(pending_key)
+    if pending is not None:
+        callback_context.state[pending_key] = None
+    if pending is None or llm_response.error_code or not llm_response.content or not llm_response.content.parts:
+        return None
+    llm_response_cache.put(*pending, llm_response)
+    return None
+
+
+def install_llm_response_cache(agent: BaseAgent) -> None:
+    """Wire the LLM response cache callbacks into an agent, its sub-agents and agents wrapped in an `AgentTool`.
+
+    The lookup is appended to the before-model callbacks, so it keys the request after every other callback
+    changed it, and the store is prepended to the after-model callbacks, so it caches the response as the model
+    returned it. Install before the telemetry callbacks, so replayed responses are not counted as model calls.
+    Which agents are cached is decided per request by `CONFIG.llm_cache_agents`.
+
+    Args:
+        agent: Root of the agent tree.
+    """
+    if isinstance(agent, LlmAgent):
+        if serve_cached_response not in agent.canonical_before_model_callbacks:
+            agent.before_model_callback = [*agent.canonical_before_model_callbacks, serve_cached_response]
+            agent.after_model_callback = [store_model_response, *agent.canonical_after_model_callbacks]
+        for tool in agent.tools:
+            if isinstance(tool, AgentTool):
+                install_llm_response_cache(tool.agent)
+    for sub_agent in agent.sub_agents:
+        install_llm_response_cache(sub_agent)
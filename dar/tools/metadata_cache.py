@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+from google.api_core.exceptions import GoogleAPIError
+from google.cloud import bigquery
+
+logger = logging.getLogger(__name__)
+
+
+def _render_fields(fields: list[dict], prefix: str = "") -> list[str]:
+    """Flatten a table schema in API representation into `name TYPE` items, nested fields dot-separated."""
+    items = []
+    for field in fields:
+        name = f"{prefix}{field['name']}"
+        field_type = field.get("type", "")
+        if field.get("mode") == "REPEATED":
+            field_type = f"ARRAY<{field_type}>"
+        description = field.get("description")
+        items.append(f"{name} {field_type}" + (f" -- {description}" if description else ""))
+        if field.get("fields"):
+            items.extend(_render_fields(field["fields"], prefix=f"{name}."))
+    return items
+
+
+class DatasetMetadataCache:
+    """Process-wide cache of the table metadata of a single BigQuery dataset.
+
+    The first access loads the table list and every table's metadata. Afterwards entries are served from memory;
+    once `refresh_seconds` have passed, a background thread revalidates the cache with a single `__TABLES__` query
+    and reloads only tables whose last-modified time changed, as well as added or removed tables. Readers keep
+    getting the previous snapshot until the revalidation finished, so they never wait for BigQuery after the first
+    load.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        dataset_id: str,
+        client_factory: Callable[[], bigquery.Client],
+        refresh_seconds: int,
+    ):
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.refresh_seconds = refresh_seconds
+        self._client_factory = client_factory
+        # Guards the snapshot below; BigQuery calls never run while it is held.
+        self._lock = threading.Lock()
+        # Serializes the first load, callers arriving meanwhile wait for it instead of loading again.
+        self._load_lock = threading.Lock()
+        self._refreshing = False
+        self._tables: dict[str, dict] = {}
+        self._versions: dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._digest: Optional[str] = None
+        self._columns: Optional[dict[str, set[str]]] = None
+
+    @property
+    def dataset_ref(self) -> str:
+        return f"{self.project_id}.{self.dataset_id}"
+
+    def _load_table(self, client: bigquery.Client, table_id: str) -> tuple[dict, int]:
+        table = client.get_table(f"{self.dataset_ref}.{table_id}").to_api_repr()
+        # The raw milliseconds, as in `last_modified_time` of `__TABLES__`; a float round trip can be off by one.
+        return table, int(table.get("lastModifiedTime") or 0)
+
+    def _current_versions(self, client: bigquery.Client) -> dict[str, int]:
+        query = f"SELECT table_id, last_modified_time FROM `{self.dataset_ref}.__TABLES__`"
+        return {row["table_id"]: row["last_modified_time"] for row in client.query_and_wait(query)}
+
+    def _replace_snapshot(self, tables: dict[str, dict], versions: dict[str, int]) -> None:
+        with self._lock:
+            self._tables = tables
+            self._versions = versions
+            self._loaded_at = time.monotonic()
+            self._digest = None
+            self._columns = None
+
+    def _load(self) -> None:
+        client = self._client_factory()
+        tables, versions = {}, {}
+        table_ids = [table.table_id for table in client.list_tables(self.dataset_ref)]
+        for table_id in table_ids:
+            tables[table_id], versions[table_id] = self._load_table(client, table_id)
+        self._replace_snapshot(tables, versions)
+        logger.info(f"Loaded metadata of {len(table_ids)} tables from {self.dataset_ref}")
+
+    def _revalidate(self) -> None:
+        try:
+            client = self._client_factory()
+            current = self._current_versions(client)
+            with self._lock:
+                tables = {table_id: self._tables[table_id] for table_id in current if table_id in self._tables}
+                versions = {table_id: self._versions[table_id] for table_id in tables}
+            changed = [table_id for table_id, version in current.items() if versions.get(table_id) != version]
+            for table_id in changed:
+                tables[table_id], versions[table_id] = self._load_table(client, table_id)
+            self._replace_snapshot(tables, versions)
+            if changed:
+                logger.info(f"Reloaded metadata of {len(changed)} changed tables from {self.dataset_ref}")
+        except GoogleAPIError as e:
+            # Keep serving the previous snapshot rather than failing the agents.
+            logger.warning(f"Failed to revalidate metadata of {self.dataset_ref}: {e}")
+            with self._lock:
+                self._loaded_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_fresh(self) -> None:
+        with self._lock:
+            if self._loaded_at is not None:
+                if not self._refreshing and time.monotonic() - self._loaded_at >= self.refresh_seconds:
+                    self._refreshing = True
+                    threading.Thread(target=self._revalidate, name="metadata-cache-refresh", daemon=True).start()
+                return
+        with self._load_lock:
+            if self._loaded_at is None:
+                self._load()
+
+    def warm(self) -> None:
+        """Load the dataset metadata ahead of the first request."""
+        try:
+            self._ensure_fresh()
+        except GoogleAPIError as e:
+            logger.warning(f"Failed to warm metadata cache of {self.dataset_ref}: {e}")
+
+    def list_table_ids(self) -> list[str]:
+        """Return the ids of the tables in the dataset."""
+        self._ensure_fresh()
+        with self._lock:
+            return sorted(self._tables)
+
+    def get_table_info(self, table_id: str) -> Optional[dict]:
+        """Return the table metadata in BigQuery API representation, or None if the table does not exist."""
+        self._ensure_fresh()
+        with self._lock:
+            return self._tables.get(table_id)
+
+    def table_last_modified(self, table_id: str) -> Optional[int]:
+        """Return the last-modified epoch milliseconds of a table, or None if the table does not exist."""
+        self._ensure_fresh()
+        with self._lock:
+            return self._versions.get(table_id)
+
+    def table_columns(self) -> dict[str, set[str]]:
+        """Return the lower-case top-level column names of every table, keyed by table id."""
+        self._ensure_fresh()
+        with self._lock:
+            if self._columns is None:
+                self._columns = {
+                    table_id: {field["name"].lower() for field in table.get("schema", {}).get("fields", [])}
+                    for table_id, table in self._tables.items()
+                }
+            return self._columns
+
+    def dataset_version(self) -> str:
+        """Return a fingerprint of the dataset that changes whenever a table is added, removed or modified."""
+        self._ensure_fresh()
+        with self._lock:
+            versions = ",".join(f"{table_id}:{self._versions.get(table_id)}" for table_id in sorted(self._tables))
+        return hashlib.sha256(versions.encode()).hexdigest()[:16]
+
+    def schema_digest(self) -> str:
+        """Render a compact text description of every table and column of the dataset.
+
+        Returns:
+            str: One block per table with its row count, description and `column TYPE` list.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            if self._digest is None:
+                blocks = []
+                for table_id in sorted(self._tables):
+                    table = self._tables[table_id]
+                    header = f"`{self.dataset_ref}.{table_id}` ({table.get('numRows', '?')} rows)"
+                    if table.get("description"):
+                        header += f": {table['description']}"
+                    columns = _render_fields(table.get("schema", {}).get("fields", []))
+                    blocks.append(header + "\n" + "\n".join(f"  - {column}" for column in columns))
+                self._digest = "\n".join(blocks)
+            return self._digest
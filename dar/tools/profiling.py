@@ -0,0 +1,147 @@
+import math
+from typing import Any, Optional
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_TYPES = {"INTEGER", "INT64", "FLOAT", "FLOAT64", "NUMERIC", "BIGNUMERIC"}
+TEMPORAL_TYPES = {"DATE", "DATETIME", "TIMESTAMP"}
+
+QUANTILES = (0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0)
+HISTOGRAM_BINS = 10
+TOP_VALUES = 5
+MAX_CORRELATIONS = 10
+# Pairs of numeric columns with a weaker Pearson correlation are left out of the profile.
+MIN_CORRELATION = 0.3
+
+
+def _number(value: Any) -> Optional[float]:
+    """Round a NumPy or Python number for state and prompts, NaN and infinities become None."""
+    value = float(value)
+    if not math.isfinite(value):
+        return None
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else round(value, 4)
+
+
+def _numeric_profile(values: pd.Series, distinct: int) -> dict:
+    array = values.to_numpy(dtype=np.float64)
+    profile = {
+        "mean": _number(array.mean()),
+        "std": _number(array.std(ddof=1)) if len(array) > 1 else None,
+        "quantiles": dict(zip((str(q) for q in QUANTILES), (_number(q) for q in np.quantile(array, QUANTILES)))),
+    }
+    if distinct <= HISTOGRAM_BINS:
+        # Few distinct values, e.g. ratings or flags, are counted exactly instead of binned.
+        uniques, counts = np.unique(array, return_counts=True)
+        profile["frequencies"] = [[_number(value), int(count)] for value, count in zip(uniques, counts)]
+    else:
+        counts, edges = np.histogram(array, bins=HISTOGRAM_BINS)
+        profile["histogram"] = {"edges": [_number(edge) for edge in edges], "counts": counts.tolist()}
+    return profile
+
+
+def _top_values(values: pd.Series) -> list[list]:
+    counts = values.value_counts(sort=True).head(TOP_VALUES)
+    return [[str(value)[:80], int(count)] for value, count in counts.items()]
+
+
+def profile_dataframe(frame: pd.DataFrame, schema: list[dict]) -> dict:
+    """Profile a query result column by column with vectorized pandas/NumPy operations.
+
+    Every column gets its non-null count, null count and distinct count. Numeric columns add mean, standard
+    deviation, quantiles and a histogram (exact frequencies for at most `HISTOGRAM_BINS` distinct values); temporal
+    columns their range; other columns their most frequent values unless all values are distinct.
+    Pearson correlations between numeric columns are listed strongest first.
+
+    Args:
+        frame: The full query result.
+        schema: Result columns with `name` and BigQuery `type`.
+
+    Returns:
+        dict: JSON serializable profile with `rows`, `columns` (per column name) and `correlations`.
+    """
+    columns = {}
+    numeric_columns = {}
+    for column in schema:
+        name, column_type = column["name"], column["type"]
+        if name not in frame:
+            continue
+        values = frame[name]
+        present = values.dropna()
+        column_profile = {"type": column_type, "count": int(len(present)), "nulls": int(len(values) - len(present))}
+        if present.empty:
+            columns[name] = column_profile
+            continue
+
+        if column_type in NUMERIC_TYPES:
+            numbers = pd.to_numeric(present, errors="coerce").dropna().astype(np.float64)
+            column_profile["distinct"] = int(numbers.nunique())
+            if not numbers.empty:
+                column_profile.update(_numeric_profile(numbers, column_profile["distinct"]))
+                numeric_columns[name] = pd.to_numeric(values, errors="coerce").astype(np.float64)
+        elif column_type in TEMPORAL_TYPES:
+            timestamps = pd.to_datetime(present, errors="coerce", utc=column_type == "TIMESTAMP").dropna()
+            column_profile["distinct"] = int(timestamps.nunique())
+            if not timestamps.empty:
+                column_profile.update(min=timestamps.min().isoformat(), max=timestamps.max().isoformat())
+        else:
+            if present.dtype == object:
+                # Repeated and record values are unhashable, they are compared by their text.
+                present = present.astype(str)
+            column_profile["distinct"] = int(present.nunique())
+            if column_profile["distinct"] < len(present):
+                column_profile["top"] = _top_values(present)
+        columns[name] = column_profile
+
+    correlations = []
+    if len(numeric_columns) > 1:
+        matrix = pd.DataFrame(numeric_columns).corr()
+        names = list(matrix.columns)
+        for i, left in enumerate(names):
+            for right in names[i + 1:]:
+                coefficient = _number(matrix.at[left, right])
+                if coefficient is not None and abs(coefficient) >= MIN_CORRELATION:
+                    correlations.append([left, right, coefficient])
+        correlations.sort(key=lambda pair: -abs(pair[2]))
+    return {"rows": int(len(frame)), "columns": columns, "correlations": correlations[:MAX_CORRELATIONS]}
+
+
+def render_profile(profile: dict) -> list[str]:
+    """Describe a profile in one line per column plus one line of correlations.
+
+    Args:
+        profile: Profile returned by `profile_dataframe`.
+
+    Returns:
+        list[str]: Lines of the form `name TYPE: ...`.
+    """
+    lines = []
+    for name, column in profile["columns"].items():
+        description = f"{name} {column['type']}: {column['count']} values, {column.get('distinct', 0)} distinct"
+        if column["nulls"]:
+            description += f", {column['nulls']} nulls"
+        if "quantiles" in column:
+            quantiles = column["quantiles"]
+            description += (
+                f"; mean {column['mean']}, std {column['std']}, min {quantiles['0.0']}, p25 {quantiles['0.25']}, "
+                f"median {quantiles['0.5']}, p75 {quantiles['0.75']}, max {quantiles['1.0']}"
+            )
+            if "frequencies" in column:
+                description += "; frequencies: " + ", ".join(
+                    f"{value} ({count})" for value, count in column["frequencies"]
+                )
+            else:
+                edges, counts = column["histogram"]["edges"], column["histogram"]["counts"]
+                description += (
+                    f"; histogram of {len(counts)} bins {edges[0]}..{edges[-1]}: {' '.join(str(c) for c in counts)}"
+                )
+        elif "min" in column:
+            description += f"; {column['min']} to {column['max']}"
+        elif column.get("top"):
+            description += "; top: " + ", ".join(f"{value[:40]} ({count})" for value, count in column["top"])
+        lines.append(description)
+    if profile["correlations"]:
+        lines.append("correlations: " + ", ".join(
+            f"{left} ~ {right} {coefficient}" for left, right, coefficient in profile["correlations"]
+        ))
+    return lines
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from dar.tools.sql_utils import SQL_DIALECT
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_sql(sql: str) -> str:
+    """Normalize a SQL statement so that formatting-only differences map to the same text.
+
+    Whitespace, comments and keyword casing are canonicalized by regenerating the statement with sqlglot.
+    Identifiers keep their case because BigQuery dataset and table names are case-sensitive.
+
+    Args:
+        sql: SQL statement to normalize.
+
+    Returns:
+        str: Normalized SQL, or the whitespace-collapsed input if it cannot be parsed.
+    """
+    try:
+        return sqlglot.parse_one(sql, read=SQL_DIALECT).sql(dialect=SQL_DIALECT, comments=False)
+    except SqlglotError:
+        return " ".join(sql.split())
+
+
+def referenced_tables(sql: str, default_project: str, default_dataset: str) -> Optional[list[str]]:
+    """List the fully qualified tables a statement reads from, excluding CTE names.
+
+    Args:
+        sql: SQL statement to inspect.
+        default_project: Project used for tables referenced without one.
+        default_dataset: Dataset used for tables referenced without one.
+
+    Returns:
+        Optional[list[str]]: Sorted `project.dataset.table` references, None if the statement cannot be parsed.
+    """
+    try:
+        expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    except SqlglotError:
+        return None
+
+    cte_names = {cte.alias_or_name for cte in expression.find_all(exp.CTE)}
+    tables = set()
+    for table in expression.find_all(exp.Table):
+        if not table.name or (not table.db and table.name in cte_names):
+            continue
+        tables.add(".".join([table.catalog or default_project, table.db or default_dataset, table.name]))
+    return sorted(tables)
+
+
+class QueryResultCache:
+    """Content-addressed, size-bounded on-disk cache of query results.
+
+    Entries are keyed on the normalized SQL, the dataset and the last-modified time of every referenced table,
+    so any change to the underlying data produces a different key. Entries expire after `ttl_seconds`, and the
+    least recently used entries are evicted once the cache grows over `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str | Path, ttl_seconds: int, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bytes_saved": 0}
+
+    @staticmethod
+    def make_key(sql: str, dataset: str, table_versions: dict[str, int], namespace: str = "") -> str:
+        """Build the cache key of a statement.
+
+        Args:
+            sql: SQL statement.
+            dataset: Fully qualified dataset the statement runs against.
+            table_versions: Last-modified timestamp of every table the statement reads.
+            namespace: Distinguishes result formats of different callers sharing the cache.
+
+        Returns:
+            str: Hex digest identifying the result.
+        """
+        payload = json.dumps(
+            {
+                "namespace": namespace,
+                "sql": normalize_sql(sql),
+                "dataset": dataset,
+                "tables": table_versions,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached result for the key, or None on a miss or an expired entry.
+
+        Malformed entries, e.g. truncated files or entries of an older format, count as a miss and are deleted.
+        """
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r") as f:
+                    entry = json.load(f)
+                result = entry["result"]
+                expired = time.time() - entry["created_at"] > self.ttl_seconds
+            except OSError:
+                self._stats["misses"] += 1
+                return None
+            except (ValueError, TypeError, KeyError):
+                logger.warning(f"Deleting malformed query cache entry {path.name}")
+                path.unlink(missing_ok=True)
+                self._stats["misses"] += 1
+                return None
+
+            if expired:
+                path.unlink(missing_ok=True)
+                self._stats["misses"] += 1
+                return None
+
+            # Touch the entry so that eviction removes the least recently used results first.
+            os.utime(path)
+            self._stats["hits"] += 1
+            self._stats["bytes_saved"] += entry.get("bytes_processed") or 0
+            return result
+
+    def put(self, key: str, result: dict, bytes_processed: Optional[int] = None) -> None:
+        """Store a result and evict the least recently used entries over the size limit."""
+        entry = {"created_at": time.time(), "bytes_processed": bytes_processed, "result": result}
+        with self._lock:
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_path = self._path(key).with_suffix(".tmp")
+                with open(tmp_path, "w") as f:
+                    json.dump(entry, f)
+                os.replace(tmp_path, self._path(key))
+                self._stats["stores"] += 1
+                self._evict()
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning(f"Failed to store query result in cache: {e}")
+
+    def _evict(self) -> None:
+        files = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+            self._stats["evictions"] += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of bytes BigQuery did not have to process thanks to hits."""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+ARROW_MIME_TYPE = "application/vnd.apache.arrow.file"
+
+
+class ArrowResultStore:
+    """Process-wide in-memory store of full query results in Arrow IPC file format.
+
+    Results are kept as a single IPC buffer each, so reading them back as Arrow tables is zero-copy and the same
+    buffer is saved as the session artifact. Results are evicted least recently used once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._buffers: OrderedDict[str, pa.Buffer] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def serialize(table: pa.Table) -> pa.Buffer:
+        """Serialize an Arrow table into an IPC file buffer."""
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+
+    def put(self, query: str, table: pa.Table) -> str:
+        """Store the result of a query.
+
+        Args:
+            query: The executed SQL statement, part of the result id.
+            table: The full result.
+
+        Returns:
+            str: Short content hash of the query and its result, used as result id and to cite the result.
+        """
+        buffer = self.serialize(table)
+        digest = hashlib.sha256(query.encode())
+        digest.update(memoryview(buffer))
+        result_id = digest.hexdigest()[:12]
+
+        with self._lock:
+            if result_id in self._buffers:
+                self._buffers.move_to_end(result_id)
+                return result_id
+            self._buffers[result_id] = buffer
+            self._size += buffer.size
+            while self._size > self.max_bytes and len(self._buffers) > 1:
+                evicted_id, evicted = self._buffers.popitem(last=False)
+                self._size -= evicted.size
+                logger.info(f"Evicted query result {evicted_id} from the result store")
+        return result_id
+
+    def get_buffer(self, result_id: str) -> Optional[pa.Buffer]:
+        """Return the Arrow IPC file buffer of a result, or None if it is not (or no longer) stored."""
+        with self._lock:
+            buffer = self._buffers.get(result_id)
+            if buffer is not None:
+                self._buffers.move_to_end(result_id)
+            return buffer
+
+    def get_table(self, result_id: str) -> Optional[pa.Table]:
+        """Return a result as an Arrow table backed by the stored buffer, or None if it is not stored."""
+        buffer = self.get_buffer(result_id)
+        if buffer is None:
+            return None
+        return pa.ipc.open_file(buffer).read_all()
+
+    def get_dataframe(self, result_id: str) -> Optional[pd.DataFrame]:
+        """Return a result as a pandas DataFrame, or None if it is not stored.
+
+        Columns without nulls of numeric types are converted without copying where Arrow allows it.
+        """
+        table = self.get_table(result_id)
+        if table is None:
+            return None
+        return table.to_pandas(split_blocks=True)
@@ -0,0 +1,220 @@
+import math
+import statistics
+from typing import Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from dar.tools.cost_guard import TableRows, ai_selects
+from dar.tools.sql_utils import SQL_DIALECT
+
+SAMPLE_METHODS = ("hash", "system", "stratified")
+# Resolution of hash sampling, sampling fractions are rounded to millionths.
+HASH_BUCKETS = 1_000_000
+# Hash samples vary binomially around their expected size, the target stays below the AI row budget by this share.
+SIZE_HEADROOM = 0.9
+
+_ROW_HASH = "FARM_FINGERPRINT(TO_JSON_STRING(_sample))"
+
+
+def z_score(confidence: float) -> float:
+    """Two-sided standard normal quantile of a confidence level, e.g. 1.96 for 0.95."""
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def sample_size(population: int, margin: float, confidence: float) -> int:
+    """Rows needed to estimate any proportion of a population within +-`margin` at the confidence level.
+
+    Uses the worst case proportion of 0.5 and the finite population correction.
+    """
+    n0 = z_score(confidence) ** 2 * 0.25 / margin ** 2
+    return math.ceil(n0 / (1 + (n0 - 1) / population))
+
+
+def margin_of_error(sample: int, population: int, confidence: float, proportion: float = 0.5) -> float:
+    """Half width of the confidence interval of a proportion estimated from a simple random sample."""
+    if sample <= 0:
+        return 1.0
+    correction = (population - sample) / (population - 1) if population > 1 else 0.0
+    return z_score(confidence) * math.sqrt(proportion * (1 - proportion) / sample * max(0.0, correction))
+
+
+def _sampling_subquery(
+    table: exp.Table, fraction: float, max_rows: int, method: str, stratum: Optional[str]
+) -> exp.Subquery:
+    """Build a subquery selecting a sample of a table, aliased like the table it replaces."""
+    source = table.copy()
+    source.set("alias", None)
+    source_sql = source.sql(dialect=SQL_DIALECT)
+    if method == "system":
+        sql = f"SELECT * FROM {source_sql} TABLESAMPLE SYSTEM ({round(fraction * 100, 4)} PERCENT)"
+    elif method == "stratified" and stratum:
+        # Proportional allocation: every stratum keeps its share, rounded up so small strata are represented.
+        sql = (
+            f"SELECT * EXCEPT (_sample_rank, _stratum_rows) FROM ("
+            f"SELECT _sample.*, ROW_NUMBER() OVER (PARTITION BY _sample.{stratum} ORDER BY {_ROW_HASH}) "
+            f"AS _sample_rank, COUNT(*) OVER (PARTITION BY _sample.{stratum}) AS _stratum_rows "
+            f"FROM {source_sql} AS _sample) WHERE _sample_rank <= CEIL(_stratum_rows * {round(fraction, 8)})"
+        )
+    else:
+        threshold = max(1, round(fraction * HASH_BUCKETS))
+        sql = f"SELECT * FROM {source_sql} AS _sample WHERE MOD(ABS({_ROW_HASH}), {HASH_BUCKETS}) < {threshold}"
+    sample = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    sample.limit(max_rows, copy=False)
+    return exp.Subquery(this=sample, alias=exp.TableAlias(this=exp.to_identifier(table.alias_or_name)))
+
+
+def sample_ai_sources(
+    sql: str,
+    table_rows: TableRows,
+    max_ai_rows: int,
+    margin: float,
+    confidence: float,
+    method: str = "hash",
+    strata: Optional[dict[str, str]] = None,
+) -> tuple[str, list[dict]]:
+    """Rewrite the SELECTs evaluating row-level AI functions to read a statistically sound sample of their table.
+
+    A SELECT reading a single base table without ORDER BY gets its table replaced with a sample sized by
+    `sample_size` to estimate proportions within +-`margin` at the confidence level, capped by the AI row
+    budget of the statement. Its LIMIT, an arbitrary slice of the table, is dropped; the sample itself is
+    bounded by a LIMIT for the cost gate. Tables smaller than the sample are read completely.
+
+    Methods:
+        hash: Deterministic sample of the rows whose FARM_FINGERPRINT falls below the sampling fraction.
+        system: `TABLESAMPLE SYSTEM`, random storage blocks, cheapest but clustered.
+        stratified: Hash sample per value of the table's column in `strata`, proportionally allocated. Tables
+            without a stratum column are hash sampled.
+
+    Args:
+        sql: SQL statement.
+        table_rows: Returns the row count of a base table, or None if unknown.
+        max_ai_rows: Maximum number of row-level AI calls of the whole statement.
+        margin: Target margin of error of proportions, e.g. 0.05.
+        confidence: Confidence level of the margin, e.g. 0.95.
+        method: One of `SAMPLE_METHODS`.
+        strata: Table id to the column samples of the table are stratified by.
+
+    Returns:
+        tuple: The rewritten statement and one description per sampled table with `table`, `population`,
+            `sample_rows`, `fraction`, `method`, `stratum`, `confidence` and `margin_of_error`. The statement is
+            returned unchanged with no descriptions when nothing is sampled.
+    """
+    try:
+        expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    except SqlglotError:
+        return sql, []
+    selects = ai_selects(expression).values()
+    call_count = sum(count for _, count in selects)
+    if not call_count:
+        return sql, []
+    rows_per_select = max(1, max_ai_rows // call_count)
+    cte_names = {cte.alias_or_name for cte in expression.find_all(exp.CTE)}
+
+    samples = []
+    for select, _ in selects:
+        from_ = select.args.get("from")
+        source = from_.this if from_ is not None else None
+        if select.args.get("order") or select.args.get("joins") or not isinstance(source, exp.Table):
+            continue
+        if not source.db and source.name in cte_names:
+            continue
+        population = table_rows(source)
+        if not population:
+            continue
+        size = min(sample_size(population, margin, confidence), max(1, int(rows_per_select * SIZE_HEADROOM)))
+        if size >= population:
+            continue
+
+        stratum = (strata or {}).get(source.name) if method == "stratified" else None
+        sample_method = "hash" if method == "stratified" and not stratum else method
+        fraction = size / population
+        source.replace(_sampling_subquery(source, fraction, rows_per_select, sample_method, stratum))
+        select.set("limit", None)
+        samples.append({
+            "table": source.name,
+            "population": population,
+            "sample_rows": size,
+            "fraction": round(fraction, 6),
+            "method": "stratified" if stratum else sample_method,
+            "stratum": stratum,
+            "confidence": confidence,
+            "margin_of_error": round(margin_of_error(size, population, confidence), 4),
+        })
+    if not samples:
+        return sql, []
+    return expression.sql(dialect=SQL_DIALECT), samples
+
+
+def _count_columns(sql: str) -> list[str]:
+    """Output names of the COUNT aggregates of the final SELECT of a statement."""
+    try:
+        expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    except SqlglotError:
+        return []
+    if not isinstance(expression, exp.Select):
+        return []
+    return [
+        projection.alias for projection in expression.expressions
+        if isinstance(projection, exp.Alias) and isinstance(projection.this, exp.Count)
+    ]
+
+
+def estimate_population(sql: str, rows: list[dict], sample: dict) -> list[dict]:
+    """Extrapolate the COUNT columns of a result computed over a single sampled table to the whole table.
+
+    The result rows must partition the sample, like the groups of a GROUP BY over the AI results. Every count
+    becomes a proportion of the sampled rows, estimated with its confidence interval and finite population
+    correction, and is scaled to the population the sample represents (the sampled rows over the fraction).
+
+    Args:
+        sql: The executed statement.
+        rows: All result rows.
+        sample: The description of the sampled table returned by `sample_ai_sources`.
+
+    Returns:
+        list[dict]: One estimate per row and COUNT column with `group`, `column`, `sample_count`, `estimate`,
+            `low` and `high`, empty if the result has fewer than two rows or no COUNT columns.
+    """
+    if len(rows) < 2:
+        return []
+    z = z_score(sample["confidence"])
+    estimates = []
+    for column in _count_columns(sql):
+        counts = [row.get(column) for row in rows]
+        if not all(isinstance(count, int) for count in counts) or sum(counts) <= 0:
+            continue
+        sampled = sum(counts)
+        population = sampled / sample["fraction"]
+        correction = max(0.0, 1 - sample["fraction"])
+        for row, count in zip(rows, counts):
+            proportion = count / sampled
+            half_width = z * math.sqrt(proportion * (1 - proportion) / sampled * correction)
+            estimates.append({
+                "group": ", ".join(f"{key}={value}" for key, value in row.items() if key != column),
+                "column": column,
+                "sample_count": count,
+                "estimate": round(proportion * population),
+                "low": round(max(0.0, proportion - half_width) * population),
+                "high": round(min(1.0, proportion + half_width) * population),
+            })
+    return estimates
+
+
+def render_sampling(samples: list[dict], estimates: list[dict]) -> list[str]:
+    """Describe the sampled tables and population estimates of a result in one line each."""
+    lines = []
+    for sample in samples:
+        method = f"{sample['method']} sample" + (f" stratified by {sample['stratum']}" if sample["stratum"] else "")
+        lines.append(
+            f"`{sample['table']}`: {method} of {sample['sample_rows']} of {sample['population']} rows "
+            f"({sample['fraction']:.2%}), proportions within +-{sample['margin_of_error']:.1%} at "
+            f"{sample['confidence']:.0%} confidence"
+        )
+    for estimate in estimates:
+        lines.append(
+            f"{estimate['group']}: {estimate['column']} {estimate['sample_count']} in the sample, "
+            f"~{estimate['estimate']} in the table ({estimate['low']}..{estimate['high']})"
+        )
+    return lines
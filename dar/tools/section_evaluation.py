@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import re
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types as genai_types
+
+logger = logging.getLogger(__name__)
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)[\s#]*$")
+
+# Per-section grades of the research evaluator, with the hashes of the findings and evidence they were given for.
+SECTION_GRADES_KEY = "research_evaluation_sections"
+# The sections the evaluator model grades in the current pass, injected into its instruction.
+EVALUATION_INPUT_KEY = "research_evaluation_input"
+# The report version the revision agent corrects, injected into its instruction.
+REVISION_INPUT_KEY = "report_revision_input"
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def split_sections(report: str) -> list[tuple[str, str]]:
+    """Split a markdown report into (heading, text) sections at its headings, ignoring headings in code blocks.
+
+    Text before the first heading is a section with an empty heading. Sections with nothing but their heading
+    make no claims and are left out.
+    """
+    sections = []
+    heading, lines, in_code_block = "", [], False
+
+    def flush():
+        body = [line for line in lines if line.strip()]
+        if body and (not heading or len(body) > 1):
+            sections.append((heading, "\n".join(lines).strip()))
+
+    for line in report.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code_block = not in_code_block
+        match = None if in_code_block else _HEADING_RE.match(line)
+        if match:
+            flush()
+            heading, lines = match.group(1).strip(), []
+        lines.append(line)
+    flush()
+    return sections
+
+
+def _sections(state, report_key: str) -> list[tuple[str, str, str]]:
+    """The (heading, text, hash) sections of the report in a state key."""
+    return [(heading, text, _hash(text)) for heading, text in split_sections(state.get(report_key) or "")]
+
+
+def _evaluation_record(state) -> dict:
+    """The grades recorded for the current findings and evidence and the state key of the report to evaluate.
+
+    The evidence is the query results with the statistical analyses computed from them. The first pass over new
+    findings or new evidence evaluates `section_research_findings` with no grades; later passes evaluate
+    `final_revised_report`, the revision of the same findings.
+    """
+    findings_hash = _hash(state.get("section_research_findings") or "")
+    evidence_hash = _hash(
+        str(state.get("query_execution_output") or "") + str(state.get("statistical_analysis_output") or "")
+    )
+    record = state.get(SECTION_GRADES_KEY) or {}
+    if record.get("findings_hash") == findings_hash and record.get("evidence_hash") == evidence_hash:
+        report_key = "final_revised_report" if state.get("final_revised_report") else "section_research_findings"
+        return {**record, "report_key": report_key}
+    return {
+        "findings_hash": findings_hash,
+        "evidence_hash": evidence_hash,
+        "report_key": "section_research_findings",
+        "grades": {},
+    }
+
+
+def _merged_evaluation(sections: list[tuple[str, str, str]], grades: dict, comment: str) -> dict:
+    """A `Feedback` of the whole report from the grades of its sections."""
+    failed = [
+        heading or "Introduction" for heading, _, section_hash in sections if grades[section_hash]["grade"] != "pass"
+    ]
+    # Identical sections share a hash, their corrections are listed once.
+    section_hashes = dict.fromkeys(section_hash for _, _, section_hash in sections)
+    corrections = [
+        correction for section_hash in section_hashes for correction in grades[section_hash]["corrections"]
+    ]
+    if failed:
+        comment += f" Sections failing the evaluation: {', '.join(failed)}."
+    return {"grade": "fail" if failed else "pass", "comment": comment.strip(), "corrections_needed": corrections or None}
+
+
+def select_sections_for_evaluation(callback_context: CallbackContext) -> Optional[genai_types.Content]:
+    """Hand only the sections changed since the last pass to the research evaluator.
+
+    Used as `before_agent_callback` of the research evaluator. Every section of the report is hashed; sections
+    graded in an earlier pass of the refinement loop and unchanged since then keep their grade and corrections,
+    the other sections are written to 'research_evaluation_input' for the evaluator. When no section changed,
+    the merged grades are written to 'research_evaluation' and the evaluator model is skipped.
+    """
+    state = callback_context.state
+    record = _evaluation_record(state)
+    sections = _sections(state, record["report_key"])
+    grades = record["grades"]
+    pending = [section for section in sections if section[2] not in grades]
+    state[SECTION_GRADES_KEY] = {**record, "pending": [section_hash for _, _, section_hash in pending]}
+    if not pending:
+        state["research_evaluation"] = _merged_evaluation(
+            sections, grades, "No section changed since the last evaluation."
+        )
+        logger.info(f"[{callback_context.agent_name}] No changed sections, reusing the earlier grades")
+        return genai_types.Content(role="model", parts=[genai_types.Part(
+            text=f"Reused the grades of {len(sections)} unchanged sections."
+        )])
+
+    carried = [heading or "Introduction" for heading, _, section_hash in sections if section_hash in grades]
+    evaluation_input = "\n\n".join(text for _, text, _ in pending)
+    if carried:
+        evaluation_input += "\n\n(Unchanged sections already evaluated, not shown: " + ", ".join(carried) + ".)"
+    state[EVALUATION_INPUT_KEY] = evaluation_input
+    logger.info(
+        f"[{callback_context.agent_name}] Evaluating {len(pending)} of {len(sections)} sections, "
+        f"{len(carried)} unchanged"
+    )
+    return None
+
+
+def _correction_section(correction: dict, pending: list[tuple[str, str, str]]) -> Optional[str]:
+    """Hash of the section a correction refers to, by its quoted content or its section identifier."""
+    content = (correction.get("problematic_content") or "").strip()
+    identifier = (correction.get("section_identifier") or "").strip().lower()
+    for _, text, section_hash in pending:
+        if content and content in text:
+            return section_hash
+    for heading, _, section_hash in pending:
+        if heading and identifier and (heading.lower() in identifier or identifier in heading.lower()):
+            return section_hash
+    return None
+
+
+def merge_section_evaluation(callback_context: CallbackContext) -> Optional[genai_types.Content]:
+    """Grade the evaluated sections and merge them with the carried grades into 'research_evaluation'.
+
+    Used as `after_agent_callback` of the research evaluator. Corrections are assigned to the sections they
+    quote or name; evaluated sections without corrections pass. A failing evaluation with corrections that match
+    no section fails all evaluated sections.
+    """
+    state = callback_context.state
+    evaluation = state.get("research_evaluation")
+    record = state.get(SECTION_GRADES_KEY) or {}
+    sections = _sections(state, record.get("report_key") or "section_research_findings")
+    pending_hashes = set(record.get("pending") or [])
+    pending = [section for section in sections if section[2] in pending_hashes]
+    if not isinstance(evaluation, dict) or not pending:
+        return None
+
+    corrections = (evaluation.get("corrections_needed") or []) if evaluation.get("grade") == "fail" else []
+    grades = dict(record["grades"])
+    for _, _, section_hash in pending:
+        grades[section_hash] = {"grade": "pass", "corrections": []}
+    unassigned = []
+    for correction in corrections:
+        section_hash = _correction_section(correction, pending)
+        if section_hash is None:
+            unassigned.append(correction)
+            continue
+        grades[section_hash]["grade"] = "fail"
+        grades[section_hash]["corrections"].append(correction)
+    if evaluation.get("grade") == "fail" and (unassigned or not corrections):
+        for _, _, section_hash in pending:
+            grades[section_hash]["grade"] = "fail"
+        grades[pending[0][2]]["corrections"].extend(unassigned)
+
+    current = {section_hash for _, _, section_hash in sections}
+    state[SECTION_GRADES_KEY] = {
+        **record, "pending": [], "grades": {key: grade for key, grade in grades.items() if key in current}
+    }
+    state["research_evaluation"] = _merged_evaluation(sections, grades, evaluation.get("comment") or "")
+    return None
+
+
+def select_report_for_revision(callback_context: CallbackContext) -> Optional[genai_types.Content]:
+    """Hand the report version graded in the current pass of the refinement loop to the revision agent.
+
+    Used as `before_agent_callback` of the report revision. The first pass revises `section_research_findings`,
+    later passes revise `final_revised_report`, the version the evaluator graded, so fixes of earlier passes are
+    kept and sections that passed are copied unchanged with their grades.
+    """
+    state = callback_context.state
+    report_key = (state.get(SECTION_GRADES_KEY) or {}).get("report_key") or "section_research_findings"
+    state[REVISION_INPUT_KEY] = state.get(report_key) or state.get("section_research_findings") or ""
+    return None
@@ -0,0 +1,199 @@
+import logging
+import re
+from typing import Callable, Optional
+
+import sqlglot
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types as genai_types
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+
+from dar.config import CONFIG
+from dar.tools import bigquery_tools
+from dar.tools.sql_utils import SQL_DIALECT, find_ai_calls
+
+logger = logging.getLogger(__name__)
+
+_UNQUALIFIED_TABLE_RE = re.compile(
+    r"neither a CTE nor qualified|must be qualified with a dataset|missing dataset while no default dataset",
+    re.IGNORECASE,
+)
+# BigQuery errors naming a missing or invalid connection or endpoint of an AI function, not transient network
+# errors such as "connection reset".
+_AI_CONNECTION_ERROR_RE = re.compile(
+    r"not found:\s*connection\b|\bconnection(_id)?\b[^\n]*?\b(not found|does not exist|is invalid|is required|"
+    r"is missing|must be)|\b(invalid|missing|unknown)\s+connection(_id)?\b",
+    re.IGNORECASE,
+)
+_AI_ENDPOINT_ERROR_RE = re.compile(
+    r"\bendpoint\b[^\n]*?\b(not found|does not exist|is invalid|is not supported|is not available|unsupported)"
+    r"|\b(invalid|unsupported|unknown)\s+endpoint\b",
+    re.IGNORECASE,
+)
+_UNSUPPORTED_AI_RE = re.compile(
+    r"AI\.GENERATE_(INT|DOUBLE)\b.*?(not supported|unsupported|not found|not available|unrecognized)"
+    r"|(not supported|unsupported|not found|not available|unrecognized).*?AI\.GENERATE_(INT|DOUBLE)\b",
+    re.IGNORECASE | re.DOTALL,
+)
+_RESULT_TOO_LARGE_RE = re.compile(r"response too large|resources exceeded", re.IGNORECASE)
+
+_AI_CAST_TYPES = {"GENERATE_INT": "INT64", "GENERATE_DOUBLE": "FLOAT64"}
+
+FixRule = Callable[[exp.Expression, str], list[str]]
+
+
+def _qualify_tables(expression: exp.Expression, error: str) -> list[str]:
+    """Qualify tables of the configured dataset referenced without their dataset or project."""
+    if not _UNQUALIFIED_TABLE_RE.search(error):
+        return []
+    table_ids = set(bigquery_tools.get_metadata_cache().list_table_ids())
+    cte_names = {cte.alias_or_name for cte in expression.find_all(exp.CTE)}
+    fixes = []
+    for table in expression.find_all(exp.Table):
+        if table.name not in table_ids or (not table.db and table.name in cte_names):
+            continue
+        if not table.db:
+            table.set("db", exp.to_identifier(CONFIG.dataset))
+        elif table.db != CONFIG.dataset or table.catalog:
+            continue
+        table.set("catalog", exp.to_identifier(CONFIG.project_id))
+        fixes.append(f"Qualified table `{table.name}` as `{CONFIG.project_id}.{CONFIG.dataset}.{table.name}`.")
+    return fixes
+
+
+def _configure_ai_arguments(expression: exp.Expression, error: str) -> list[str]:
+    """Set the AI function argument an error names, `connection_id` or `endpoint`, to the configured value.
+
+    Only the argument named as missing or invalid by the error is touched, a model chosen on purpose is kept when
+    the error is about the connection.
+    """
+    expected = {}
+    if _AI_CONNECTION_ERROR_RE.search(error):
+        expected["connection_id"] = CONFIG.connection_id
+    if _AI_ENDPOINT_ERROR_RE.search(error):
+        expected["endpoint"] = CONFIG.bq_model
+    if not expected:
+        return []
+    fixes = []
+    for call in find_ai_calls(expression):
+        function = call.expression
+        present = set()
+        for argument in function.expressions:
+            if not isinstance(argument, exp.Kwarg):
+                continue
+            name = argument.this.name.lower()
+            present.add(name)
+            value = expected.get(name)
+            if value and not (isinstance(argument.expression, exp.Literal) and argument.expression.this == value):
+                argument.set("expression", exp.Literal.string(value))
+                fixes.append(f"Set `{name}` of AI.{function.name.upper()} to '{value}'.")
+        if "connection_id" in expected and "connection_id" not in present and CONFIG.connection_id:
+            function.append("expressions", exp.Kwarg(
+                this=exp.var("connection_id"), expression=exp.Literal.string(CONFIG.connection_id)
+            ))
+            fixes.append(f"Added `connection_id` '{CONFIG.connection_id}' to AI.{function.name.upper()}.")
+    return fixes
+
+
+def _replace_unsupported_ai_functions(expression: exp.Expression, error: str) -> list[str]:
+    """Replace AI.GENERATE_INT/DOUBLE, unavailable in some regions, with a cast of the AI.GENERATE result."""
+    match = _UNSUPPORTED_AI_RE.search(error)
+    if not match:
+        return []
+    function_name = f"GENERATE_{(match.group(1) or match.group(4)).upper()}"
+    fixes = []
+    for call in find_ai_calls(expression):
+        function = call.expression
+        if function.name.upper() != function_name:
+            continue
+        field = call.parent if isinstance(call.parent, exp.Dot) and call.parent.this is call else None
+        if field is None:
+            # The STRUCT itself is used, only its fields can be replaced without changing the query's types.
+            continue
+        function.set("this", "GENERATE")
+        fix = f"Replaced AI.{function_name}, unsupported in this region, with AI.GENERATE"
+        if field.expression.name.lower() == "result":
+            cast_type = _AI_CAST_TYPES[function_name]
+            field.replace(exp.TryCast(this=field.copy(), to=exp.DataType.build(cast_type, dialect=SQL_DIALECT)))
+            fix += f" and SAFE_CAST of its result to {cast_type}"
+        fixes.append(fix + ".")
+    return fixes
+
+
+def _limit_final_select(expression: exp.Expression, error: str) -> list[str]:
+    """Add a LIMIT to the outermost SELECT of a statement whose result was too large."""
+    if not _RESULT_TOO_LARGE_RE.search(error):
+        return []
+    if not isinstance(expression, exp.Query) or expression.args.get("limit"):
+        return []
+    expression.set("limit", exp.Limit(expression=exp.Literal.number(CONFIG.max_query_result_rows)))
+    return [f"Added LIMIT {CONFIG.max_query_result_rows} to the final SELECT."]
+
+
+FIX_RULES: list[FixRule] = [
+    _qualify_tables,
+    _configure_ai_arguments,
+    _replace_unsupported_ai_functions,
+    _limit_final_select,
+]
+
+
+def auto_fix_statement(sql: str, error: str) -> tuple[Optional[str], list[str]]:
+    """Fix a failed statement with the rules in `FIX_RULES` that match its error.
+
+    Every rule checks the error message for the failure class it handles and rewrites the parsed statement.
+    Rules never touch statements whose error they do not recognize, so unknown failures are left to the critic.
+
+    Args:
+        sql: The failed statement.
+        error: Error of the statement, from BigQuery or the local validation.
+
+    Returns:
+        tuple: The fixed statement and a description of every fix, or None and no fixes if no rule applied.
+    """
+    try:
+        expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    except SqlglotError:
+        return None, []
+    fixes = []
+    for rule in FIX_RULES:
+        fixes.extend(rule(expression, error))
+    if not fixes:
+        return None, []
+    return expression.sql(dialect=SQL_DIALECT, pretty=True), fixes
+
+
+def auto_fix_failed_query(callback_context: CallbackContext) -> Optional[genai_types.Content]:
+    """Fix mechanical failures of the last execution with rules, skipping the critic model when all are fixed.
+
+    Used as `before_agent_callback` of the query review agent. When every failed statement of
+    'query_execution_result' is fixed by `auto_fix_statement`, the fixed SQL, with the successful statements
+    unchanged, is written to 'query_review_rewrite_output' for the next execution and the review agent is skipped.
+    A statement that fails again after a fix gets no further fix from the same rules and goes to the critic.
+    Disabled with `CONFIG.sql_auto_fix_enabled`.
+    """
+    if not CONFIG.sql_auto_fix_enabled:
+        return None
+    statements = (callback_context.state.get("query_execution_result") or {}).get("statements") or []
+    failed = [statement for statement in statements if statement["status"] != "success"]
+    if not failed or any(statement.get("rejected") for statement in failed):
+        return None
+
+    fixed_statements = []
+    all_fixes = []
+    for statement in statements:
+        sql = statement.get("original_query") or statement["query"]
+        if statement["status"] == "success":
+            fixed_statements.append(sql)
+            continue
+        fixed_sql, fixes = auto_fix_statement(sql, statement.get("error") or "")
+        if fixed_sql is None:
+            return None
+        fixed_statements.append(fixed_sql)
+        all_fixes.extend(fixes)
+
+    callback_context.state["query_review_rewrite_output"] = ";\n\n".join(fixed_statements)
+    logger.info(f"[{callback_context.agent_name}] Fixed the failed query with rules: {' '.join(all_fixes)}")
+    return genai_types.Content(role="model", parts=[genai_types.Part(
+        text="Fixed the failed query without review:\n" + "\n".join(f"- {fix}" for fix in all_fixes)
+    )])
@@ -0,0 +1,82 @@
+import re
+
+from sqlglot import Dialect, exp
+from sqlglot.errors import TokenError
+from sqlglot.tokens import TokenType
+
+SQL_DIALECT = "bigquery"
+
+_CODE_FENCE_RE = re.compile(r"```(?:sql|googlesql|bigquery)?\s*\n(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+def extract_sql(text: str | None) -> str:
+    """Extract the SQL text from an agent response.
+
+    Agents usually wrap queries into markdown code fences, sometimes with a short explanation around them.
+    If fenced blocks are present, only their content is kept.
+
+    Args:
+        text: Raw agent output.
+
+    Returns:
+        str: SQL text without markdown decoration.
+    """
+    if not text:
+        return ""
+    blocks = _CODE_FENCE_RE.findall(text)
+    if blocks:
+        return "\n;\n".join(block.strip() for block in blocks)
+    return text.strip().strip("`").strip()
+
+
+def split_statements(sql: str) -> list[str]:
+    """Split a SQL script into separate statements preserving their original text.
+
+    Args:
+        sql: SQL text that may contain several statements separated by semicolons.
+
+    Returns:
+        list[str]: Non-empty statements without trailing semicolons.
+    """
+    try:
+        tokens = Dialect.get_or_raise(SQL_DIALECT).tokenize(sql)
+    except TokenError:
+        return [sql.strip().rstrip(";").strip()] if sql.strip() else []
+
+    statements = []
+    start = 0
+    has_tokens = False
+    for token in tokens:
+        if token.token_type == TokenType.SEMICOLON:
+            if has_tokens:
+                statements.append(sql[start:token.start].strip())
+            start = token.end + 1
+            has_tokens = False
+        else:
+            has_tokens = True
+    if has_tokens:
+        statements.append(sql[start:].strip())
+    return statements
+
+
+def is_ai_call(node: exp.Expression) -> bool:
+    """Check whether a parsed node is a BigQuery `AI.GENERATE*` function call."""
+    return (
+        isinstance(node, exp.Dot)
+        and isinstance(node.this, exp.Identifier)
+        and node.this.name.upper() == "AI"
+        and isinstance(node.expression, exp.Anonymous)
+        and node.expression.name.upper().startswith("GENERATE")
+    )
+
+
+def find_ai_calls(expression: exp.Expression) -> list[exp.Dot]:
+    """Find all `AI.GENERATE*` function calls in a parsed statement.
+
+    Args:
+        expression: Parsed SQL statement.
+
+    Returns:
+        list[exp.Dot]: The `AI.<function>(...)` nodes, the function itself is the node's `expression`.
+    """
+    return [node for node in expression.find_all(exp.Dot) if is_ai_call(node)]
@@ -0,0 +1,187 @@
+import difflib
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import OptimizeError, ParseError, SqlglotError
+from sqlglot.optimizer.scope import traverse_scope
+
+from dar.tools.sql_utils import SQL_DIALECT, find_ai_calls
+
+AI_SCALAR_FUNCTIONS = {"GENERATE", "GENERATE_BOOL", "GENERATE_INT", "GENERATE_DOUBLE"}
+AI_TABLE_FUNCTIONS = {"GENERATE_TABLE", "GENERATE_EMBEDDING"}
+AI_NAMED_ARGUMENTS = {"connection_id", "endpoint", "request_type", "model_params", "output_schema"}
+AI_RESULT_FIELDS = {"result", "full_response", "status"}
+# Parents that use a value directly, where the STRUCT returned by a scalar AI function is always a mistake.
+_VALUE_CONSUMERS = (exp.Cast, exp.Binary, exp.Where, exp.Not, exp.AggFunc)
+MAX_LISTED_NAMES = 20
+
+
+def describe_parse_error(error: SqlglotError) -> str:
+    """Describe the first error of a sqlglot parse or tokenizer error with its position, e.g. for an error message."""
+    if not isinstance(error, ParseError) or not error.errors:
+        return f"Syntax error: {error}"
+    first = error.errors[0]
+    return (
+        f"Syntax error at line {first['line']}, column {first['col']} near '{first['highlight']}': "
+        f"{first['description']}"
+    )
+
+
+def _suggest(name: str, candidates: set[str] | list[str]) -> str:
+    matches = difflib.get_close_matches(name, sorted(candidates), n=3)
+    if matches:
+        return " Did you mean " + " or ".join(f"`{match}`" for match in matches) + "?"
+    listed = sorted(candidates)[:MAX_LISTED_NAMES]
+    return f" Available: {', '.join(listed)}{', ...' if len(candidates) > len(listed) else ''}."
+
+
+def _is_dataset_table(table: exp.Table, project_id: str, dataset_id: str) -> bool:
+    """Whether a table reference points into the configured dataset and is a regular table there."""
+    if table.db != dataset_id or (table.catalog and table.catalog != project_id):
+        return False
+    return not (table.name.startswith("__") or "*" in table.name or "INFORMATION_SCHEMA" in table.name.upper())
+
+
+def _check_tables(
+    expression: exp.Expression, project_id: str, dataset_id: str, dataset_columns: dict[str, set[str]]
+) -> list[str]:
+    cte_names = {cte.alias_or_name for cte in expression.find_all(exp.CTE)}
+    errors = []
+    for table in expression.find_all(exp.Table):
+        if not table.name or (not table.db and table.name in cte_names):
+            continue
+        if not table.db:
+            errors.append(
+                f"Table `{table.name}` is neither a CTE nor qualified with its dataset, "
+                f"write it as `{project_id}.{dataset_id}.{table.name}`."
+            )
+        elif _is_dataset_table(table, project_id, dataset_id) and table.name not in dataset_columns:
+            errors.append(
+                f"Table `{project_id}.{dataset_id}.{table.name}` does not exist."
+                + _suggest(table.name, set(dataset_columns))
+            )
+    return errors
+
+
+def _check_columns(
+    expression: exp.Expression, project_id: str, dataset_id: str, dataset_columns: dict[str, set[str]]
+) -> list[str]:
+    """Check column references against the tables they are read from.
+
+    Only references that resolve unambiguously are checked: qualified columns whose qualifier is a table of the
+    dataset, and unqualified columns of a scope reading from a single dataset table. Unqualified names known from
+    any table or select alias of the statement are accepted, they may be correlated or refer to an alias.
+    """
+    referenced_columns = set()
+    for table in expression.find_all(exp.Table):
+        if _is_dataset_table(table, project_id, dataset_id):
+            referenced_columns |= dataset_columns.get(table.name, set())
+    select_aliases = {alias.alias.lower() for alias in expression.find_all(exp.Alias)}
+
+    errors = []
+    try:
+        scopes = traverse_scope(expression)
+    except OptimizeError:
+        return errors
+    for scope in scopes:
+        tables = {
+            alias: source for alias, source in scope.sources.items()
+            if isinstance(source, exp.Table) and _is_dataset_table(source, project_id, dataset_id)
+            and source.name in dataset_columns
+        }
+        single_table = next(iter(tables.values())) if len(scope.sources) == 1 and tables else None
+        for column in scope.columns:
+            name = column.name.lower()
+            if not name or name.startswith("_"):
+                # Pseudo columns such as _PARTITIONTIME and _TABLE_SUFFIX are not part of the schema.
+                continue
+            if column.table:
+                table = tables.get(column.table)
+            elif single_table is not None and name not in referenced_columns and name not in select_aliases:
+                table = single_table
+            else:
+                continue
+            if table is not None and name not in dataset_columns[table.name]:
+                error = f"Column `{column.sql(dialect=SQL_DIALECT)}` does not exist in table `{table.name}`."
+                error += _suggest(name, dataset_columns[table.name])
+                if error not in errors:
+                    errors.append(error)
+    return errors
+
+
+def _check_ai_calls(expression: exp.Expression) -> list[str]:
+    errors = []
+    for call in find_ai_calls(expression):
+        function = call.expression
+        function_name = function.name.upper()
+        display_name = f"AI.{function_name}"
+        if function_name in AI_TABLE_FUNCTIONS:
+            continue
+        if function_name not in AI_SCALAR_FUNCTIONS:
+            errors.append(
+                f"{display_name} is not a BigQuery AI function, use one of "
+                + ", ".join(f"AI.{name}" for name in sorted(AI_SCALAR_FUNCTIONS | AI_TABLE_FUNCTIONS)) + "."
+            )
+            continue
+
+        positional = [arg for arg in function.expressions if not isinstance(arg, exp.Kwarg)]
+        named = [arg.this.name.lower() for arg in function.expressions if isinstance(arg, exp.Kwarg)]
+        if not positional:
+            errors.append(f"{display_name} is missing its prompt, pass it as the first argument.")
+        elif len(positional) > 1:
+            errors.append(
+                f"{display_name} takes a single prompt argument, {len(positional)} positional arguments were "
+                f"given. Wrap the prompt parts into parentheses, e.g. ('Classify: ', column), and pass options "
+                f"as named arguments, e.g. connection_id => '...', endpoint => '...'."
+            )
+        for argument in sorted(set(named) - AI_NAMED_ARGUMENTS):
+            errors.append(
+                f"{display_name} has no argument `{argument}`, its named arguments are "
+                + ", ".join(sorted(AI_NAMED_ARGUMENTS)) + "."
+            )
+        for argument in sorted({argument for argument in named if named.count(argument) > 1}):
+            errors.append(f"{display_name} gets the named argument `{argument}` more than once.")
+
+        if isinstance(call.parent, exp.Dot) and call.parent.this is call:
+            field = call.parent.expression.name.lower()
+            if field not in AI_RESULT_FIELDS:
+                errors.append(
+                    f"{display_name} returns a STRUCT without the field `{field}`, its fields are "
+                    + ", ".join(sorted(AI_RESULT_FIELDS)) + "."
+                )
+        elif isinstance(call.parent, _VALUE_CONSUMERS):
+            errors.append(f"{display_name} returns a STRUCT, read its value with {display_name}(...).result.")
+    return errors
+
+
+def validate_sql(sql: str, project_id: str, dataset_id: str, dataset_columns: dict[str, set[str]]) -> list[str]:
+    """Statically validate a statement against the schema of the dataset without a BigQuery round trip.
+
+    Checks that tables of the dataset exist and that non-CTE tables are qualified with their dataset, that
+    column references resolve in the tables they are read from, and that `AI.GENERATE*` calls have a single
+    prompt argument, known named arguments and are read through a field of the returned STRUCT.
+
+    Args:
+        sql: SQL statement.
+        project_id: Project of the dataset.
+        dataset_id: Dataset the schema belongs to, tables of other datasets are not checked.
+        dataset_columns: Table id to lower-case top-level column names of every table of the dataset.
+
+    Returns:
+        list[str]: Error messages naming the offending reference and the closest valid names, empty if valid.
+
+    Raises:
+        SqlglotError: If sqlglot cannot tokenize or parse the statement, e.g. a `TokenError` for an unterminated
+            string, see `describe_parse_error`.
+    """
+    expression = sqlglot.parse_one(sql, read=SQL_DIALECT)
+    if expression is None:
+        return []
+    try:
+        errors = _check_tables(expression, project_id, dataset_id, dataset_columns)
+        errors += _check_columns(expression, project_id, dataset_id, dataset_columns)
+        errors += _check_ai_calls(expression)
+    except SqlglotError:
+        # Constructs sqlglot cannot analyze are left to the dry run, like statements it cannot parse.
+        return []
+    return errors
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+from typing import Any, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.api_core.exceptions import GoogleAPIError
+from google.genai import types as genai_types
+
+from dar.config import CONFIG
+from dar.tools import bigquery_tools
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE_KEY = "stage_cache"
+
+# Invocation state key prefix of the fingerprint of a running stage, recorded once the stage finished. A temp key
+# is not persisted, so the fingerprint of a stage that raised or was cancelled ends with its invocation.
+_PENDING_FINGERPRINT_PREFIX = "temp:stage_fingerprint:"
+
+
+def fingerprint(*values: Any) -> str:
+    """Short content hash of JSON serializable values, e.g. the inputs of a stage."""
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def dataset_version() -> Optional[str]:
+    """Fingerprint of the tables of the configured dataset, None if the dataset metadata cannot be loaded."""
+    try:
+        return bigquery_tools.get_metadata_cache().dataset_version()
+    except GoogleAPIError as e:
+        logger.warning(f"Failed to load the dataset version, stages are not reused: {e}")
+        return None
+
+
+def _pending_fingerprint_key(callback_context: CallbackContext) -> str:
+    branch = callback_context._invocation_context.branch or ""
+    return f"{_PENDING_FINGERPRINT_PREFIX}{branch}:{callback_context.agent_name}"
+
+
+def reuse_unchanged_stage(agent: BaseAgent, input_keys: list[str], output_keys: list[str]) -> None:
+    """Skip an agent whose inputs are unchanged since its last run in the session and restore that run's outputs.
+
+    A fingerprint of the input state keys is taken before the agent runs. When it matches the fingerprint of the
+    agent's last completed run, stored in the 'stage_cache' state key, the outputs of that run are written back
+    to state and the agent, with its sub-agents, is skipped. Otherwise the agent runs and its outputs are recorded
+    once it finished. Disabled with `CONFIG.stage_reuse_enabled`.
+
+    Args:
+        agent: The stage to skip when unchanged.
+        input_keys: State keys the stage reads.
+        output_keys: State keys the stage writes.
+    """
+
+    def skip_if_unchanged(callback_context: CallbackContext) -> Optional[genai_types.Content]:
+        if not CONFIG.stage_reuse_enabled:
+            return None
+        stage_fingerprint = fingerprint(agent.name, *(callback_context.state.get(key) for key in input_keys))
+        previous = (callback_context.state.get(STAGE_CACHE_KEY) or {}).get(agent.name)
+        if previous and previous["fingerprint"] == stage_fingerprint:
+            for key, value in previous["outputs"].items():
+                callback_context.state[key] = value
+            logger.info(f"[{agent.name}] Inputs unchanged, reusing the outputs of the previous run.")
+            return genai_types.Content(role="model", parts=[genai_types.Part(
+                text=f"The inputs of {agent.name} are unchanged, the outputs of its previous run are reused."
+            )])
+        callback_context.state[_pending_fingerprint_key(callback_context)] = stage_fingerprint
+        return None
+
+    def record_stage(callback_context: CallbackContext) -> None:
+        pending_key = _pending_fingerprint_key(callback_context)
+        stage_fingerprint = callback_context.state.get(pending_key)
+        if stage_fingerprint is None:
+            return None
+        callback_context.state[pending_key] = None
+        stage_cache = dict(callback_context.state.get(STAGE_CACHE_KEY) or {})
+        stage_cache[agent.name] = {
+            "fingerprint": stage_fingerprint,
+            "outputs": {key: callback_context.state.get(key) for key in output_keys},
+        }
+        callback_context.state[STAGE_CACHE_KEY] = stage_cache
+        return None
+
+    # The check runs first, so no other callback of a skipped stage runs.
+    agent.before_agent_callback = [skip_if_unchanged, *agent.canonical_before_agent_callbacks]
+    agent.after_agent_callback = [*agent.canonical_after_agent_callbacks, record_stage]
@@ -0,0 +1,103 @@
+import json
+import logging
+import re
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+
+from dar.config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Earlier turns and injected state values are never cut below this many tokens, so every one keeps its gist.
+_MIN_TRUNCATED_TOKENS = 200
+# Placeholders of an instruction template, as matched by ADK's state injection.
+_PLACEHOLDER_RE = re.compile(r"{+[^{}]*}+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text, Gemini tokenizers average about four characters per token."""
+    return (len(text) + 3) // 4
+
+
+def _part_text_tokens(llm_request: LlmRequest) -> int:
+    total = 0
+    system_instruction = llm_request.config.system_instruction if llm_request.config else None
+    if isinstance(system_instruction, str):
+        total += estimate_tokens(system_instruction)
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.text:
+                total += estimate_tokens(part.text)
+            elif part.function_response or part.function_call:
+                total += estimate_tokens(json.dumps(part.to_json_dict(), default=str))
+    return total
+
+
+def _truncate(text: str, excess: int) -> tuple[str, int]:
+    """Cut a text by up to `excess` tokens, keeping at least `_MIN_TRUNCATED_TOKENS`; returns the tokens removed."""
+    tokens = estimate_tokens(text)
+    keep = max(_MIN_TRUNCATED_TOKENS, tokens - excess)
+    if keep >= tokens:
+        return text, 0
+    return text[:keep * 4] + f"\n...[truncated {tokens - keep} tokens to fit the prompt budget]", tokens - keep
+
+
+def _injected_state_values(callback_context: CallbackContext) -> list[str]:
+    """Text of the state values injected into the agent's instruction template, largest first."""
+    instruction = getattr(callback_context._invocation_context.agent, "instruction", None)
+    if not isinstance(instruction, str):
+        return []
+    values = []
+    for match in _PLACEHOLDER_RE.finditer(instruction):
+        name = match.group().lstrip("{").rstrip("}").strip().removesuffix("?")
+        value = callback_context.state.get(name) if name and not name.startswith("artifact.") else None
+        if value is not None and str(value) not in values:
+            values.append(str(value))
+    return sorted(values, key=len, reverse=True)
+
+
+def enforce_prompt_token_budget(
+    callback_context: CallbackContext, llm_request: LlmRequest
+) -> Optional[LlmResponse]:
+    """Keep the prompt of an agent within its token budget, `CONFIG.prompt_token_budget_for`.
+
+    Refinement loops repeat earlier outputs in the conversation history, so the history grows with every
+    iteration. When the estimated prompt exceeds the budget, text of earlier turns is truncated, oldest first,
+    keeping the first turn (the user request) and the latest turn intact. Agents without history carry their
+    inputs in the instruction instead, so when the prompt still exceeds the budget the state values injected
+    into the system instruction, e.g. query results or a report, are truncated, largest first.
+    """
+    budget = CONFIG.prompt_token_budget_for(callback_context.agent_name)
+    excess = _part_text_tokens(llm_request) - budget
+    if excess <= 0:
+        return None
+
+    for content in llm_request.contents[1:-1]:
+        for part in content.parts or []:
+            if excess <= 0:
+                break
+            if not part.text or part.thought:
+                continue
+            part.text, removed = _truncate(part.text, excess)
+            excess -= removed
+
+    system_instruction = llm_request.config.system_instruction if llm_request.config else None
+    if excess > 0 and isinstance(system_instruction, str):
+        for value in _injected_state_values(callback_context):
+            if excess <= 0:
+                break
+            if value not in system_instruction:
+                continue
+            truncated, removed = _truncate(value, excess)
+            system_instruction = system_instruction.replace(value, truncated, 1)
+            excess -= removed
+        llm_request.config.system_instruction = system_instruction
+    if excess > 0:
+        logger.warning(
+            f"Prompt of {callback_context.agent_name} exceeds its budget of {budget} tokens by {excess} tokens "
+            f"after truncating the conversation history and the injected state"
+        )
+    return None
+